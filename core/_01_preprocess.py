@@ -1,48 +1,262 @@
 """
 Preprocess module: reads raw data of different depth images from a specified folder
+or from a folder inside a zip/tar archive (e.g. "data/stacks.zip/flowers"), without extracting it.
 """
 
 import cv2
 import numpy as np
 import os
 import glob
+import json
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
-def load_image_stack(folder_path, file_extension='png'):
+from ._02_pyramids import build_gaussian_pyramid, build_laplacian_pyramid
+from .imagefile import decode_image, rescale
+from .progress import Cancelled, report
+from .prune import coarse_frames, select_coarse_frames
+
+# Cache directory inside the core folder
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache")
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Extensions of the source images picked up when no file extension is given
+SOURCE_EXTENSIONS = ('png', 'tif', 'tiff')
+
+# Memoized archive indexes: {absolute path: ((path, size, mtime), index)}
+_archive_indexes = {}
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+def split_archive_path(folder_path, member_prefix=None):
+    """
+    Split a dataset path into an archive file and a member prefix.
+
+    "data/stacks.zip/flowers" and ("data/stacks.zip", "flowers") both give
+    ("data/stacks.zip", "flowers/"). Plain folders give (None, None).
+    """
+    head = os.path.normpath(folder_path)
+    tail = []
+    while head and not is_archive(head):
+        head, part = os.path.split(head)
+        if not part:
+            return None, None
+        tail.insert(0, part)
+    if not head:
+        return None, None
+
+    if member_prefix:
+        tail.append(member_prefix.strip("/"))
+    prefix = "/".join(tail)
+    return head, prefix + "/" if prefix else ""
+
+def _read_archive_index(archive_path):
+    if archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as z:
+            return {info.filename: (info.file_size, info.CRC, None) for info in z.infolist() if not info.is_dir()}
+    try:
+        # Members of an uncompressed tar can be read in place at their data offset
+        t = tarfile.open(archive_path, 'r:')
+        seekable = True
+    except tarfile.ReadError:
+        t = tarfile.open(archive_path)
+        seekable = False
+    with t:
+        return {m.name: (m.size, int(m.mtime), m.offset_data if seekable else None)
+                for m in t.getmembers() if m.isfile()}
+
+def archive_index(archive_path):
+    """
+    Index of the regular files of a zip or tar archive, read once per archive version.
+
+    Listing a compressed tar decompresses all of it, so the index is memoized on the
+    archive's (path, size, modification time).
+
+    Returns:
+        dict: {member name: (size, checksum, data offset)}, where checksum is the CRC-32 for
+        zip members and the modification time for tar members (tar stores no checksum of the
+        content), and data offset is where the member's bytes start in an uncompressed tar
+        (None for zip archives and compressed tars).
+    """
+    st = os.stat(archive_path)
+    key = (os.path.abspath(archive_path), st.st_size, st.st_mtime_ns)
+    index = _archive_indexes.get(key[0])
+    if index is None or index[0] != key:
+        index = (key, _read_archive_index(archive_path))
+        _archive_indexes[key[0]] = index
+    return index[1]
+
+def list_archive_members(archive_path):
+    """
+    List the regular files of a zip or tar archive.
+
+    Returns:
+        dict: {member name: (size, checksum)}, where checksum is the CRC-32 for zip members
+        and the modification time for tar members (tar stores no checksum of the content).
+    """
+    return {name: (size, checksum) for name, (size, checksum, _) in archive_index(archive_path).items()}
+
+def has_random_access(folder_path, member_prefix=None):
     """
-    Load a stack of images from the specified folder.
+    Whether single frames of a dataset can be read without a pass over the whole archive:
+    true for folders, zip archives and uncompressed tars, false for compressed tars.
+    """
+    archive_path, _ = split_archive_path(folder_path, member_prefix)
+    if archive_path is None or archive_path.lower().endswith('.zip'):
+        return True
+    return all(offset is not None for _, _, offset in archive_index(archive_path).values())
+
+def has_image_extension(name, file_extension=None):
+    """
+    Whether a file name ends in .<file_extension>, or in any of SOURCE_EXTENSIONS if
+    file_extension is None (case-insensitive).
+    """
+    extensions = SOURCE_EXTENSIONS if file_extension is None else (file_extension,)
+    return name.lower().endswith(tuple('.' + extension.lower() for extension in extensions))
+
+def describe_extension(file_extension=None):
+    """
+    Human-readable file extension(s) for messages, e.g. ".png/.tif/.tiff".
+    """
+    extensions = SOURCE_EXTENSIONS if file_extension is None else (file_extension,)
+    return "/".join('.' + extension for extension in extensions)
+
+def list_image_files(folder_path, file_extension=None, member_prefix=None):
+    """
+    List the image files of a dataset: file paths for a folder, member names for an archive.
 
     Args:
-        folder_path (str): Path to the folder containing images.
-        file_extension (str): Extension of the image files to load.
+        file_extension (str): Extension of the images, e.g. "png" (default: any of SOURCE_EXTENSIONS).
+    """
+    archive_path, prefix = split_archive_path(folder_path, member_prefix)
+    if archive_path is None:
+        return sorted(path for path in glob.glob(os.path.join(glob.escape(folder_path), '*'))
+                      if has_image_extension(path, file_extension) and os.path.isfile(path))
+
+    return sorted(
+        name for name in list_archive_members(archive_path)
+        if name.startswith(prefix) and "/" not in name[len(prefix):] and has_image_extension(name, file_extension)
+    )
+
+def read_image_sources(folder_path, image_files, member_prefix=None):
+    """
+    Read the encoded bytes of the given image files.
+
+    Yields:
+        tuple: (index into image_files, bytes). Tar members arrive in archive order,
+        so indices are not necessarily increasing.
+    """
+    archive_path, _ = split_archive_path(folder_path, member_prefix)
+    if archive_path is None:
+        for i, image_file in enumerate(image_files):
+            with open(image_file, 'rb') as f:
+                yield i, f.read()
+    elif archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as z:
+            for i, name in enumerate(image_files):
+                yield i, z.read(name)
+    elif has_random_access(archive_path):
+        index = archive_index(archive_path)
+        with open(archive_path, 'rb') as f:
+            for i, name in enumerate(image_files):
+                size, _, offset = index[name]
+                f.seek(offset)
+                yield i, f.read(size)
+    else:
+        # Compressed tars cannot seek, so make a single pass in archive order
+        wanted = {name: i for i, name in enumerate(image_files)}
+        with tarfile.open(archive_path) as t:
+            for member in t:
+                i = wanted.get(member.name)
+                if i is not None:
+                    yield i, t.extractfile(member).read()
+
+def _load_images(folder_path, image_files, member_prefix=None, workers=None, progress=None):
+    # Decoded images in image_files order, None where decoding failed, and the largest
+    # max_value among them (255 for 8-bit sources, 65535 for 16-bit ones), which every
+    # image is scaled to
+    futures = [None] * len(image_files)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for i, data in read_image_sources(folder_path, image_files, member_prefix):
+                if progress is not None:
+                    progress.check()
+                futures[i] = pool.submit(decode_image, data)
+            images, ranges = [], []
+            for i, future in enumerate(futures):
+                image, image_max = future.result() if future is not None else (None, None)
+                images.append(image)
+                ranges.append(image_max)
+                report(progress, "load", i + 1, len(image_files))
+        except Cancelled:
+            # Drop the queued decodes instead of finishing them on the way out
+            # (by hand: shutdown(cancel_futures=True) needs Python 3.9)
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+            raise
+
+    max_value = max((value for value in ranges if value is not None), default=255.0)
+    for image, image_max in zip(images, ranges):
+        if image is not None:
+            rescale(image, image_max, max_value)
+    return images, max_value
+
+def load_image_stack(folder_path, file_extension=None, member_prefix=None, workers=None):
+    """
+    Load a stack of images from the specified folder or archive.
+
+    Files are read sequentially and decoded in a thread pool while reading continues.
+    Images keep their bit depth: 16-bit sources give values in 0-65535.
+
+    Args:
+        folder_path (str): Path to the folder containing images, or to an archive
+            (optionally followed by a folder inside it).
+        file_extension (str): Extension of the image files to load (default: any of SOURCE_EXTENSIONS).
+        member_prefix (str): Folder inside the archive, if not part of folder_path.
+        workers (int): Number of decoding threads (default: ThreadPoolExecutor's default).
     
     Returns:
         np.ndarray: A 3D numpy array containing the stacked images.
     """
-    image_files = sorted(glob.glob(os.path.join(folder_path, f'*.{file_extension}')))
-    image_stack = []
-    for image_file in image_files:
-        image = cv2.imread(image_file, cv2.IMREAD_COLOR).astype(np.float32)
-        if image is not None:
-            image_stack.append(image)
+    image_files = list_image_files(folder_path, file_extension, member_prefix)
+    images, _ = _load_images(folder_path, image_files, member_prefix, workers=workers)
+    image_stack = [image for image in images if image is not None]
             
     if image_stack:
         return np.stack(image_stack, axis=0)    # (N, H, W, C=3)
     else:
         return np.array([])
     
+def read_max_value(folder_path, file_extension=None, member_prefix=None):
+    """
+    Top of the value range of a dataset's frames (255 for 8-bit sources, 65535 for 16-bit
+    ones), from its first image.
+    """
+    image_files = list_image_files(folder_path, file_extension, member_prefix)
+    if not image_files:
+        return 255.0
+    _, data = next(read_image_sources(folder_path, image_files[:1], member_prefix))
+    _, max_value = decode_image(data)
+    return max_value if max_value is not None else 255.0
+
 def ensure_same_size(image_stack):
     """
     Ensure all images in the stack have the same size by resizing them to the size of the first image.
 
     Args:
-        image_stack (np.ndarray): A 3D numpy array containing the stacked images.
+        image_stack (np.ndarray or list): The stacked images, or a list of images of possibly different sizes.
     Returns:
         np.ndarray: A 3D numpy array with all images resized to the same dimensions.
     """
     # print("Image stack size:", image_stack.size)
 
-    if image_stack.size == 0:
-        return image_stack
+    if len(image_stack) == 0:
+        return np.asarray(image_stack)
     
     target_shape = image_stack[0].shape
     resized_stack = []
@@ -55,36 +269,118 @@ def ensure_same_size(image_stack):
 
     return np.stack(resized_stack, axis=0)
 
-def align_images(image_stack):
+def _to_gray(image):
+    if image.ndim == 3 and image.shape[2] > 1:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+# Multi-scale registration: ECC runs from the deepest pyramid level whose short side is at
+# least ALIGN_MIN_SIZE down to ALIGN_FINEST_LEVEL (1 = half resolution), never at full resolution
+ALIGN_MIN_SIZE = 64
+ALIGN_FINEST_LEVEL = 1
+# Largest corner displacement of an accepted warp, as a fraction of the frame's short side
+ALIGN_MAX_DISPLACEMENT = 0.1
+
+def alignment_levels(height, width, available=None):
     """
-    Align images in the stack using ECC (Enhanced Correlation Coefficient) maximization.
-    This is more robust than simple center-of-mass alignment.
+    (coarsest, finest) pyramid levels used for registration of frames of this size.
 
     Args:
-        image_stack (np.ndarray): A stack of images, shape (N, H, W[, C])
-    Returns:
-        np.ndarray: A stack with aligned images.
+        available (int): Deepest level present in the pyramids, if they are given.
     """
-    if image_stack.size == 0:
-        return image_stack
+    coarsest = 0
+    while min(height, width) / 2 ** (coarsest + 1) >= ALIGN_MIN_SIZE:
+        coarsest += 1
+    if available is not None:
+        coarsest = min(coarsest, available)
+    return coarsest, min(ALIGN_FINEST_LEVEL, coarsest)
 
-    aligned_stack = []
+def _is_runaway(warp_matrix, shape):
+    # ECC can run away on frames with little structure (e.g. far out of focus); a warp that
+    # moves a corner of the frame by more than ALIGN_MAX_DISPLACEMENT of its short side is
+    # not a hand-held or focus-breathing motion
+    h, w = shape
+    corners = np.float32([[0, 0, 1], [w, 0, 1], [0, h, 1], [w, h, 1]])
+    moved = corners @ warp_matrix.T
+    return np.abs(moved - corners[:, :2]).max() > ALIGN_MAX_DISPLACEMENT * min(h, w)
 
-    # Use the first image as the reference
-    reference_image = image_stack[0]
-    aligned_stack.append(reference_image)
+def registration_levels(image, coarsest, finest):
+    """
+    Grayscale Gaussian pyramid levels of a frame that registration runs on: levels finest
+    to coarsest, with None in place of the finer ones, which ECC never uses.
+    """
+    pyramid = build_gaussian_pyramid(image, coarsest)
+    return [None] * finest + [_to_gray(level) for level in pyramid[finest:coarsest + 1]]
 
-    # Convert reference to grayscale for ECC
-    if reference_image.ndim == 3 and reference_image.shape[2] > 1:
-        ref_gray = cv2.cvtColor(reference_image, cv2.COLOR_BGR2GRAY)
-    else:
-        ref_gray = reference_image
+def _register(ref_levels, img_levels, coarsest, finest, warp_matrix, criteria):
+    # Coarse to fine ECC from warp_matrix (in the coarsest level's pixels). Returns
+    # ((level, score, warp) of the finest level that converged or None, last error)
+    found = error = None
+    for k in range(coarsest, finest - 1, -1):
+        if k < coarsest:
+            warp_matrix[:, 2] *= 2
+        try:
+            # Run the ECC algorithm. The results are stored in warp_matrix.
+            # findTransformECC finds the transform that maps the input image (img_gray) to the template (ref_gray)
+            (score, warp_matrix) = cv2.findTransformECC(ref_levels[k], img_levels[k], warp_matrix, cv2.MOTION_AFFINE, criteria)
+            found = (k, score, warp_matrix.copy())
+        except cv2.error as e:
+            if found is None:
+                warp_matrix = np.eye(2, 3, dtype=np.float32)
+            else:
+                warp_matrix = found[2].copy()
+                warp_matrix[:, 2] *= 2 ** (found[0] - k)
+            error = e
 
-    H, W = ref_gray.shape[:2]
+    if found is not None and _is_runaway(found[2], ref_levels[found[0]].shape):
+        found, error = None, "the warp moves the frame implausibly far"
+    return found, error
 
-    # Define the motion model
-    # MOTION_AFFINE handles translation, rotation, scale, and shear
-    warp_mode = cv2.MOTION_AFFINE
+def estimate_warps(image_stack, progress=None, pyramids=None, initial_warps=None, frame_shape=None):
+    """
+    Estimate the alignment of every image to the first one using ECC (Enhanced Correlation
+    Coefficient) maximization. This is more robust than simple center-of-mass alignment.
+
+    Registration is coarse to fine on Gaussian pyramid levels: each level starts from the
+    warp found one level up (translation doubled) and the finest level used is
+    ALIGN_FINEST_LEVEL, so no ECC pass runs at full resolution. pyrDown keeps pixel i of
+    level k+1 centered on pixel 2i of level k, which makes the warp exact to rescale.
+
+    Args:
+        image_stack (np.ndarray): A stack of images, shape (N, H, W[, C])
+        progress (ProgressToken): Optional; reports "align" after every frame.
+        pyramids (list): Optional Gaussian pyramids of the frames (from build_gaussian_pyramid
+            or registration_levels) to register on; built here otherwise. Either way the warps
+            are the same.
+        initial_warps (list): Optional starting warp per frame (2x3, full resolution, None to
+            start from identity), e.g. the warps of the previous stack of a time-lapse. From
+            a close start only the finest level is registered; if that fails, the frame is
+            registered again coarse to fine from identity.
+        frame_shape (tuple): (H, W) of the frames, when image_stack is None and only the
+            pyramids are given.
+    Returns:
+        tuple:
+            - warps (np.ndarray): (N, 2, 3) affine matrices mapping reference coordinates to
+              image coordinates (identity for the reference and for failed alignments).
+            - scores (np.ndarray): (N,) final ECC correlation per image (1 for the reference,
+              NaN where alignment failed).
+    """
+    num_images = len(image_stack) if image_stack is not None else len(pyramids)
+    warps = np.tile(np.eye(2, 3, dtype=np.float32), (num_images, 1, 1))
+    scores = np.ones(num_images, dtype=np.float32)
+    if num_images == 0:
+        return warps, scores
+
+    H, W = frame_shape if frame_shape is not None else image_stack[0].shape[:2]
+    coarsest, finest = alignment_levels(H, W, len(pyramids[0]) - 1 if pyramids is not None else None)
+
+    def gray_levels(i):
+        if pyramids is None:
+            return registration_levels(image_stack[i], coarsest, finest)
+        return [None] * finest + [_to_gray(level) for level in pyramids[i][finest:coarsest + 1]]
+
+    # Use the first image as the reference, in grayscale for ECC
+    ref_levels = gray_levels(0)
 
     # Set termination criteria
     number_of_iterations = 500
@@ -92,72 +388,513 @@ def align_images(image_stack):
     # Criteria: either 500 iterations or epsilon of 1e-5
     criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, number_of_iterations, termination_eps)
 
-    for i in range(1, len(image_stack)):
-        image = image_stack[i]
-        
-        # Convert to grayscale for ECC
-        if image.ndim == 3 and image.shape[2] > 1:
-            img_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    report(progress, "align", 1, num_images)
+    for i in range(1, num_images):
+        img_levels = gray_levels(i)
+
+        # The motion model is MOTION_AFFINE (translation, rotation, scale and shear); the
+        # warp's translation is in the current level's pixels
+        found = None
+        initial = initial_warps[i] if initial_warps is not None and i < len(initial_warps) else None
+        if initial is not None and not np.array_equal(initial, np.eye(2, 3)):
+            # A close start needs no coarse levels: refine at the finest level only
+            warp_matrix = np.array(initial, dtype=np.float32)
+            warp_matrix[:, 2] /= 2 ** finest
+            found, error = _register(ref_levels, img_levels, finest, finest, warp_matrix, criteria)
+        if found is None:
+            warp_matrix = np.eye(2, 3, dtype=np.float32)
+            found, error = _register(ref_levels, img_levels, coarsest, finest, warp_matrix, criteria)
+
+        if found is None:
+            print(f"Alignment failed for image {i}, keeping original. Error: {error}")
+            scores[i] = np.nan
+        else:
+            k, score, warp_matrix = found
+            warp_matrix[:, 2] *= 2 ** k
+            warps[i] = warp_matrix
+            scores[i] = score
+        report(progress, "align", i + 1, num_images)
+
+    return warps, scores
+
+def warp_image(image, warp_matrix, region=None):
+    """
+    Warp an image into the reference frame.
+
+    The sampling coordinates are computed for each absolute output pixel, so warping a
+    region gives exactly the same pixels as cropping the fully warped image.
+
+    Args:
+        image (np.ndarray): Source image (H, W[, C]).
+        warp_matrix (np.ndarray): 2x3 matrix mapping reference coordinates to image coordinates.
+        region (tuple): Optional (y0, y1, x0, x1) part of the output to compute.
+    Returns:
+        np.ndarray: The warped image, or the requested region of it.
+    """
+    H, W = image.shape[:2]
+    y0, y1, x0, x1 = region if region is not None else (0, H, 0, W)
+    if np.array_equal(warp_matrix, np.eye(2, 3, dtype=warp_matrix.dtype)):
+        return image[y0:y1, x0:x1]
+
+    m = warp_matrix.astype(np.float32)
+    xs = np.arange(x0, x1, dtype=np.float32)[np.newaxis, :]
+    ys = np.arange(y0, y1, dtype=np.float32)[:, np.newaxis]
+    map_x = m[0, 0] * xs + m[0, 1] * ys + m[0, 2]
+    map_y = m[1, 0] * xs + m[1, 1] * ys + m[1, 2]
+    return cv2.remap(image, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+
+def align_images(image_stack, progress=None):
+    """
+    Align images in the stack to the first one (see estimate_warps).
+
+    Args:
+        image_stack (np.ndarray): A stack of images, shape (N, H, W[, C])
+        progress (ProgressToken): Optional; reports "align" after every frame and can cancel.
+    Returns:
+        np.ndarray: A stack with aligned images.
+    """
+    if image_stack.size == 0:
+        return image_stack
+
+    warps, _ = estimate_warps(image_stack, progress)
+    return np.stack([warp_image(image, warp) for image, warp in zip(image_stack, warps)], axis=0)
+
+
+def align_with_pyramids(image_stack, levels, progress=None):
+    """
+    Align a stack and build the fusion pyramids of the aligned frames, with one Gaussian
+    pyramid per frame shared between registration and fusion.
+
+    Each frame's Gaussian pyramid is built once and estimate_warps registers on its coarse
+    levels. Frames that need no warp (the reference, failed alignments) keep that pyramid;
+    only the others are warped at full resolution and get their pyramid rebuilt. The result
+    is the same as align_images followed by build_pyramids_stack.
+
+    Args:
+        image_stack (np.ndarray): Unaligned frames, shape (N, H, W[, C]).
+        levels (int): Number of pyramid levels for fusion.
+        progress (ProgressToken): Optional; reports "align" and "pyramids" per frame and can cancel.
+    Returns:
+        tuple:
+            - aligned (np.ndarray): Aligned frames (N, H, W[, C]).
+            - warps, scores: As returned by estimate_warps.
+            - pyramids (tuple): (gaussian_pyramids, laplacian_pyramids, top_gaussians) as
+              returned by build_pyramids_stack.
+    """
+    num_images, H, W = image_stack.shape[:3]
+    depth = max(levels, alignment_levels(H, W)[0])
+    shared = [build_gaussian_pyramid(image, depth) for image in image_stack]
+    warps, scores = estimate_warps(image_stack, progress, pyramids=shared)
+
+    identity = np.eye(2, 3, dtype=np.float32)
+    aligned, gaussian_pyramids, laplacian_pyramids, top_gaussians = [], [], [], []
+    for i, image in enumerate(image_stack):
+        if np.array_equal(warps[i], identity):
+            gaussian_pyramid = shared[i][:levels + 1]
+        else:
+            image = warp_image(image, warps[i])
+            gaussian_pyramid = build_gaussian_pyramid(image, levels)
+        shared[i] = None
+        laplacian_pyramid, top_gaussian = build_laplacian_pyramid(gaussian_pyramid)
+        aligned.append(image)
+        gaussian_pyramids.append(gaussian_pyramid)
+        laplacian_pyramids.append(laplacian_pyramid)
+        top_gaussians.append(top_gaussian)
+        report(progress, "pyramids", i + 1, num_images)
+
+    return np.stack(aligned, axis=0), warps, scores, (gaussian_pyramids, laplacian_pyramids, top_gaussians)
+
+
+class AlignedStack:
+    """
+    Aligned image stack that decodes and warps source frames only when they are read.
+
+    Stands in for the (N, H, W, 3) float32 array returned by align_images: len(), shape,
+    indexing and iteration work frame by frame, tile() warps only part of a frame, and
+    np.asarray() materializes the whole stack. Compressed tar archives can only be read front
+    to back, so there the encoded frames are read in one pass on first access and kept.
+
+    If the stack was pruned (see prune.select_frames), `pruned` lists the skipped frames
+    ({"file", "share", "reason"}) and `prune_seconds_saved` the alignment time that saved.
+    If it was aligned with align_with_pyramids, `frames` holds the aligned frames and
+    `pyramids` the fusion pyramids built during alignment (both None otherwise).
+
+    Frames keep the bit depth of the sources; `max_value` is the top of their range (255 for
+    8-bit sources, 65535 for 16-bit ones) and is what the fused result is clipped to.
+    """
+
+    def __init__(self, folder_path, image_files, warps, scores, shape, member_prefix=None, max_value=255.0):
+        self.folder_path = folder_path
+        self.image_files = list(image_files)
+        self.warps = warps
+        self.scores = scores
+        self.shape = tuple(shape)
+        self.member_prefix = member_prefix
+        self.dtype = np.dtype(np.float32)
+        self.max_value = max_value
+        self.pruned = []
+        self.prune_seconds_saved = 0.0
+        self.frames = None
+        self.pyramids = None
+        self._encoded = None
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _prepare(self, image):
+        # Same resizing as ensure_same_size
+        H, W = self.shape[1:3]
+        if image.shape[:2] != (H, W):
+            image = cv2.resize(image, (W, H), interpolation=cv2.INTER_NEAREST)
+        return image
+
+    def source(self, idx):
+        """
+        Decoded source frame idx (resized, not warped).
+        """
+        if self._encoded is None and not has_random_access(self.folder_path, self.member_prefix):
+            self._encoded = [None] * len(self.image_files)
+            for i, data in read_image_sources(self.folder_path, self.image_files, self.member_prefix):
+                self._encoded[i] = data
+        if self._encoded is not None:
+            data = self._encoded[idx]
         else:
-            img_gray = image
+            _, data = next(read_image_sources(self.folder_path, [self.image_files[idx]], self.member_prefix))
+        return self._prepare(decode_image(data, self.max_value)[0])
 
-        # Initialize warp matrix
-        warp_matrix = np.eye(2, 3, dtype=np.float32)
+    def tile(self, idx, y0, y1, x0, x1):
+        """
+        Region [y0:y1, x0:x1] of aligned frame idx, warping only that region.
+        """
+        return warp_image(self.source(idx), self.warps[idx], region=(y0, y1, x0, x1))
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return np.stack([self[i] for i in range(*idx.indices(len(self)))], axis=0)
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return warp_image(self.source(idx), self.warps[idx])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def load(self, progress=None):
+        """
+        Materialize the whole stack as an (N, H, W, 3) array, like np.asarray(), reporting
+        the decoding to progress and stopping with Cancelled if it is cancelled.
+        """
+        if self.frames is not None:
+            return self.frames
+        # Decode in a single pass (in parallel), then warp each frame in the pool as well
+        images, _ = _load_images(self.folder_path, self.image_files, self.member_prefix, progress=progress)
+
+        def warp(i):
+            if progress is not None:
+                progress.check()
+            return warp_image(self._prepare(images[i]), self.warps[i])
+
+        with ThreadPoolExecutor() as pool:
+            frames = list(pool.map(warp, range(len(self))))
+        return np.stack(frames, axis=0)
+
+    def __array__(self, dtype=None, copy=None):
+        stack = self.load()
+        return stack.astype(dtype) if dtype is not None else stack
+
+
+def get_cache_path(folder_path, member_prefix=None, prune=None):
+    """
+    Cache file of a dataset's alignment. Pruned alignments (which depend on the threshold)
+    get their own file, so pruned and unpruned runs do not overwrite each other.
+    """
+    archive_path, prefix = split_archive_path(folder_path, member_prefix)
+    if archive_path is None:
+        base_name = os.path.basename(os.path.normpath(folder_path))
+    else:
+        # Keyed on the archive and the folder inside it
+        base_name = os.path.basename(archive_path)
+        for ext in ARCHIVE_EXTENSIONS:
+            if base_name.lower().endswith(ext):
+                base_name = base_name[:-len(ext)]
+                break
+        if prefix:
+            base_name += "_" + prefix.strip("/").replace("/", "_")
+    if prune is not None:
+        base_name += f"_prune{prune:g}"
+    return os.path.join(CACHE_DIR, f"{base_name}_warps.npz")
 
+def get_cache_files(folder_path, member_prefix=None, prune=None):
+    """
+    Files making up the cache entry of a dataset.
+    """
+    return [get_cache_path(folder_path, member_prefix, prune)]
+
+def remove_legacy_cache(folder_path=None, member_prefix=None):
+    """
+    Delete cache entries in the old format, which stored the whole aligned stack
+    ("<name>_aligned.npy" plus its ".json" metadata), for one dataset or, without
+    folder_path, for all of them.
+
+    Returns:
+        int: Bytes freed.
+    """
+    if folder_path is None:
+        pattern = "*_aligned"
+    else:
+        pattern = glob.escape(os.path.basename(get_cache_path(folder_path, member_prefix))[:-len("_warps.npz")]) + "_aligned"
+    freed = 0
+    for path in glob.glob(os.path.join(CACHE_DIR, pattern + ".npy")) + glob.glob(os.path.join(CACHE_DIR, pattern + ".json")):
         try:
-            # Run the ECC algorithm. The results are stored in warp_matrix.
-            # findTransformECC finds the transform that maps the input image (img_gray) to the template (ref_gray)
-            (_, warp_matrix) = cv2.findTransformECC(ref_gray, img_gray, warp_matrix, warp_mode, criteria)
-            
-            # Use warpAffine with the calculated matrix.
-            aligned_image = cv2.warpAffine(
-                image, 
-                warp_matrix, 
-                (W, H), 
-                flags=cv2.INTER_LINEAR + cv2.WARP_INVERSE_MAP
-            )
-        except cv2.error as e:
-            print(f"Alignment failed for image {i}, keeping original. Error: {e}")
-            aligned_image = image
+            size = os.path.getsize(path)
+            os.remove(path)
+            freed += size
+        except OSError:
+            pass
+    return freed
 
-        aligned_stack.append(aligned_image)
+def source_signature(folder_path, image_files, member_prefix=None):
+    """
+    Identity of the source files, used to validate the cache: (name, size, modification time)
+    for files in a folder, (member name, size, CRC-32 or mtime) for archive members.
+    """
+    archive_path, _ = split_archive_path(folder_path, member_prefix)
+    if archive_path is not None:
+        members = list_archive_members(archive_path)
+        return [[name, *members[name]] for name in image_files]
+
+    signature = []
+    for image_file in image_files:
+        st = os.stat(image_file)
+        signature.append([os.path.basename(image_file), st.st_size, st.st_mtime_ns])
+    return signature
 
-    return np.stack(aligned_stack, axis=0)
+def load_cache(folder_path, file_extension=None, member_prefix=None, prune=None):
+    """
+    Load the cached alignment of a dataset as a lazy AlignedStack.
 
+    The cache holds one 2x3 warp matrix and ECC score per frame, keyed by the identity of
+    the source files and the pruning threshold; it is only used if those are unchanged.
 
-def preprocess_image_stack(folder_path, file_extension='png', use_cache=True):
+    Returns:
+        AlignedStack or None: None if there is no valid cache entry.
     """
-    Load, resize, and align images from a folder.
-    Supports caching to speed up subsequent runs.
+    cache_file = get_cache_path(folder_path, member_prefix, prune)
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with np.load(cache_file) as cache:
+            meta = json.loads(str(cache["meta"]))
+            warps = cache["warps"]
+            scores = cache["scores"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+    image_files = list_image_files(folder_path, file_extension, member_prefix)
+    if meta.get("sources") != source_signature(folder_path, image_files, member_prefix):
+        return None
+    if meta.get("prune") != prune:
+        return None
+    if "max_value" not in meta:
+        # Written before sources kept their bit depth
+        return None
+
+    # Only the frames that decoded when the cache was built
+    frames = set(meta["frames"])
+    used_files = [f for f, (name, *_) in zip(image_files, meta["sources"]) if name in frames]
+    stack = AlignedStack(folder_path, used_files, warps, scores, meta["shape"], member_prefix, meta["max_value"])
+    stack.pruned = meta.get("pruned", [])
+    stack.prune_seconds_saved = meta.get("prune_seconds_saved", 0.0)
+    return stack
+
+def is_cache_valid(folder_path, file_extension=None, member_prefix=None, prune=None):
     """
-    # Determine cache path
-    base_name = os.path.basename(os.path.normpath(folder_path))
-    # Cache directory inside the core folder
-    cache_dir = os.path.join(os.path.dirname(__file__), "cache")
-    cache_file = os.path.join(cache_dir, f"{base_name}_aligned.npy")
+    Check that a cache entry exists and was built from the current source files.
+    """
+    return load_cache(folder_path, file_extension, member_prefix, prune) is not None
+
+def _save_cache(cache_file, stack, signature, frames, prune=None):
+    # Write to a temporary file and rename, so an interrupted run never leaves a truncated cache behind
+    meta = {"sources": signature, "frames": frames, "shape": list(stack.shape), "max_value": stack.max_value,
+            "prune": prune, "pruned": stack.pruned, "prune_seconds_saved": stack.prune_seconds_saved}
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(cache_file + ".tmp", "wb") as f:
+        np.savez(f, warps=stack.warps, scores=stack.scores, meta=np.array(json.dumps(meta)))
+    os.replace(cache_file + ".tmp", cache_file)
 
-    if use_cache and os.path.exists(cache_file):
-        print(f"Loading preprocessed images from cache: {cache_file}")
+# Frames decoded ahead of the one being reduced when preprocessing frame by frame
+DECODE_AHEAD = 2
+
+def _iter_images(folder_path, image_files, member_prefix=None, progress=None):
+    # (index into image_files, image, max_value) per frame, decoded at most DECODE_AHEAD
+    # frames ahead of the caller; image is None where decoding failed
+    pending = []
+    with ThreadPoolExecutor(max_workers=DECODE_AHEAD) as pool:
         try:
-            return np.load(cache_file)
-        except Exception as e:
-            print(f"Failed to load cache: {e}. Reprocessing...")
+            for i, data in read_image_sources(folder_path, image_files, member_prefix):
+                if progress is not None:
+                    progress.check()
+                pending.append((i, pool.submit(decode_image, data)))
+                if len(pending) > DECODE_AHEAD:
+                    i, future = pending.pop(0)
+                    yield (i,) + future.result()
+            while pending:
+                i, future = pending.pop(0)
+                yield (i,) + future.result()
+        finally:
+            # The caller stopped early (e.g. cancelled): drop the queued decodes
+            for _, future in pending:
+                future.cancel()
 
-    image_stack = load_image_stack(folder_path, file_extension)
+def _load_registration_levels(folder_path, image_files, member_prefix=None, progress=None, with_coarse=False):
+    # Frame by frame counterpart of _load_images + ensure_same_size for alignment: keeps only
+    # each decodable frame's registration_levels (and its coarse_frames copy for pruning).
+    # Returns (used indices, levels, coarse frames or None, max_value, frame shape (H, W, C)).
+    levels, coarse, shapes, ranges = {}, {}, {}, {}
 
-    if image_stack.size == 0:
-        raise ValueError(f"No images found in {folder_path} with extension .{file_extension}")
+    def reduce(i, image, shape):
+        if image.shape != shape:
+            image = cv2.resize(image, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+        levels[i] = registration_levels(image, *alignment_levels(*shape[:2]))
+        if with_coarse:
+            coarse[i] = coarse_frames([image])[0]
+
+    for done, (i, image, image_max) in enumerate(_iter_images(folder_path, image_files, member_prefix, progress), 1):
+        if image is not None:
+            shapes[i], ranges[i] = image.shape, image_max
+            reduce(i, image, image.shape)
+        report(progress, "load", done, len(image_files))
+
+    used = sorted(levels)
+    if not used:
+        return [], [], None, 255.0, None
+    # Frames are brought to the size of the first one, as ensure_same_size does; tar members
+    # arrive in archive order, so a frame of another size is read again once that is known
+    shape = shapes[used[0]]
+    resized = [i for i in used if shapes[i] != shape]
+    for j, image, _ in _iter_images(folder_path, [image_files[i] for i in resized], member_prefix, progress):
+        reduce(resized[j], image, shape)
+
+    max_value = max(ranges.values())
+    for i in used:
+        for level in levels[i]:
+            if level is not None:
+                rescale(level, ranges[i], max_value)
+        if with_coarse:
+            rescale(coarse[i], ranges[i], max_value)
+    coarse = np.stack([coarse[i] for i in used], axis=0) if with_coarse else None
+    return used, [levels[i] for i in used], coarse, max_value, shape
+
+def preprocess_image_stack(folder_path, file_extension=None, use_cache=True, member_prefix=None, lazy=False,
+                           progress=None, prune=None, pyramid_levels=None, low_memory=False):
+    """
+    Load, resize, and align images from a folder or an archive, at the bit depth of the
+    sources (the lazy stack's max_value gives the range).
+    Supports caching to speed up subsequent runs: only the per-frame warps are cached,
+    and the sources are decoded and warped again when the stack is read.
+
+    Args:
+        lazy (bool): Return an AlignedStack that warps frames (or tiles) on access
+            instead of the materialized (N, H, W, 3) float32 array.
+        progress (ProgressToken): Optional; reports "load" and "align" per frame and can cancel.
+        prune (float): If given, drop frames winning less than this share of pixels in a coarse
+            pre-pass (and near-duplicate neighbours) before alignment; see prune.select_frames.
+        pyramid_levels (int): If the alignment is not cached, align with align_with_pyramids
+            and keep the aligned frames and the fusion pyramids with this many levels on the
+            returned stack (`frames`, `pyramids`), so fusion does not build them again.
+        low_memory (bool): If the alignment is not cached, decode one frame at a time and keep
+            only the grayscale pyramid levels registration runs on (about a ninth of the
+            float32 stack) instead of the whole stack, for stacks fused by the streaming or
+            tiled strategy. The warps are the same; pyramid_levels is ignored.
+    """
+    cache_file = get_cache_path(folder_path, member_prefix, prune)
+
+    if use_cache:
+        stack = load_cache(folder_path, file_extension, member_prefix, prune)
+        if stack is not None:
+            print(f"Loading alignment from cache: {cache_file}")
+            return stack if lazy else np.asarray(stack)
+
+    image_files = list_image_files(folder_path, file_extension, member_prefix)
+    signature = source_signature(folder_path, image_files, member_prefix)
+    if low_memory:
+        used, levels, coarse, max_value, frame_shape = _load_registration_levels(
+            folder_path, image_files, member_prefix, progress, with_coarse=prune is not None)
+        image_stack = None
+        pyramid_levels = None
+    else:
+        images, max_value = _load_images(folder_path, image_files, member_prefix, progress=progress)
+        used = [i for i, image in enumerate(images) if image is not None]
+
+    if not used:
+        raise ValueError(f"No images found in {folder_path} with extension {describe_extension(file_extension)}")
+
+    if not low_memory:
+        image_stack = ensure_same_size([images[i] for i in used])
+        del images
+        frame_shape = image_stack.shape[1:]
+
+    pruned = []
+    aligned_frames = list(range(len(used)))
+    start = time.perf_counter()
+    if prune is not None:
+        keep, dropped = select_coarse_frames(coarse if low_memory else coarse_frames(image_stack), min_share=prune)
+        pruned = [{"file": signature[used[d["index"]]][0], "share": d["share"], "reason": d["reason"]} for d in dropped]
+        # A pruned first frame is still the alignment reference, so pruning does not move the result
+        aligned_frames = keep if keep[0] == 0 else [0] + keep
+        used = [used[i] for i in keep]
+    prepass_seconds = time.perf_counter() - start
+    reference_only = len(aligned_frames) - len(used)
+
+    start = time.perf_counter()
+    if low_memory:
+        warps, scores = estimate_warps(None, progress, pyramids=[levels[i] for i in aligned_frames],
+                                       frame_shape=frame_shape[:2])
+    else:
+        image_stack = image_stack[aligned_frames] if prune is not None else image_stack
+        if pyramid_levels is not None:
+            aligned, warps, scores, pyramids = align_with_pyramids(image_stack, pyramid_levels, progress)
+            aligned, pyramids = aligned[reference_only:], tuple(lists[reference_only:] for lists in pyramids)
+        else:
+            warps, scores = estimate_warps(image_stack, progress)
+        image_stack = image_stack[reference_only:]
+    align_seconds = time.perf_counter() - start
+    # Frames other than the reference each cost about the same ECC time
+    per_frame = align_seconds / max(1, len(aligned_frames) - 1)
+    warps, scores = warps[reference_only:], scores[reference_only:]
 
-    image_stack = ensure_same_size(image_stack)
-    image_stack = align_images(image_stack)
+    stack = AlignedStack(folder_path, [image_files[i] for i in used], warps, scores, (len(used),) + tuple(frame_shape),
+                         member_prefix, max_value)
+    if pyramid_levels is not None:
+        stack.frames, stack.pyramids = aligned, pyramids
+    if pruned:
+        stack.pruned = pruned
+        stack.prune_seconds_saved = per_frame * (len(pruned) - reference_only) - prepass_seconds
 
     if use_cache:
         try:
-            os.makedirs(cache_dir, exist_ok=True)
-            np.save(cache_file, image_stack)
-            print(f"Saved preprocessed images to cache: {cache_file}")
+            _save_cache(cache_file, stack, signature, [signature[i][0] for i in used], prune)
+            print(f"Saved alignment to cache: {cache_file}")
+            freed = remove_legacy_cache(folder_path, member_prefix)
+            if freed:
+                print(f"Removed the old aligned-stack cache entry ({freed / 2**20:.0f} MB)")
         except Exception as e:
             print(f"Failed to save cache: {e}")
 
-    return image_stack
- 
\ No newline at end of file
+    if lazy:
+        return stack
+    if stack.frames is not None:
+        return stack.frames
+    if image_stack is None:
+        return np.asarray(stack)
+    return np.stack([warp_image(image, warp) for image, warp in zip(image_stack, warps)], axis=0)
@@ -7,6 +7,8 @@ import cv2
 import numpy as np
 import os
 
+from .progress import report
+
 def build_gaussian_pyramid(image, max_levels):
     """
     Build a Gaussian pyramid for a given image. 
@@ -51,13 +53,16 @@ def build_laplacian_pyramid(gaussian_pyramid):
 
     return laplacian_pyramid, gaussian_pyramid[-1]
 
-def build_pyramids_stack(images, levels, gaussian_pyramid_dir=None, laplacian_pyramid_dir=None):
+def build_pyramids_stack(images, levels, gaussian_pyramid_dir=None, laplacian_pyramid_dir=None, progress=None,
+                         max_value=255.0):
     """
     Build Gaussian and Laplacian pyramids for a stack of images.
 
     Args:
         images (np.ndarray): A 3D numpy array containing the stacked images.
         levels (int): The number of levels in the pyramids.
+        progress (ProgressToken): Optional; reports "pyramids" after every image and can cancel.
+        max_value (float): Top of the source range, for the debug images only.
     Returns:
         tuple: A tuple containing two lists:
             - gaussian_pyramids: A list of Gaussian pyramids for each image.
@@ -67,22 +72,32 @@ def build_pyramids_stack(images, levels, gaussian_pyramid_dir=None, laplacian_py
     gaussian_pyramids = []
     laplacian_pyramids = []
 
-    for image in images:
+    for i, image in enumerate(images):
         gaussian_pyramid = build_gaussian_pyramid(image, levels)
         laplacian_pyramid, top_gaussian = build_laplacian_pyramid(gaussian_pyramid)
 
         top_gaussians.append(top_gaussian)
         gaussian_pyramids.append(gaussian_pyramid)
         laplacian_pyramids.append(laplacian_pyramid)
+        report(progress, "pyramids", i + 1, len(images))
+
+    save_pyramids(gaussian_pyramids, laplacian_pyramids, gaussian_pyramid_dir, laplacian_pyramid_dir, max_value)
+    return gaussian_pyramids, laplacian_pyramids, top_gaussians
 
-    # save pyramids if directories are provided
+def save_pyramids(gaussian_pyramids, laplacian_pyramids, gaussian_pyramid_dir=None, laplacian_pyramid_dir=None,
+                  max_value=255.0):
+    """
+    Write the pyramid levels of every image as 8-bit PNGs for debugging (Laplacians shifted
+    by 128). Levels of sources deeper than 8 bits (max_value) are scaled down to 0-255 first.
+    """
+    scale = 255.0 / max_value
     if gaussian_pyramid_dir is not None:
         os.makedirs(gaussian_pyramid_dir, exist_ok=True)
         for i, gpyr in enumerate(gaussian_pyramids):
             image_dir = os.path.join(gaussian_pyramid_dir, f"image_{i:03d}")
             os.makedirs(image_dir, exist_ok=True)
             for k, level in enumerate(gpyr):
-                cv2.imwrite(os.path.join(image_dir, f"level_{k:02d}.png"), level)
+                cv2.imwrite(os.path.join(image_dir, f"level_{k:02d}.png"), level * scale if scale != 1 else level)
 
     if laplacian_pyramid_dir is not None:
         os.makedirs(laplacian_pyramid_dir, exist_ok=True)
@@ -90,6 +105,4 @@ def build_pyramids_stack(images, levels, gaussian_pyramid_dir=None, laplacian_py
             image_dir = os.path.join(laplacian_pyramid_dir, f"image_{i:03d}")
             os.makedirs(image_dir, exist_ok=True)
             for k, level in enumerate(lpyr):
-                cv2.imwrite(os.path.join(image_dir, f"level_{k:02d}.png"), level + 128)  # shift for visualization
-        
-    return gaussian_pyramids, laplacian_pyramids, top_gaussians
\ No newline at end of file
+                cv2.imwrite(os.path.join(image_dir, f"level_{k:02d}.png"), level * scale + 128)  # shift for visualization
\ No newline at end of file
@@ -5,7 +5,9 @@ Baseline: use absolute of laplacian as sharpness metric
 import cv2
 import numpy as np
 
-def compute_sharpness_map(laplacian_pyramids, output_dir=None):
+from .progress import report
+
+def compute_sharpness_map(laplacian_pyramids, output_dir=None, progress=None):
     """
     Compute the sharpness map from the Laplacian pyramid.
 
@@ -15,6 +17,7 @@ def compute_sharpness_map(laplacian_pyramids, output_dir=None):
             - len(laplacian_pyramids[0]) = num_levels
             Each laplacian_pyramids[i] is a list: [L0, L1, ..., L{L-1}],
             where Lk is a 2D array (H_k, W_k) for level k.
+        progress (ProgressToken): Optional; reports "sharpness" after every image and can cancel.
 
     Returns:
         sharpness_maps (list[list[np.ndarray]]):
@@ -47,6 +50,7 @@ def compute_sharpness_map(laplacian_pyramids, output_dir=None):
             level_sharpness.append(Ek)
 
         sharpness_maps.append(level_sharpness)
+        report(progress, "sharpness", i + 1, num_images)
 
     # print("Sharpness maps shape:", [[sharpness_maps[i][k].shape for k in range(num_levels)] for i in range(num_images)])
 
@@ -6,10 +6,13 @@ for multi-focus (multi-image) fusion.
 import cv2
 import numpy as np
 
+from .progress import report
 
-def build_raw_masks(sharpness_maps):
+
+def build_raw_masks(sharpness_maps, progress=None):
     """
     Build raw (hard) decision masks from sharpness maps.
+    Reports "masks" after every level if a ProgressToken is given.
     """
     num_images = len(sharpness_maps)
     if num_images == 0:
@@ -35,11 +38,12 @@ def build_raw_masks(sharpness_maps):
         for i in range(num_images):
             mask = (idx_max == i).astype(np.float32)  # (H_k, W_k), 0/1
             raw_masks[i][k] = mask
+        report(progress, "masks", k + 1, num_levels)
 
     return raw_masks
 
 
-def smooth_and_normalize_masks(raw_masks, sigma=1.0, ksize=5):
+def smooth_and_normalize_masks(raw_masks, sigma=1.0, ksize=5, progress=None):
     """
     Smooth raw masks (edge-preserving at a basic level) and normalize
     so that sum_i W_i^k(x,y) == 1 (approximately).
@@ -49,6 +53,7 @@ def smooth_and_normalize_masks(raw_masks, sigma=1.0, ksize=5):
             raw_masks[i][k] = the raw 0/1 mask of image i at level k, shape (H_k, W_k).
         sigma (float): std of Gaussian blur
         ksize (int): size of Gaussian kernel (must be odd).
+        progress (ProgressToken): Optional; reports "smoothing" after every level and can cancel.
 
     Returns:
         smoothed_masks (list[list[np.ndarray]]):
@@ -86,10 +91,11 @@ def smooth_and_normalize_masks(raw_masks, sigma=1.0, ksize=5):
         # Unpack back to list[list[np.ndarray]]
         for i in range(num_images):
             smoothed_masks[i][k] = norm_stack[i]
+        report(progress, "smoothing", k + 1, num_levels)
 
     return smoothed_masks
 
-def build_masks(sharpness_maps, sigma=1.0, ksize=5):
-    raw_masks = build_raw_masks(sharpness_maps)
-    smoothed_masks = smooth_and_normalize_masks(raw_masks, sigma=sigma, ksize=ksize)
+def build_masks(sharpness_maps, sigma=1.0, ksize=5, progress=None):
+    raw_masks = build_raw_masks(sharpness_maps, progress=progress)
+    smoothed_masks = smooth_and_normalize_masks(raw_masks, sigma=sigma, ksize=ksize, progress=progress)
     return smoothed_masks
\ No newline at end of file
@@ -7,7 +7,9 @@ import cv2
 import numpy as np
 import os
 
-def fuse_laplacian_pyramids(laplacian_pyramids, smoothed_masks, output_dir=None):
+from .progress import report
+
+def fuse_laplacian_pyramids(laplacian_pyramids, smoothed_masks, output_dir=None, progress=None):
     num_images = len(laplacian_pyramids)
     if num_images == 0:
         return []
@@ -41,6 +43,7 @@ def fuse_laplacian_pyramids(laplacian_pyramids, smoothed_masks, output_dir=None)
             Lk_fused += Lk * Wk
 
         fused_laplacian.append(Lk_fused)
+        report(progress, "fusion", k + 1, num_levels)
         # save fused laplacian level for debugging if output_dir is provided
         if output_dir is not None:
             os.makedirs(output_dir, exist_ok=True)
@@ -87,7 +90,11 @@ def fuse_top_gaussian(top_gaussians, method="mean", output_dir=None):
     return fused_top
 
 
-def reconstruct_from_pyramid(fused_laplacian, fused_top):
+def reconstruct_from_pyramid(fused_laplacian, fused_top, progress=None, max_value=255.0):
+    """
+    Collapse a fused Laplacian pyramid and clip the result to the source range [0, max_value]
+    (255 for 8-bit sources, 65535 for 16-bit ones).
+    """
     if fused_top is None:
         return None
 
@@ -101,12 +108,14 @@ def reconstruct_from_pyramid(fused_laplacian, fused_top):
         H, W = Lk.shape[:2]
         up = cv2.pyrUp(current, dstsize=(W, H))
         current = up + Lk
+        report(progress, "reconstruct", num_levels - k, num_levels)
 
-    fused_image = np.clip(current, 0.0, 255.0)
+    fused_image = np.clip(current, 0.0, max_value)
     return fused_image
 
-def fuse_pyramids_and_reconstruct(laplacian_pyramids, top_gaussians, smoothed_masks, top_fusion_method="mean", output_dir=None):
-    fused_laplacian = fuse_laplacian_pyramids(laplacian_pyramids, smoothed_masks, output_dir=output_dir)
+def fuse_pyramids_and_reconstruct(laplacian_pyramids, top_gaussians, smoothed_masks, top_fusion_method="mean", output_dir=None,
+                                  progress=None, max_value=255.0):
+    fused_laplacian = fuse_laplacian_pyramids(laplacian_pyramids, smoothed_masks, output_dir=output_dir, progress=progress)
     fused_top = fuse_top_gaussian(top_gaussians, method=top_fusion_method, output_dir=output_dir)
-    fused_image = reconstruct_from_pyramid(fused_laplacian, fused_top)
+    fused_image = reconstruct_from_pyramid(fused_laplacian, fused_top, progress=progress, max_value=max_value)
     return fused_image
\ No newline at end of file
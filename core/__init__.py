@@ -0,0 +1,10 @@
+"""
+Laplacian pyramid based focus stacking.
+
+The package is intentionally light to import: nothing here pulls in OpenCV,
+Tk or the network libraries. Import the stage modules (``core._01_preprocess``
+... ``core._05_fusion``) or the entry points (``core.main``, ``core.gui``,
+``core.datasets``) directly when they are needed.
+"""
+
+__version__ = "0.1.0"
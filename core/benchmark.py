@@ -0,0 +1,357 @@
+"""
+Speed-vs-quality regression harness for the pipeline variants (`focus-stack benchmark`).
+
+Every variant fuses the same stacks as the reference pipeline (align, then fuse the whole
+stack in memory). The stacks are the datasets in the data directory plus synthetic stacks
+rendered from a known all-in-focus image. For each variant the harness reports runtime,
+peak memory (numpy and OpenCV buffers, via tracemalloc) and PSNR/SSIM against the
+reference output and, for synthetic stacks, against the ground truth. A variant fails
+when its output drops below its declared quality budget against the reference.
+
+The synthetic stacks also check the reference itself: every variant, the reference
+included, must meet the stack's ground-truth budget and recover the known frame motion to
+within MAX_WARP_ERROR. The "full-resolution" variant registers with single-scale ECC on the
+full frames, independently of estimate_warps.
+
+To cover a new fast path, add it to VARIANTS with its budget. Exact variants (budget
+EXACT) must reproduce the reference pixel for pixel. Variants return the fused image and
+the aligned stack they fused (None if they do not build one).
+"""
+
+import math
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from skimage.metrics import peak_signal_noise_ratio, structural_similarity
+
+from ._01_preprocess import load_image_stack, preprocess_image_stack, read_max_value, warp_image
+from .datasets import list_datasets
+from .imagefile import to_bit_depth
+from .pipeline import fuse_in_memory, fuse_pyramids, fuse_region, fuse_streaming, fuse_tiled
+from .prune import DEFAULT_MIN_SHARE
+
+MASK_TYPE = "Soft"
+TOP_METHOD = "max"
+SIGMA = 1.2
+KSIZE = 7
+
+# Pixels at the image border left out of the comparison with the ground truth: frames
+# warped into the reference have no data there
+GT_MARGIN = 16
+
+# Synthetic stacks: (height, width, frames, flat subject) and the PSNR/SSIM every variant
+# must reach against their ground truth
+SYNTHETIC_STACKS = (
+    ((480, 640, 8, False), {"min_psnr": 26.0, "min_ssim": 0.90}),
+    ((600, 800, 12, False), {"min_psnr": 26.0, "min_ssim": 0.90}),
+    # Every frame evenly defocused: registration has to cope with blur differences alone
+    ((600, 800, 8, True), {"min_psnr": 26.0, "min_ssim": 0.87}),
+)
+# Largest error (pixels) of a registered frame's warp at the image corners, on synthetic stacks
+MAX_WARP_ERROR = 1.0
+
+
+def _aligned(folder_path, **kwargs):
+    # Variants are timed end to end, alignment included
+    return preprocess_image_stack(folder_path, use_cache=False, lazy=True, **kwargs)
+
+
+def run_reference(folder_path, levels):
+    stack = _aligned(folder_path)
+    return fuse_in_memory(np.asarray(stack), levels, MASK_TYPE, TOP_METHOD, SIGMA, KSIZE, max_value=stack.max_value), stack
+
+
+def full_resolution_warps(image_stack):
+    """
+    Warps from single-scale ECC on the full-resolution frames, the registration the pipeline
+    used before it went coarse to fine. Slow, but independent of estimate_warps, so it
+    catches regressions there.
+    """
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 500, 1e-5)
+    ref_gray = cv2.cvtColor(image_stack[0], cv2.COLOR_BGR2GRAY)
+    warps = np.tile(np.eye(2, 3, dtype=np.float32), (len(image_stack), 1, 1))
+    for i in range(1, len(image_stack)):
+        img_gray = cv2.cvtColor(image_stack[i], cv2.COLOR_BGR2GRAY)
+        try:
+            _, warps[i] = cv2.findTransformECC(ref_gray, img_gray, warps[i].copy(), cv2.MOTION_AFFINE, criteria)
+        except cv2.error as e:
+            print(f"Full-resolution alignment failed for image {i}: {e}")
+    return warps
+
+
+def run_full_resolution(folder_path, levels):
+    images = load_image_stack(folder_path)
+    max_value = read_max_value(folder_path)
+    warps = full_resolution_warps(images)
+    aligned = np.stack([warp_image(image, warp) for image, warp in zip(images, warps)], axis=0)
+    return fuse_in_memory(aligned, levels, MASK_TYPE, TOP_METHOD, SIGMA, KSIZE, max_value=max_value), None
+
+
+def run_shared_pyramids(folder_path, levels):
+    stack = _aligned(folder_path, pyramid_levels=levels)
+    _, laplacian_pyrs, top_gaussians = stack.pyramids
+    fused = fuse_pyramids(laplacian_pyrs, top_gaussians, MASK_TYPE, TOP_METHOD, SIGMA, KSIZE, max_value=stack.max_value)
+    return fused, stack
+
+
+def run_streaming(folder_path, levels):
+    stack = _aligned(folder_path)
+    return fuse_streaming(stack, levels, MASK_TYPE, TOP_METHOD, SIGMA, KSIZE), stack
+
+
+def run_tiled(folder_path, levels):
+    stack = _aligned(folder_path)
+    step = 2 ** levels
+    strip_height = max(step, stack.shape[1] // 4 // step * step)
+    return fuse_tiled(stack, levels, strip_height, MASK_TYPE, TOP_METHOD, SIGMA, KSIZE), stack
+
+
+def run_regions(folder_path, levels):
+    # Four quadrants fused independently with fuse_region
+    stack = _aligned(folder_path)
+    height, width = stack.shape[1:3]
+    fused = np.empty((height, width) + tuple(stack.shape[3:]), dtype=np.float32)
+    for y0, y1 in ((0, height // 2), (height // 2, height)):
+        for x0, x1 in ((0, width // 2), (width // 2, width)):
+            fused[y0:y1, x0:x1] = fuse_region(stack, (x0, y0, x1 - x0, y1 - y0), levels, MASK_TYPE, TOP_METHOD, SIGMA, KSIZE)
+    return fused, stack
+
+
+def run_pruned(folder_path, levels):
+    stack = _aligned(folder_path, prune=DEFAULT_MIN_SHARE)
+    return fuse_in_memory(np.asarray(stack), levels, MASK_TYPE, TOP_METHOD, SIGMA, KSIZE, max_value=stack.max_value), stack
+
+
+EXACT = {"min_psnr": math.inf, "min_ssim": 1.0}
+
+# name: (function(folder_path, levels) -> (fused float image, AlignedStack or None), budget
+# against the reference)
+VARIANTS = {
+    "reference": (run_reference, None),
+    "shared-pyramids": (run_shared_pyramids, EXACT),
+    "streaming": (run_streaming, EXACT),
+    "tiled": (run_tiled, EXACT),
+    "regions": (run_regions, EXACT),
+    # Skipped frames lose the few pixels they would have won; the end frames of every
+    # synthetic sweep focus past the scene and must be skipped
+    "pruned": (run_pruned, {"min_psnr": 28.0, "min_ssim": 0.95, "min_pruned": 2}),
+    # The registration the pipeline used before coarse-to-fine ECC, to catch regressions in it
+    "full-resolution": (run_full_resolution, {"min_psnr": 33.0, "min_ssim": 0.98}),
+}
+
+
+def make_synthetic_stack(folder_path, height=480, width=640, num_frames=8, seed=0, flat=False, return_warps=False):
+    """
+    Render a focus sweep of a known scene and write it as PNG frames.
+
+    The scene is multi-scale texture with sharp-edged shapes on a depth ramp along x (or, if
+    flat, all at mid depth, so every frame is evenly defocused). Each frame is in focus
+    around one depth (the first and last frames focus well past both ends of the ramp) and
+    blurred in proportion to the distance from it, then moved by a small affine jitter like
+    a hand-held or focus-breathing sweep. Frame 0 is not moved, so the ground truth is in
+    the coordinates the pipeline aligns to.
+
+    Returns:
+        np.ndarray: The all-in-focus ground truth (height, width, 3) float32, 0-255, and
+        with return_warps also the (num_frames, 2, 3) warps the frames were moved by, in the
+        convention of estimate_warps.
+    """
+    rng = np.random.default_rng(seed)
+    scene = np.zeros((height, width, 3), np.float32)
+    for scale in (1, 2, 4, 8, 16, 32):
+        noise = rng.normal(0, 1, (height, width, 3)).astype(np.float32)
+        scene += cv2.GaussianBlur(noise, (0, 0), scale) * scale ** 0.8
+    scene = (scene - scene.min()) / (scene.max() - scene.min()) * 200 + 20
+    for _ in range(40):
+        color = tuple(int(v) for v in rng.integers(0, 255, 3))
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.circle(scene, center, int(rng.integers(5, 60)), color, -1)
+        end = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.line(scene, center, end, color, 2)
+
+    # Blur of the scene at sigma 0, 1.5, 3, ... and the blur each pixel gets in each frame
+    sigmas = np.arange(0, 7.5, 1.5)
+    blurred = np.stack([scene] + [cv2.GaussianBlur(scene, (0, 0), s) for s in sigmas[1:]], axis=0)
+    depth = np.tile(np.linspace(0, 1, width, dtype=np.float32), (height, 1))
+    if flat:
+        depth[:] = 0.5
+    focus = np.concatenate([[-1.0], np.linspace(0, 1, num_frames - 2), [2.0]])
+
+    os.makedirs(folder_path, exist_ok=True)
+    warps = np.tile(np.eye(2, 3, dtype=np.float32), (num_frames, 1, 1))
+    for i, f in enumerate(focus):
+        index = np.clip(np.abs(depth - f) * 8 / 1.5, 0, len(sigmas) - 1.001)
+        lo = index.astype(np.int64)
+        weight = (index - lo)[..., np.newaxis]
+        rows, cols = np.indices(depth.shape)
+        frame = blurred[lo, rows, cols] * (1 - weight) + blurred[lo + 1, rows, cols] * weight
+        if i > 0:
+            scale = 1 + 0.002 * i
+            shift = rng.uniform(-1, 1, 2)
+            warps[i] = [[scale, 0.001 * i, shift[0]], [-0.001 * i, scale, shift[1]]]
+            frame = cv2.warpAffine(frame, warps[i], (width, height), borderMode=cv2.BORDER_REFLECT)
+        frame = frame + rng.normal(0, 1, frame.shape)
+        cv2.imwrite(os.path.join(folder_path, f"frame_{i:02d}.png"), np.clip(frame, 0, 255).astype(np.uint8))
+    return (scene, warps) if return_warps else scene
+
+
+def max_warp_error(stack, true_warps):
+    """
+    Largest distance (pixels) between where a frame's estimated and true warps put the image
+    corners, over the frames of an aligned synthetic stack (pruned frames are skipped).
+    """
+    height, width = stack.shape[1:3]
+    corners = np.float32([[0, 0, 1], [width, 0, 1], [0, height, 1], [width, height, 1]])
+    error = 0.0
+    for image_file, warp in zip(stack.image_files, stack.warps):
+        # Frames are named frame_<index>.png
+        index = int(os.path.splitext(os.path.basename(image_file))[0].split("_")[-1])
+        distances = np.linalg.norm(corners @ warp.T - corners @ true_warps[index].T, axis=1)
+        error = max(error, float(distances.max()))
+    return error
+
+
+def compare(image, reference, margin=0, max_value=255.0):
+    """
+    PSNR (dB, inf if identical) and SSIM of two fused images, as the 8- or 16-bit images that
+    are saved for sources with this max_value.
+    """
+    bit_depth = 16 if max_value > 255 else 8
+    data_range = 2 ** bit_depth - 1
+    a = to_bit_depth(image, bit_depth, max_value)
+    b = to_bit_depth(reference, bit_depth, max_value)
+    if margin:
+        a = a[margin:-margin, margin:-margin]
+        b = b[margin:-margin, margin:-margin]
+    if np.array_equal(a, b):
+        return math.inf, 1.0
+    psnr = peak_signal_noise_ratio(b, a, data_range=data_range)
+    ssim = structural_similarity(b, a, data_range=data_range, channel_axis=-1)
+    return float(psnr), float(ssim)
+
+
+def measure(function, folder_path, levels, memory=True):
+    """
+    Run a variant and return (fused image, aligned stack or None, seconds, peak traced bytes or None).
+
+    Memory is traced in a second run so that tracemalloc does not slow down the timed one.
+    """
+    start = time.perf_counter()
+    fused, stack = function(folder_path, levels)
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function(folder_path, levels)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return fused, stack, seconds, peak
+
+
+def run_benchmark(data_dir="data", datasets=None, variants=None, levels=4, synthetic=True, memory=True):
+    """
+    Run every variant on every stack and check the quality budgets.
+
+    Args:
+        data_dir (str): Directory with the datasets (missing is fine).
+        datasets (list): Dataset names to use (default: all in data_dir).
+        variants (list): Variant names (default: all of VARIANTS); the reference always runs.
+        levels (int): Pyramid levels.
+        synthetic (bool): Also run on the synthetic stacks with ground truth.
+        memory (bool): Measure peak memory (runs each variant twice).
+    Returns:
+        list[dict]: One result per (stack, variant) with "dataset", "variant", "seconds",
+        "peak_memory", "psnr", "ssim", "psnr_gt", "ssim_gt", "warp_error", "pruned" (frames
+        skipped), "budget" and "passed". A variant passes if it meets its budget against the
+        reference and, on synthetic stacks, the stack's ground-truth budget, MAX_WARP_ERROR
+        and the budget's "min_pruned".
+    """
+    names = list(VARIANTS) if variants is None else ["reference"] + [v for v in variants if v != "reference"]
+    unknown = [name for name in names if name not in VARIANTS]
+    if unknown:
+        raise ValueError(f"Unknown variants: {', '.join(unknown)} (known: {', '.join(VARIANTS)})")
+
+    stacks = []
+    if os.path.isdir(data_dir):
+        for name in datasets if datasets is not None else list_datasets(data_dir):
+            stacks.append((name, os.path.join(data_dir, name), None))
+
+    temp_dir = tempfile.mkdtemp(prefix="focus-stack-benchmark-")
+    try:
+        if synthetic:
+            for i, ((height, width, num_frames, flat), gt_budget) in enumerate(SYNTHETIC_STACKS):
+                name = f"synthetic-{width}x{height}x{num_frames}" + ("-flat" if flat else "")
+                folder_path = os.path.join(temp_dir, name)
+                ground_truth, warps = make_synthetic_stack(folder_path, height, width, num_frames, seed=i, flat=flat,
+                                                           return_warps=True)
+                stacks.append((name, folder_path, (ground_truth, warps, gt_budget)))
+
+        results = []
+        for dataset, folder_path, truth in stacks:
+            print(f"Benchmarking {dataset}...")
+            max_value = read_max_value(folder_path)
+            reference = None
+            for name in names:
+                function, budget = VARIANTS[name]
+                fused, stack, seconds, peak = measure(function, folder_path, levels, memory)
+                if reference is None:
+                    reference = fused
+                psnr, ssim = compare(fused, reference, max_value=max_value)
+                passed = budget is None or (psnr >= budget["min_psnr"] and ssim >= budget["min_ssim"])
+                pruned = len(stack.pruned) if stack is not None else None
+                psnr_gt = ssim_gt = warp_error = None
+                if truth is not None:
+                    ground_truth, true_warps, gt_budget = truth
+                    psnr_gt, ssim_gt = compare(fused, ground_truth, margin=GT_MARGIN, max_value=max_value)
+                    passed = passed and psnr_gt >= gt_budget["min_psnr"] and ssim_gt >= gt_budget["min_ssim"]
+                    if stack is not None:
+                        warp_error = max_warp_error(stack, true_warps)
+                        passed = passed and warp_error <= MAX_WARP_ERROR
+                    if budget is not None and "min_pruned" in budget:
+                        passed = passed and pruned >= budget["min_pruned"]
+                results.append({
+                    "dataset": dataset, "variant": name, "seconds": seconds, "peak_memory": peak,
+                    "psnr": psnr, "ssim": ssim, "psnr_gt": psnr_gt, "ssim_gt": ssim_gt,
+                    "warp_error": warp_error, "pruned": pruned, "budget": budget, "passed": passed,
+                })
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return results
+
+
+def format_results(results):
+    """
+    Table of benchmark results, one row per (stack, variant).
+    """
+    def number(value, fmt):
+        if value is None:
+            return "-"
+        if value == math.inf:
+            return "exact"
+        return format(value, fmt)
+
+    header = (f"{'dataset':<28} {'variant':<16} {'time':>8} {'peak MB':>8} {'PSNR':>7} {'SSIM':>7} {'PSNR gt':>8} "
+              f"{'SSIM gt':>8} {'warp px':>8} {'pruned':>6}  budget")
+    lines = [header, "-" * len(header)]
+    for r in results:
+        if r["budget"] is None:
+            budget = "reference" + ("" if r["passed"] else ": FAIL")
+        elif r["budget"]["min_psnr"] == math.inf:
+            budget = "exact: " + ("ok" if r["passed"] else "FAIL")
+        else:
+            budget = f">= {r['budget']['min_psnr']:.0f} dB, {r['budget']['min_ssim']:.2f}: " + ("ok" if r["passed"] else "FAIL")
+        peak = r["peak_memory"] / 2 ** 20 if r["peak_memory"] is not None else None
+        lines.append(
+            f"{r['dataset']:<28} {r['variant']:<16} {r['seconds']:>7.2f}s {number(peak, '.0f'):>8} "
+            f"{number(r['psnr'], '.1f'):>7} {number(r['ssim'], '.4f'):>7} "
+            f"{number(r['psnr_gt'], '.1f'):>8} {number(r['ssim_gt'], '.4f'):>8} "
+            f"{number(r['warp_error'], '.2f'):>8} {number(r['pruned'], 'd'):>6}  {budget}")
+    return "\n".join(lines)
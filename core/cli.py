@@ -0,0 +1,245 @@
+"""
+Command line entry point (``focus-stack``).
+
+Every subcommand imports its implementation lazily, so ``focus-stack fuse`` never
+loads the network libraries or Tk, and ``focus-stack download`` never loads OpenCV.
+Keep module level imports in this file to the standard library.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Module imported by each subcommand, and the cumulative import time it may take (ms).
+# The budgets are deliberately loose so they hold on slow machines; what they catch is an
+# accidental heavy import (e.g. Tk or requests pulled into the fusing path).
+IMPORT_BUDGETS_MS = {
+    "core.cli": 50,
+    "core.main": 750,
+    "core.datasets": 50,
+    "core.gui": 1000,
+}
+
+# Modules that must not be loaded just by importing a subcommand's implementation.
+FORBIDDEN_IMPORTS = {
+    "core.cli": ("numpy", "cv2", "requests", "bs4", "tqdm", "tkinter", "PIL"),
+    "core.main": ("requests", "bs4", "tqdm", "tkinter", "PIL"),
+    "core.datasets": ("numpy", "cv2", "requests", "bs4", "tqdm", "tkinter", "PIL"),
+    "core.gui": ("requests", "bs4", "tqdm"),
+}
+
+
+def parse_roi(text):
+    """
+    Parse an "x,y,width,height" region argument.
+    """
+    try:
+        x, y, w, h = (int(value) for value in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected x,y,width,height, got {text!r}")
+    if w <= 0 or h <= 0:
+        raise argparse.ArgumentTypeError("region width and height must be positive")
+    return x, y, w, h
+
+
+def add_output_arguments(p):
+    # Choices mirror imagefile.OUTPUT_FORMATS and imagefile.COMPRESSION (not imported here, it loads OpenCV)
+    p.add_argument("--bit-depth", type=int, choices=[8, 16], default=None,
+                   help="Bits per channel of the fused image (default: that of the sources).")
+    p.add_argument("--format", choices=["png", "tiff"], default="png", help="Output image format.")
+    p.add_argument("--compression", choices=["default", "none", "lzw", "deflate"], default="default",
+                   help="Output compression (PNG: none or deflate; TIFF: none, lzw or deflate).")
+    p.add_argument("--ext", default=None, metavar="EXT",
+                   help="Extension of the source images, e.g. png or tif (default: png, tif and tiff).")
+
+
+def check_output_arguments(parser, args):
+    # Same rule as imagefile.check_output_options, checked before anything is loaded
+    if getattr(args, "format", None) == "png" and args.compression == "lzw":
+        parser.error("--compression lzw needs --format tiff (PNG supports none and deflate)")
+
+
+def cmd_fuse(args):
+    from .main import main
+
+    memory_budget = args.memory_budget_mb * 2**20 if args.memory_budget_mb else None
+    main(args.name, data_dir=args.data_dir, output_dir=args.output_dir, levels=args.levels,
+         mask_type=args.mask, top_method=args.top, memory_budget=memory_budget, strategy=args.strategy,
+         roi=args.roi, prune=args.prune, bit_depth=args.bit_depth, image_format=args.format,
+         compression=args.compression, file_extension=args.ext)
+
+
+def cmd_timelapse(args):
+    from .timelapse import run_timelapse
+
+    memory_budget = args.memory_budget_mb * 2**20 if args.memory_budget_mb else None
+    run_timelapse(args.names, data_dir=args.data_dir, output_dir=args.output_dir, levels=args.levels,
+                  mask_type=args.mask, top_method=args.top, memory_budget=memory_budget, strategy=args.strategy,
+                  bit_depth=args.bit_depth, image_format=args.format, compression=args.compression,
+                  file_extension=args.ext)
+
+
+def cmd_gui(args):
+    from .gui import main
+
+    main(data_dir=args.data_dir, output_dir=os.path.join(args.output_dir, "fused_images"))
+
+
+def cmd_download(args):
+    from .datasets import download_data
+
+    download_data(args.data_dir, extract=not args.no_extract)
+
+
+def cmd_cache(args):
+    from .datasets import precompute_cache
+
+    memory_limit = args.memory_limit_mb * 2**20 if args.memory_limit_mb else None
+    precompute_cache(args.data_dir, workers=args.workers, memory_limit=memory_limit, force=args.force)
+
+
+def cmd_init(args):
+    from .datasets import initialize
+
+    initialize(args.data_dir)
+
+
+def cmd_benchmark(args):
+    from .benchmark import format_results, run_benchmark
+
+    results = run_benchmark(args.data_dir, datasets=args.dataset, variants=args.variant, levels=args.levels,
+                            synthetic=not args.no_synthetic, memory=not args.no_memory)
+    print(format_results(results))
+    failed = [r for r in results if not r["passed"]]
+    if failed:
+        print(f"{len(failed)} variant run(s) exceeded their quality budget")
+        sys.exit(1)
+
+
+def measure_import_time(module):
+    """
+    Import a module in a fresh interpreter and measure it with ``-X importtime``.
+
+    Args:
+        module (str): Dotted module name.
+    Returns:
+        tuple: (cumulative import time in ms, set of module names loaded by the import).
+    """
+    code = f"import sys, {module}; print(','.join(sorted(sys.modules)))"
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [project_root, env.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, env=env, check=True)
+
+    # stderr lines look like: "import time:   self [us] | cumulative | imported package"
+    cumulative_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative_us = int(fields[1])
+
+    return cumulative_us / 1000.0, set(result.stdout.strip().split(","))
+
+
+def cmd_import_time(args):
+    failed = False
+    for module, budget_ms in IMPORT_BUDGETS_MS.items():
+        if args.budget_ms is not None:
+            budget_ms = args.budget_ms
+        elapsed_ms, loaded = measure_import_time(module)
+        leaked = [name for name in FORBIDDEN_IMPORTS.get(module, ()) if name in loaded]
+
+        status = "ok"
+        if elapsed_ms > budget_ms or leaked:
+            status = "FAIL"
+            failed = True
+        print(f"{module:<16} {elapsed_ms:8.1f} ms (budget {budget_ms} ms)  {status}")
+        if leaked:
+            print(f"    unexpected imports: {', '.join(leaked)}")
+
+    if failed:
+        sys.exit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="focus-stack", description="Laplacian pyramid focus stacking.")
+    parser.add_argument("--data-dir", default="data", help="Directory containing the image datasets.")
+    parser.add_argument("--output-dir", default="output", help="Root directory for generated outputs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("fuse", help="Fuse one dataset into an all-in-focus image.")
+    p.add_argument("name", help="Dataset folder name inside the data directory (or <archive>/<folder>).")
+    p.add_argument("--levels", type=int, default=4, help="Number of pyramid levels.")
+    p.add_argument("--mask", choices=["Soft", "Hard"], default="Soft", help="Decision mask type.")
+    p.add_argument("--top", choices=["max", "mean"], default="max", help="Top Gaussian fusion method.")
+    p.add_argument("--memory-budget-mb", type=int, default=None,
+                   help="Memory available for fusion (default: half of available memory).")
+    p.add_argument("--strategy", choices=["in-memory", "streaming", "tiled"], default=None,
+                   help="Force an execution strategy instead of letting the planner choose.")
+    p.add_argument("--roi", type=parse_roi, default=None, metavar="X,Y,W,H",
+                   help="Fuse only this region, at full resolution (reads just the region and its halo).")
+    p.add_argument("--prune", type=float, nargs="?", const=0.005, default=None, metavar="MIN_SHARE",
+                   help="Skip frames that win less than this share of pixels in a coarse pre-pass "
+                        "(default share 0.005), and near-duplicate neighbours.")
+    add_output_arguments(p)
+    p.set_defaults(func=cmd_fuse)
+
+    p = subparsers.add_parser("timelapse", help="Fuse a series of stacks of the same scene, one fused frame per step.")
+    p.add_argument("names", nargs="+",
+                   help="Stacks in time order, or a folder (or archive) whose sub-folders are the stacks.")
+    p.add_argument("--levels", type=int, default=4, help="Number of pyramid levels.")
+    p.add_argument("--mask", choices=["Soft", "Hard"], default="Soft", help="Decision mask type.")
+    p.add_argument("--top", choices=["max", "mean"], default="max", help="Top Gaussian fusion method.")
+    p.add_argument("--memory-budget-mb", type=int, default=None,
+                   help="Memory available for fusion (default: half of available memory).")
+    p.add_argument("--strategy", choices=["in-memory", "streaming", "tiled"], default=None,
+                   help="Force an execution strategy instead of letting the planner choose.")
+    add_output_arguments(p)
+    p.set_defaults(func=cmd_timelapse)
+
+    p = subparsers.add_parser("gui", help="Start the graphical interface.")
+    p.set_defaults(func=cmd_gui)
+
+    p = subparsers.add_parser("download", help="Download and extract the bundled datasets.")
+    p.add_argument("--no-extract", action="store_true", help="Keep the archive and read the datasets from it in place.")
+    p.set_defaults(func=cmd_download)
+
+    p = subparsers.add_parser("cache", help="Precompute the alignment cache for every dataset.")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of CPUs).")
+    p.add_argument("--memory-limit-mb", type=int, default=None,
+                   help="Memory ceiling for concurrently processed datasets (default: half of available memory).")
+    p.add_argument("--force", action="store_true", help="Recompute caches that are still valid.")
+    p.set_defaults(func=cmd_cache)
+
+    p = subparsers.add_parser("init", help="Download the datasets and precompute the cache.")
+    p.set_defaults(func=cmd_init)
+
+    p = subparsers.add_parser("benchmark", help="Compare every pipeline variant against the reference: "
+                                                "runtime, peak memory and PSNR/SSIM against quality budgets.")
+    p.add_argument("--dataset", action="append", default=None, help="Dataset to include (repeatable; default: all).")
+    p.add_argument("--variant", action="append", default=None, help="Variant to run (repeatable; default: all).")
+    p.add_argument("--levels", type=int, default=4, help="Number of pyramid levels.")
+    p.add_argument("--no-synthetic", action="store_true", help="Skip the synthetic stacks with ground truth.")
+    p.add_argument("--no-memory", action="store_true", help="Skip the (second, traced) run that measures peak memory.")
+    p.set_defaults(func=cmd_benchmark)
+
+    p = subparsers.add_parser("import-time", help="Check each subcommand's import time against its budget.")
+    p.add_argument("--budget-ms", type=float, default=None, help="Override every module's budget.")
+    p.set_defaults(func=cmd_import_time)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_output_arguments(parser, args)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
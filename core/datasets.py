@@ -0,0 +1,760 @@
+"""
+Dataset management: download the bundled source images and precompute the alignment cache.
+
+The network (requests, bs4) and progress bar (tqdm) libraries are imported inside the
+functions that use them, so cache-only work never pays for them.
+
+Downloads are resumable: progress is recorded in a small JSON manifest next to the
+target, and an interrupted transfer continues with an HTTP Range request instead of
+starting from zero. Archives can be extracted while they download, member by member,
+so the zip file itself never has to be stored on disk.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import time
+import zipfile
+import zlib
+
+FILE_ID = "1Ld-aduENwICbDshjeG9-WEuLaJ7B1XYu"
+GOOGLE_DRIVE_URL = "https://drive.google.com/uc?export=download&id={file_id}"
+
+# Read sizes adapt to the connection: grow while reads return quickly, shrink when they stall
+INITIAL_CHUNK_SIZE = 256 * 1024
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+
+MANIFEST_NAME = ".download_manifest.json"
+
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+DATA_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+# Central directory, digital signature, end records and archive extra data: nothing left to extract
+ARCHIVE_END_SIGNATURES = (b"PK\x01\x02", b"PK\x05\x05", b"PK\x05\x06", b"PK\x06\x06", b"PK\x06\x07", b"PK\x06\x08")
+
+
+class StreamingZipExtractor:
+    """
+    Extract a zip archive from a byte stream, writing every member as soon as its data has arrived.
+
+    Each member is decompressed to "<name>.part", checked against the CRC-32 and size stored in
+    the archive and only then renamed into place. resume_offset() is the archive offset of the
+    first member that is not completely extracted, which is where an interrupted download has
+    to restart.
+    """
+
+    def __init__(self, extract_to, offset=0):
+        self.extract_to = extract_to
+        self.offset = offset  # archive offset just past the last byte fed in
+        self.completed = []
+        self.finished = False
+        self._buffer = bytearray()
+        self._member = None
+        self._member_start = offset
+
+    def resume_offset(self):
+        return self._member_start
+
+    def reset(self, offset):
+        """
+        Discard any partially extracted member; the next byte written is at archive offset `offset`.
+        """
+        self._close_member(discard=True)
+        self._buffer = bytearray()
+        self.offset = offset
+        self._member_start = offset
+        self.finished = False
+
+    def write(self, data):
+        if self.finished:
+            # Central directory and trailing records are not needed for extraction
+            self.offset += len(data)
+            return
+        self._buffer += data
+        self.offset += len(data)
+        while not self.finished:
+            if self._member is None:
+                progressed = self._read_header()
+            else:
+                progressed = self._read_data()
+            if not progressed:
+                break
+
+    def finish(self):
+        if not self.finished:
+            raise zipfile.BadZipFile("Archive ended before its central directory")
+
+    def _member_path(self, name):
+        # Same policy as zipfile.extractall: drop absolute and parent components
+        parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+        return os.path.join(self.extract_to, *parts)
+
+    def _read_header(self):
+        buf = self._buffer
+        if len(buf) < 4:
+            return False
+        signature = bytes(buf[:4])
+        if signature != LOCAL_HEADER_SIGNATURE:
+            if signature in ARCHIVE_END_SIGNATURES:
+                self.finished = True
+                self._buffer = bytearray()
+                return False
+            raise zipfile.BadZipFile(f"Unexpected record at archive offset {self._member_start}")
+        if len(buf) < 30:
+            return False
+
+        (_, _, flags, method, _, _, crc, csize, usize, name_len, extra_len) = struct.unpack("<4sHHHHHIIIHH", buf[:30])
+        header_len = 30 + name_len + extra_len
+        if len(buf) < header_len:
+            return False
+        name = bytes(buf[30:30 + name_len]).decode("utf-8" if flags & 0x800 else "cp437")
+        extra = bytes(buf[30 + name_len:header_len])
+        del buf[:header_len]
+
+        zip64 = False
+        if csize == 0xFFFFFFFF or usize == 0xFFFFFFFF:
+            zip64 = True
+            usize, csize = self._zip64_sizes(extra, usize, csize)
+
+        if flags & 0x1:
+            raise zipfile.BadZipFile(f"Encrypted member not supported: {name}")
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise zipfile.BadZipFile(f"Unsupported compression method {method} for {name}")
+        has_descriptor = bool(flags & 0x8)
+
+        target = self._member_path(name)
+        if name.endswith("/"):
+            os.makedirs(target, exist_ok=True)
+            handle = None
+        else:
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            handle = open(target + ".part", "wb")
+
+        self._member = {
+            "name": name,
+            "target": target,
+            "file": handle,
+            "crc_expected": crc,
+            "size_expected": usize,
+            "remaining": csize,
+            "descriptor": has_descriptor,
+            "zip64": zip64,
+            "decompressor": zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None,
+            "crc": 0,
+            "size": 0,
+        }
+        return True
+
+    @staticmethod
+    def _zip64_sizes(extra, usize, csize):
+        pos = 0
+        while pos + 4 <= len(extra):
+            header_id, data_len = struct.unpack("<HH", extra[pos:pos + 4])
+            data = extra[pos + 4:pos + 4 + data_len]
+            if header_id == 0x0001:
+                field = 0
+                if usize == 0xFFFFFFFF:
+                    usize = struct.unpack("<Q", data[field:field + 8])[0]
+                    field += 8
+                if csize == 0xFFFFFFFF:
+                    csize = struct.unpack("<Q", data[field:field + 8])[0]
+                break
+            pos += 4 + data_len
+        return usize, csize
+
+    def _read_data(self):
+        m = self._member
+        buf = self._buffer
+
+        if m["descriptor"]:
+            size_fmt = "<Q" if m["zip64"] else "<I"
+            size_len = struct.calcsize(size_fmt)
+
+            # Compressed size is unknown up front: feed the deflate stream until it ends
+            if m["decompressor"] is not None:
+                if not buf:
+                    return False
+                self._write_member(m["decompressor"].decompress(bytes(buf)))
+                if not m["decompressor"].eof:
+                    self._buffer = bytearray()
+                    return False
+                self._buffer = buf = bytearray(m["decompressor"].unused_data)
+                m["decompressor"] = None
+                m["data_done"] = True
+
+            # Stored data ends at the first descriptor whose CRC and size match what came before it
+            while not m.get("data_done"):
+                pos = buf.find(DATA_DESCRIPTOR_SIGNATURE)
+                if pos < 0:
+                    # Keep a possible partial signature at the end of the buffer
+                    flush = max(len(buf) - 3, 0)
+                    self._write_member(bytes(buf[:flush]))
+                    del buf[:flush]
+                    return False
+                self._write_member(bytes(buf[:pos]))
+                del buf[:pos]
+                if len(buf) < 8 + size_len:
+                    return False
+                crc, csize = struct.unpack("<I" + size_fmt[1:], buf[4:8 + size_len])
+                if crc == m["crc"] and csize == m["size"]:
+                    m["data_done"] = True
+                else:
+                    self._write_member(bytes(buf[:1]))
+                    del buf[:1]
+
+            # Data descriptor: [signature] crc32, compressed size, uncompressed size
+            if len(buf) < 4:
+                return False
+            start = 4 if bytes(buf[:4]) == DATA_DESCRIPTOR_SIGNATURE else 0
+            end = start + 4 + 2 * size_len
+            if len(buf) < end:
+                return False
+            m["crc_expected"] = struct.unpack("<I", buf[start:start + 4])[0]
+            m["size_expected"] = struct.unpack(size_fmt, buf[start + 4 + size_len:end])[0]
+            del buf[:end]
+            self._complete_member()
+            return True
+
+        if m["remaining"]:
+            take = min(m["remaining"], len(buf))
+            if take == 0:
+                return False
+            data = bytes(buf[:take])
+            del buf[:take]
+            m["remaining"] -= take
+            if m["decompressor"] is not None:
+                data = m["decompressor"].decompress(data)
+            self._write_member(data)
+            if m["remaining"]:
+                return False
+
+        if m["decompressor"] is not None:
+            self._write_member(m["decompressor"].flush())
+        self._complete_member()
+        return True
+
+    def _write_member(self, data):
+        if not data:
+            return
+        m = self._member
+        m["crc"] = zlib.crc32(data, m["crc"])
+        m["size"] += len(data)
+        m["file"].write(data)
+
+    def _complete_member(self):
+        m = self._member
+        if m["file"] is not None:
+            m["file"].close()
+            if m["crc"] != m["crc_expected"] or m["size"] != m["size_expected"]:
+                os.remove(m["target"] + ".part")
+                self._member = None
+                raise zipfile.BadZipFile(f"CRC or size mismatch for {m['name']}")
+            os.replace(m["target"] + ".part", m["target"])
+        if m["name"] not in self.completed:
+            self.completed.append(m["name"])
+        self._member = None
+        self._member_start = self.offset - len(self._buffer)
+
+    def _close_member(self, discard=False):
+        m = self._member
+        if m is None:
+            return
+        if m["file"] is not None:
+            m["file"].close()
+            if discard and os.path.exists(m["target"] + ".part"):
+                os.remove(m["target"] + ".part")
+        self._member = None
+
+
+class _FileSink:
+    """
+    Append downloaded bytes to "<destination>.part"; the part file's size is the resume offset.
+    """
+
+    def __init__(self, destination):
+        self.destination = destination
+        self.part_path = destination + ".part"
+        self.offset = os.path.getsize(self.part_path) if os.path.exists(self.part_path) else 0
+        self._file = None
+
+    def resume_offset(self):
+        return self.offset
+
+    def reset(self, offset):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.part_path, "r+b" if offset and os.path.exists(self.part_path) else "wb")
+        self._file.truncate(offset)
+        self._file.seek(offset)
+        self.offset = offset
+
+    def write(self, data):
+        self._file.write(data)
+        self.offset += len(data)
+
+    def finish(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.replace(self.part_path, self.destination)
+
+
+def _load_manifest(path, key):
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"key": key}
+    if manifest.get("key") != key:
+        return {"key": key}
+    return manifest
+
+
+def _save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _adapt_chunk_size(chunk_size, elapsed):
+    if elapsed < 0.1:
+        return min(chunk_size * 2, MAX_CHUNK_SIZE)
+    if elapsed > 1.0:
+        return max(chunk_size // 2, MIN_CHUNK_SIZE)
+    return chunk_size
+
+
+def _total_size(response, offset):
+    # 206 responses carry the full size in Content-Range: "bytes start-end/total"
+    content_range = response.headers.get("Content-Range")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    length = response.headers.get("Content-Length")
+    try:
+        return offset + int(length) if length is not None else None
+    except ValueError:
+        return None
+
+
+def stream_with_resume(session, url, sink, manifest, manifest_path, params=None, max_retries=5):
+    """
+    Stream a URL into a sink, resuming with HTTP Range requests after connection failures.
+
+    Args:
+        session (requests.Session): Session used for the requests.
+        url (str): Download URL.
+        sink: Object with write(bytes), resume_offset(), reset(offset) and finish().
+        manifest (dict): Download state ("validator", "total", "offset"); updated in place.
+        manifest_path (str): Where the manifest is persisted so another process can resume.
+        params (dict): Query parameters for the request.
+        max_retries (int): Consecutive failures tolerated before giving up.
+    """
+    import requests
+    from urllib3.exceptions import HTTPError as Urllib3Error
+    from tqdm import tqdm
+
+    chunk_size = INITIAL_CHUNK_SIZE
+    failures = 0
+    last_saved = 0.0
+
+    with tqdm(total=manifest.get("total"), initial=sink.resume_offset(), unit='B', unit_scale=True, desc='Downloading') as pbar:
+        while True:
+            offset = sink.resume_offset()
+            headers = {}
+            if offset > 0:
+                headers["Range"] = f"bytes={offset}-"
+                if manifest.get("validator"):
+                    # Only resume if the remote file is unchanged, otherwise the server sends it whole
+                    headers["If-Range"] = manifest["validator"]
+
+            try:
+                with session.get(url, params=params, headers=headers, stream=True, timeout=60) as response:
+                    if response.status_code == 416:
+                        # Our offset is past the end: the file changed or the part is bogus
+                        offset = 0
+                        sink.reset(0)
+                        manifest.pop("validator", None)
+                        continue
+                    response.raise_for_status()
+                    if offset > 0 and response.status_code != 206:
+                        print("Server did not resume the download, restarting from the beginning.")
+                        offset = 0
+                    sink.reset(offset)
+
+                    manifest["validator"] = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                    manifest["total"] = _total_size(response, offset)
+                    manifest["offset"] = offset
+                    _save_manifest(manifest_path, manifest)
+                    pbar.reset(total=manifest["total"])
+                    pbar.update(offset)
+
+                    while True:
+                        start = time.perf_counter()
+                        chunk = response.raw.read(chunk_size, decode_content=True)
+                        if not chunk:
+                            break
+                        sink.write(chunk)
+                        pbar.update(len(chunk))
+                        chunk_size = _adapt_chunk_size(chunk_size, time.perf_counter() - start)
+                        failures = 0
+
+                        now = time.monotonic()
+                        if now - last_saved > 1.0 and manifest.get("offset") != sink.resume_offset():
+                            manifest["offset"] = sink.resume_offset()
+                            _save_manifest(manifest_path, manifest)
+                            last_saved = now
+
+                if manifest.get("total") is not None and sink.offset < manifest["total"]:
+                    raise IOError(f"Connection closed after {sink.offset} of {manifest['total']} bytes")
+                sink.finish()
+                return
+
+            except (requests.RequestException, Urllib3Error, IOError) as e:
+                failures += 1
+                if failures > max_retries:
+                    manifest["offset"] = sink.resume_offset()
+                    _save_manifest(manifest_path, manifest)
+                    raise
+                wait = min(2 ** failures, 30)
+                chunk_size = max(chunk_size // 2, MIN_CHUNK_SIZE)
+                print(f"Download interrupted ({e}), resuming from byte {sink.resume_offset()} in {wait}s...")
+                time.sleep(wait)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def download_file(url, destination, params=None, session=None, expected_sha256=None, key=None):
+    """
+    Download a URL to a file, resuming a previous partial download of the same file if there is one.
+
+    Args:
+        url (str): Download URL.
+        destination (str): Final file path; data is written to "<destination>.part" until complete.
+        params (dict): Query parameters for the request.
+        session (requests.Session): Optional session (a new one is created otherwise).
+        expected_sha256 (str): If given, the completed file must have this SHA-256 hex digest.
+        key (str): Identity of the remote file for the manifest (defaults to the URL).
+    """
+    import requests
+
+    session = session or requests.Session()
+    manifest_path = destination + ".part.json"
+    manifest = _load_manifest(manifest_path, key or url)
+    sink = _FileSink(destination)
+    if "validator" not in manifest and sink.offset:
+        # A part file we cannot validate is useless for resuming
+        sink.offset = 0
+
+    stream_with_resume(session, url, sink, manifest, manifest_path, params=params)
+    os.remove(manifest_path)
+
+    if expected_sha256 is not None and file_sha256(destination) != expected_sha256.lower():
+        os.remove(destination)
+        raise ValueError(f"Checksum mismatch for {destination}")
+    print("Download completed:", destination)
+
+
+def download_and_extract(url, extract_to, params=None, session=None, key=None):
+    """
+    Download a zip archive and extract it while it streams in, without storing the archive.
+
+    An interrupted run leaves every completed member in place and resumes from the first
+    incomplete one. Each member is verified against the CRC-32 recorded in the archive.
+
+    Args:
+        url (str): Download URL of the zip archive.
+        extract_to (str): Destination directory.
+        params (dict): Query parameters for the request.
+        session (requests.Session): Optional session (a new one is created otherwise).
+        key (str): Identity of the remote file for the manifest (defaults to the URL).
+    Returns:
+        list: Names of the members extracted in this run.
+    """
+    import requests
+
+    session = session or requests.Session()
+    os.makedirs(extract_to, exist_ok=True)
+    manifest_path = os.path.join(extract_to, MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path, key or url)
+    offset = manifest.get("offset", 0) if "validator" in manifest else 0
+    if offset:
+        print(f"Resuming download at byte {offset}...")
+
+    extractor = StreamingZipExtractor(extract_to, offset=offset)
+    stream_with_resume(session, url, extractor, manifest, manifest_path, params=params)
+    os.remove(manifest_path)
+    print(f"Extraction completed: {len(extractor.completed)} entries.")
+    return extractor.completed
+
+
+def resolve_google_drive_url(session, file_id):
+    """
+    Resolve the direct download URL of a Google Drive file, passing the virus scan warning page.
+
+    Returns:
+        tuple: (url, params) for the final download request.
+    """
+    from bs4 import BeautifulSoup
+
+    URL = GOOGLE_DRIVE_URL.format(file_id=file_id)
+    with session.get(URL, stream=True) as response:
+        # Small files are served directly, without the warning page
+        if 'Content-Disposition' in response.headers:
+            return URL, {}
+        text = response.text
+
+    # Parse HTML for form action + hidden fields
+    soup = BeautifulSoup(text, "html.parser")
+    form = soup.find("form", {"id": "download-form"})
+    if form is None:
+        raise Exception("Could not find download form. Google may have changed the page structure.")
+
+    # Collect required parameters
+    params = {}
+    for inp in form.find_all("input"):
+        name = inp.get("name")
+        value = inp.get("value")
+        if name:
+            params[name] = value
+
+    return form["action"], params
+
+
+def download_large_file_from_google_drive(file_id, destination, expected_sha256=None):
+    import requests
+
+    session = requests.Session()
+    url, params = resolve_google_drive_url(session, file_id)
+    print("Downloading source images...")
+    download_file(url, destination, params=params, session=session, expected_sha256=expected_sha256, key=file_id)
+
+
+def download_and_extract_from_google_drive(file_id, extract_to):
+    import requests
+
+    session = requests.Session()
+    url, params = resolve_google_drive_url(session, file_id)
+    print("Downloading and extracting source images...")
+    return download_and_extract(url, extract_to, params=params, session=session, key=file_id)
+
+
+def verify_zip(zip_path):
+    """
+    Check the CRC-32 of every member of a downloaded zip archive; a corrupt archive is removed.
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as z:
+            bad_member = z.testzip()
+    except zipfile.BadZipFile:
+        bad_member = "central directory"
+    if bad_member is not None:
+        os.remove(zip_path)
+        raise zipfile.BadZipFile(f"Corrupt archive {zip_path} ({bad_member}), removed it; download it again")
+
+
+def extract_zip(zip_path, extract_to):
+    print("Extracting...")
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        z.extractall(extract_to)
+    print("Extraction completed.")
+
+def list_datasets(data_dir, file_extension=None):
+    """
+    List the datasets in data_dir, as paths relative to it.
+
+    Every sub-folder is a dataset. Zip/tar archives are read in place: each folder inside
+    an archive that holds images is a dataset named "<archive>/<folder>".
+    """
+    import posixpath
+    from ._01_preprocess import has_image_extension, is_archive, list_archive_members
+
+    if not os.path.exists(data_dir):
+        return []
+
+    datasets = []
+    for entry in sorted(os.listdir(data_dir)):
+        path = os.path.join(data_dir, entry)
+        if os.path.isdir(path):
+            datasets.append(entry)
+        elif is_archive(path):
+            folders = sorted({posixpath.dirname(name) for name in list_archive_members(path)
+                              if has_image_extension(name, file_extension)})
+            datasets.extend(posixpath.join(entry, folder) if folder else entry for folder in folders)
+    return datasets
+
+def read_stack_shape(folder_path, file_extension=None):
+    """
+    Shape (N, H, W, 3) of a dataset's stack, from the first image's header only.
+    """
+    import io
+    from PIL import Image
+    from ._01_preprocess import list_image_files, read_image_sources
+
+    image_files = list_image_files(folder_path, file_extension)
+    if not image_files:
+        return (0, 0, 0, 3)
+    _, data = next(read_image_sources(folder_path, image_files[:1]))
+    with Image.open(io.BytesIO(data)) as img:
+        width, height = img.size
+    return (len(image_files), height, width, 3)
+
+def estimate_preprocess_memory(folder_path, file_extension=None):
+    """
+    Rough peak memory (bytes) of aligning a dataset for the cache, read from image headers only.
+
+    The cache is built frame by frame (preprocess_image_stack(low_memory=True)), so a few
+    frames plus every frame's small grayscale registration levels are alive at once.
+    """
+    from .planner import estimate_preprocess_memory as estimate
+
+    return estimate(read_stack_shape(folder_path, file_extension), low_memory=True)
+
+def _init_cache_worker(threads):
+    import cv2
+    cv2.setNumThreads(threads)
+
+def _precompute_one(folder_path):
+    from ._01_preprocess import preprocess_image_stack, get_cache_files
+
+    start = time.perf_counter()
+    preprocess_image_stack(folder_path, use_cache=True, lazy=True, low_memory=True)
+    elapsed = time.perf_counter() - start
+    cache_size = sum(os.path.getsize(f) for f in get_cache_files(folder_path) if os.path.exists(f))
+    return elapsed, cache_size
+
+def precompute_cache(data_dir, workers=None, memory_limit=None, force=False):
+    """
+    Precompute the alignment cache of every dataset in data_dir (folders and folders inside
+    archives, see list_datasets), several datasets at a time.
+
+    Datasets whose cache is still valid are skipped, so an interrupted run picks up where it
+    stopped. Datasets are started largest first, and only while the estimated memory of the
+    running ones stays below memory_limit; a dataset that exceeds the limit on its own runs alone.
+
+    Args:
+        data_dir (str): Directory containing the dataset folders and archives.
+        workers (int): Number of worker processes (default: number of CPUs).
+        memory_limit (int): Memory ceiling in bytes (default: half of the available memory).
+        force (bool): Recompute caches even if they are valid.
+    Returns:
+        dict: {dataset name: (seconds, cache size in bytes)} for the datasets processed in this run.
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from tqdm import tqdm
+    from ._01_preprocess import is_cache_valid, remove_legacy_cache
+    from .planner import available_memory
+
+    print("Precomputing alignment cache for all datasets...")
+    freed = remove_legacy_cache()
+    if freed:
+        print(f"Removed old aligned-stack cache entries ({freed / 2**20:.0f} MB).")
+    if not os.path.exists(data_dir):
+        print(f"Data directory {data_dir} not found.")
+        return {}
+
+    folders = list_datasets(data_dir)
+    pending = []
+    for folder in folders:
+        folder_path = os.path.join(data_dir, folder)
+        if not force and is_cache_valid(folder_path):
+            print(f"{folder}: cache is up to date, skipping.")
+            continue
+        pending.append((estimate_preprocess_memory(folder_path), folder))
+    if not pending:
+        return {}
+
+    # Largest first, so the big stacks do not end up co-residing at the end of the run
+    pending.sort(reverse=True)
+
+    if memory_limit is None:
+        available = available_memory()
+        if available:
+            memory_limit = available // 2
+        else:
+            memory_limit = float("inf")
+            if workers is None:
+                print("Could not determine the available memory; processing one dataset at a time "
+                      "(set --memory-limit-mb or --workers to run several).")
+                workers = 1
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(pending))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    results = {}
+    running = {}
+    total_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_cache_worker, initargs=(threads,)) as pool, \
+            tqdm(total=len(pending), desc="Processing datasets") as pbar:
+        try:
+            while pending or running:
+                in_use = sum(estimate for estimate, _ in running.values())
+                for item in list(pending):
+                    if len(running) >= workers:
+                        break
+                    estimate, folder = item
+                    if in_use + estimate <= memory_limit or not running:
+                        if estimate > memory_limit:
+                            tqdm.write(f"{folder}: estimated {estimate / 2**20:.0f} MB exceeds the memory limit, running it alone.")
+                        future = pool.submit(_precompute_one, os.path.join(data_dir, folder))
+                        running[future] = item
+                        pending.remove(item)
+                        in_use += estimate
+                        if estimate > memory_limit:
+                            break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _, folder = running.pop(future)
+                    try:
+                        elapsed, cache_size = future.result()
+                        results[folder] = (elapsed, cache_size)
+                        tqdm.write(f"{folder}: {elapsed:.1f}s, cache {cache_size / 1024:.1f} KB")
+                    except Exception as e:
+                        tqdm.write(f"Failed to process {folder}: {e}")
+                    pbar.update(1)
+        except KeyboardInterrupt:
+            # Finished datasets are already cached; the next run resumes with the rest
+            for future in running:
+                future.cancel()
+            raise
+
+    print(f"Cached {len(results)} dataset(s) in {time.perf_counter() - total_start:.1f}s.")
+    return results
+
+def download_data(data_dir="data", file_id=FILE_ID, extract=True):
+    """
+    Download the bundled datasets into data_dir, extracting while downloading.
+    With extract=False the archive is kept as data_dir/datasets.zip and read in place.
+    Skipped when data_dir already has content, unless an interrupted download left a manifest.
+    """
+    archive_path = os.path.join(data_dir, "datasets.zip")
+    interrupted = (os.path.exists(os.path.join(data_dir, MANIFEST_NAME))
+                   or os.path.exists(archive_path + ".part.json"))
+    if not os.path.exists(data_dir) or not os.listdir(data_dir) or interrupted:
+        os.makedirs(data_dir, exist_ok=True)
+        if extract:
+            download_and_extract_from_google_drive(file_id, data_dir)
+        else:
+            download_large_file_from_google_drive(file_id, archive_path)
+            verify_zip(archive_path)
+    else:
+        print("Data folder already exists and is not empty, skipping download.")
+
+def initialize(data_dir="data"):
+    # 1. Download & extract
+    download_data(data_dir)
+
+    # 2. Precompute Cache
+    precompute_cache(data_dir)
+
+    print("Initialization complete! You can now run 'python gui.py'")
@@ -0,0 +1,544 @@
+import os
+import cv2
+import numpy as np
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk, messagebox
+from PIL import Image, ImageTk
+
+from ._01_preprocess import preprocess_image_stack
+from ._02_pyramids import build_pyramids_stack
+from ._03_sharpness import compute_sharpness_map
+from ._04_mask import build_masks, build_raw_masks
+from ._05_fusion import fuse_pyramids_and_reconstruct
+from .datasets import list_datasets, read_stack_shape
+from .imagefile import output_path, to_bit_depth, write_image_async
+from .pipeline import fuse_region, run_plan
+from .planner import plan_fusion, format_plan, max_pyramid_levels
+from .progress import Cancelled, ProgressToken
+from .prune import DEFAULT_MIN_SHARE, format_pruning
+
+PREVIEW_MAX_H = 450
+PREVIEW_MAX_W = 425
+# Gray level of the stand-in for a source frame whose preview could not be made
+PLACEHOLDER_GRAY = 64
+# Side of the full-resolution region fused when the result preview is clicked
+ZOOM_SIZE = 256
+
+# Progress bar range and status text of each stage that reports progress
+STAGE_PROGRESS = {
+    "load": (0, 10, "Loading images"),
+    "align": (10, 30, "Aligning images"),
+    "pyramids": (30, 45, "Building pyramids"),
+    "sharpness": (45, 55, "Computing sharpness maps"),
+    "masks": (55, 65, "Building masks"),
+    "smoothing": (65, 75, "Smoothing masks"),
+    "fusion": (75, 90, "Fusing pyramids"),
+    "reconstruct": (90, 98, "Reconstructing"),
+    "streaming": (30, 98, "Fusing frame by frame"),
+    "tiles": (30, 98, "Fusing strips"),
+}
+
+def preview_size(shape, max_h=PREVIEW_MAX_H, max_w=PREVIEW_MAX_W):
+    """
+    (width, height) of a preview that fits half the window roughly.
+    """
+    h, w = shape[:2]
+    scale = min(max_h / h, max_w / w)
+    return max(1, int(w * scale)), max(1, int(h * scale))
+
+def make_preview(image, size, max_value=255.0):
+    """
+    Convert a float BGR frame in [0, max_value] to a downscaled RGB uint8 preview.
+    Converting to uint8 first and resizing with INTER_AREA keeps the work small and the result alias-free.
+    """
+    frame = to_bit_depth(image, 8, max_value)
+    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+class PreviewFrames:
+    """
+    Source frame previews for the animation, converted lazily on a background thread.
+
+    A frame is converted when the animation (or the slider) first asks for it, plus one frame of
+    read-ahead. Only the cheap PhotoImage wrapping of a ready array happens on the Tk main thread.
+    """
+
+    def __init__(self, source_images, size, max_value=255.0):
+        self.source_images = source_images
+        self.size = size
+        self.max_value = max_value
+        self._arrays = [None] * len(source_images)
+        self._photos = [None] * len(source_images)
+        # Frames that could not be converted (e.g. a source file of a lazy stack is gone)
+        self.failed = set()
+        self._requested = set()
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._photos)
+
+    def _run(self):
+        while True:
+            idx = self._requests.get()
+            if idx is None:
+                return
+            try:
+                self._arrays[idx] = make_preview(self.source_images[idx], self.size, self.max_value)
+            except Exception as e:
+                # Show a blank frame in its place, so the animation does not wait for it forever
+                print(f"Could not show source frame {idx + 1}: {e}")
+                self.failed.add(idx)
+                width, height = self.size
+                self._arrays[idx] = np.full((height, width, 3), PLACEHOLDER_GRAY, dtype=np.uint8)
+
+    def request(self, idx):
+        if idx not in self._requested:
+            self._requested.add(idx)
+            self._requests.put(idx)
+
+    def photo(self, idx):
+        """
+        PhotoImage of frame idx, or None if it is still being converted. Main thread only.
+        """
+        self.request((idx + 1) % len(self))
+        if self._photos[idx] is None:
+            array = self._arrays[idx]
+            if array is None:
+                self.request(idx)
+                return None
+            self._photos[idx] = ImageTk.PhotoImage(Image.fromarray(array))
+            self._arrays[idx] = None
+        return self._photos[idx]
+
+    def close(self):
+        self._requests.put(None)
+
+class FocusStackingGUI:
+    def __init__(self, root, data_dir="data", output_dir=os.path.join("output", "fused_images")):
+        self.root = root
+        self.root.title("Focus Stacking GUI")
+        self.root.geometry("850x1000")
+
+        # Resolve once so the worker thread is unaffected by later cwd changes
+        self.data_dir = os.path.abspath(data_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        # Animation state
+        self.anim_frames = None
+        self.anim_id = None
+        self.anim_idx = 0
+        self.is_playing = True
+
+        # Token of the running fusion job; replaced (and the old one cancelled) on every submit
+        self.job = None
+
+        # Stack and settings of the shown result, for click-to-zoom
+        self.zoom_source = None
+        self.zoom_window = None
+
+        self.create_widgets()
+
+    def create_widgets(self):
+        # 1. Image Selection
+        frame_select = ttk.LabelFrame(self.root, text="1. Select Image Set")
+        frame_select.pack(fill="x", padx=10, pady=5)
+
+        self.folder_var = tk.StringVar()
+        self.folder_combo = ttk.Combobox(frame_select, textvariable=self.folder_var, state="readonly")
+        self.folder_combo.pack(fill="x", padx=10, pady=10)
+        self.folder_combo.bind("<<ComboboxSelected>>", self.on_folder_selected)
+
+        # 2. Fusion Settings (Mask Type & Top Layer Fusion)
+        frame_settings = ttk.LabelFrame(self.root, text="2. Fusion Settings")
+        frame_settings.pack(fill="x", padx=10, pady=5)
+
+        # Mask Type
+        ttk.Label(frame_settings, text="Mask Type:").grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        self.mask_var = tk.StringVar(value="Soft")
+        frame_mask_opts = ttk.Frame(frame_settings)
+        frame_mask_opts.grid(row=0, column=1, sticky="w")
+        ttk.Radiobutton(frame_mask_opts, text="Normalized Soft", variable=self.mask_var, value="Soft").pack(side="left", padx=5)
+        ttk.Radiobutton(frame_mask_opts, text="Hard", variable=self.mask_var, value="Hard").pack(side="left", padx=5)
+
+        # Top Layer Fusion Method
+        ttk.Label(frame_settings, text="Top Layer Fusion:").grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        self.top_fusion_var = tk.StringVar(value="max")
+        frame_top_opts = ttk.Frame(frame_settings)
+        frame_top_opts.grid(row=1, column=1, sticky="w")
+        ttk.Radiobutton(frame_top_opts, text="Max", variable=self.top_fusion_var, value="max").pack(side="left", padx=5)
+        ttk.Radiobutton(frame_top_opts, text="Mean", variable=self.top_fusion_var, value="mean").pack(side="left", padx=5)
+
+        # Frame pruning
+        self.prune_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(frame_settings, text="Skip frames that contribute nothing",
+                        variable=self.prune_var).grid(row=2, column=1, padx=5, pady=5, sticky="w")
+
+        # 3. Pyramid Levels
+        frame_levels = ttk.LabelFrame(self.root, text="3. Pyramid Levels")
+        frame_levels.pack(fill="x", padx=10, pady=5)
+
+        self.level_var = tk.IntVar(value=5)
+        self.level_label = ttk.Label(frame_levels, text="Levels: 5")
+        self.level_label.pack(pady=5)
+        
+        self.level_scale = ttk.Scale(frame_levels, from_=2, to=20, variable=self.level_var, orient="horizontal", command=self.update_level_label)
+        self.level_scale.pack(fill="x", padx=10, pady=10)
+        self.refresh_folders()
+
+        # 4. Generate Button & Progress
+        frame_action = ttk.Frame(self.root)
+        frame_action.pack(fill="x", padx=10, pady=10)
+
+        self.btn_generate = ttk.Button(frame_action, text="Generate Fused Image", command=self.start_generation)
+        self.btn_generate.pack(fill="x", pady=5)
+
+        self.btn_cancel = ttk.Button(frame_action, text="Cancel", command=self.cancel_generation, state="disabled")
+        self.btn_cancel.pack(fill="x", pady=5)
+
+        self.progress_var = tk.DoubleVar()
+        self.progress_bar = ttk.Progressbar(frame_action, variable=self.progress_var, maximum=100)
+        self.progress_bar.pack(fill="x", pady=5)
+
+        self.status_label = ttk.Label(frame_action, text="Ready")
+        self.status_label.pack()
+
+        # 5. Image Display Area
+        self.display_frame = ttk.Frame(self.root)
+        self.display_frame.pack(expand=True, fill="both", padx=10, pady=10)
+        
+        # Configure grid layout
+        self.display_frame.columnconfigure(0, weight=1)
+        self.display_frame.columnconfigure(1, weight=1)
+        self.display_frame.rowconfigure(1, weight=1)
+
+        # Titles
+        self.lbl_source_title = ttk.Label(self.display_frame, text="Source Images", font=("Arial", 12))
+        self.lbl_source_title.grid(row=0, column=0, pady=5)
+
+        self.lbl_result_title = ttk.Label(self.display_frame, text="Fused Result", font=("Arial", 12))
+        self.lbl_result_title.grid(row=0, column=1, pady=5)
+
+        # Images
+        self.anim_label = ttk.Label(self.display_frame, text="", anchor="center")
+        self.anim_label.grid(row=1, column=0, sticky="nsew", padx=5)
+        
+        self.result_label = ttk.Label(self.display_frame, text="", anchor="center")
+        self.result_label.grid(row=1, column=1, sticky="nsew", padx=5)
+        self.result_label.bind("<Button-1>", self.on_result_click)
+        
+        # Controls (Left side)
+        self.controls_frame = ttk.Frame(self.display_frame)
+        self.controls_frame.grid(row=2, column=0, sticky="ew", pady=5, padx=5)
+        
+        self.btn_play = ttk.Button(self.controls_frame, text="Pause", command=self.toggle_play)
+        self.btn_play.pack(side="left", padx=5)
+        
+        self.anim_slider_var = tk.IntVar()
+        self.anim_slider = ttk.Scale(self.controls_frame, from_=0, to=0, variable=self.anim_slider_var, orient="horizontal", command=self.on_slider_change)
+        self.anim_slider.pack(side="left", fill="x", expand=True, padx=5)
+
+    def toggle_play(self):
+        self.is_playing = not self.is_playing
+        if self.is_playing:
+            self.btn_play.config(text="Pause")
+            if self.anim_id:
+                self.root.after_cancel(self.anim_id)
+                self.anim_id = None
+            self.animate_loop()
+        else:
+            self.btn_play.config(text="Play")
+            if self.anim_id:
+                self.root.after_cancel(self.anim_id)
+                self.anim_id = None
+
+    def on_slider_change(self, value):
+        if not self.anim_frames:
+            return
+        idx = int(float(value))
+        self.anim_idx = idx
+        img = self.anim_frames.photo(self.anim_idx)
+        if img is None:
+            # Still converting: show it once ready unless the slider moved on
+            self.root.after(20, lambda: self.anim_idx == idx and self.on_slider_change(idx))
+            return
+        self.anim_label.config(image=img, text="")
+
+    def refresh_folders(self):
+        # Folders and folders inside zip/tar archives
+        folders = list_datasets(self.data_dir)
+        self.folder_combo['values'] = folders
+        if folders:
+            self.folder_combo.current(0)
+            self.on_folder_selected()
+
+    def on_folder_selected(self, event=None):
+        # Offer only as many levels as the resolution supports (read from the image header)
+        folder_name = self.folder_var.get()
+        try:
+            _, height, width, _ = read_stack_shape(os.path.join(self.data_dir, folder_name))
+        except Exception:
+            return
+        if not height:
+            return
+        max_levels = max(2, max_pyramid_levels(height, width))
+        self.level_scale.config(to=max_levels)
+        if self.level_var.get() > max_levels:
+            self.level_var.set(max_levels)
+            self.update_level_label(max_levels)
+
+    def update_level_label(self, value):
+        self.level_label.config(text=f"Levels: {int(float(value))}")
+
+    def start_generation(self):
+        folder_name = self.folder_var.get()
+        if not folder_name:
+            messagebox.showerror("Error", "Please select an image set.")
+            return
+
+        # A new job makes the running one stale: cancel it, it stops at its next frame or level
+        if self.job is not None:
+            self.job.cancel()
+        token = ProgressToken()
+        token.callback = lambda stage, done, total: self.on_progress(token, stage, done, total)
+        self.job = token
+
+        self.stop_animation()  # Stop any existing animation
+        self.btn_cancel.config(state="normal")
+        self.progress_var.set(0)
+        self.status_label.config(text="Starting...")
+
+        settings = (int(self.level_var.get()), self.mask_var.get(), self.top_fusion_var.get(),
+                    DEFAULT_MIN_SHARE if self.prune_var.get() else None)
+        thread = threading.Thread(target=self.run_fusion_pipeline, args=(folder_name, settings, token), daemon=True)
+        thread.start()
+
+    def cancel_generation(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+        self.btn_cancel.config(state="disabled")
+        self.progress_var.set(0)
+        self.status_label.config(text="Cancelled")
+
+    def run_fusion_pipeline(self, folder_name, settings, token):
+        try:
+            levels, mask_type, top_method, prune = settings
+            data_path = os.path.join(self.data_dir, folder_name)
+
+            # Step 1: Preprocess (frames are decoded and warped when read). When the stack is
+            # fused in memory, the pyramids built for alignment are kept for fusion; otherwise
+            # an uncached stack is aligned frame by frame.
+            self.update_status("Preprocessing images...", 0, token)
+            provisional = plan_fusion(read_stack_shape(data_path), levels, mask_type, ksize=7)
+            shared_levels = provisional["levels"] if provisional["strategy"] == "in-memory" else None
+            images = preprocess_image_stack(data_path, lazy=True, progress=token, prune=prune, pyramid_levels=shared_levels,
+                                            low_memory=shared_levels is None)
+            max_value = images.max_value
+
+            plan = plan_fusion(images.shape, levels, mask_type, ksize=7)
+            print(format_plan(plan))
+            if images.pruned:
+                print(format_pruning(images, plan))
+            levels = plan["levels"]
+
+            if plan["strategy"] != "in-memory":
+                self.update_status(f"Fusing images ({plan['strategy']}, Top: {top_method})...", 30, token)
+                images.frames = images.pyramids = None
+                fused_image = run_plan(images, plan, top_method=top_method, sigma=1.2, ksize=7, progress=token)
+            else:
+                # Step 2: Build Pyramids (the stack is decoded and warped once, here)
+                pyramids = images.pyramids
+                images = images.load(progress=token)
+                if pyramids is not None and len(pyramids[1][0]) == levels:
+                    gaussian_pyrs, laplacian_pyrs, top_gaussians = pyramids
+                else:
+                    gaussian_pyrs, laplacian_pyrs, top_gaussians = build_pyramids_stack(images, levels, progress=token)
+
+                # Step 3: Compute Sharpness
+                sharpness_maps = compute_sharpness_map(laplacian_pyrs, progress=token)
+
+                # Step 4: Build Masks
+                if mask_type == "Soft":
+                    masks = build_masks(sharpness_maps, sigma=1.2, ksize=7, progress=token)
+                else:
+                    masks = build_raw_masks(sharpness_maps, progress=token)
+
+                # Step 5: Fusion
+                fused_image = fuse_pyramids_and_reconstruct(laplacian_pyrs, top_gaussians, masks,
+                                                            top_fusion_method=top_method, progress=token,
+                                                            max_value=max_value)
+
+            # Previews are made here, from the in-memory result; the main thread only wraps them
+            token.check()
+            size = preview_size(fused_image.shape)
+            fused_preview = make_preview(fused_image, size, max_value)
+            frames = PreviewFrames(images, size, max_value)
+            frames.request(0)
+            zoom_source = {"images": images, "levels": levels, "mask_type": mask_type,
+                           "top_method": top_method, "preview_size": size, "max_value": max_value}
+            self.root.after(0, lambda: self.show_result(fused_preview, frames, zoom_source, token))
+
+            # Save at the source bit depth, encoded on the writer thread while the result is shown
+            base_name = folder_name.replace("/", "_")
+            path = output_path(self.output_dir, f"{base_name}_{mask_type}_{top_method}_L{levels}_fused")
+            self.update_status("Done! Saving...", 100, token)
+            write_image_async(path, fused_image, max_value).add_done_callback(
+                lambda future: self.on_saved(future, token))
+
+        except Cancelled:
+            print(f"Cancelled fusion of {folder_name}")
+        except Exception as e:
+            if not token.cancelled:
+                # e is unbound once the except block ends, before the callback runs
+                message = str(e)
+                self.root.after(0, lambda: messagebox.showerror("Error", message))
+                self.update_status("Error occurred", 0, token)
+        finally:
+            self.root.after(0, lambda: self.finish_job(token))
+
+    def on_saved(self, future, token):
+        # Called from the writer thread, usually after the job has finished
+        error = future.exception()
+        if error is not None:
+            text = f"Could not save the result: {error}"
+        else:
+            text = f"Done! Saved {os.path.basename(future.result())}"
+        def apply():
+            # Unless another job was started in the meantime
+            if self.job is None or self.job is token:
+                self.status_label.config(text=text)
+        self.root.after(0, apply)
+
+    def finish_job(self, token):
+        if token is self.job:
+            self.job = None
+            self.btn_cancel.config(state="disabled")
+
+    def on_progress(self, token, stage, done, total):
+        # Called from the worker thread after every frame or level of a stage
+        start, end, label = STAGE_PROGRESS.get(stage, (0, 100, stage))
+        value = start + (end - start) * done / max(total, 1)
+        self.update_status(f"{label} ({done}/{total})...", value, token)
+
+    def update_status(self, text, progress, token=None):
+        def apply():
+            # Updates of a stale job must not overwrite the current one's
+            if token is not None and token is not self.job:
+                return
+            self.status_label.config(text=text)
+            self.progress_var.set(progress)
+        self.root.after(0, apply)
+
+    def show_result(self, fused_preview, frames, zoom_source=None, token=None):
+        if token is not None and token is not self.job:
+            # A newer job was started while this one finished
+            frames.close()
+            return
+
+        # 1. Show Fused Image (Right)
+        img_tk = ImageTk.PhotoImage(Image.fromarray(fused_preview))
+        self.result_label.config(image=img_tk, text="", cursor="crosshair")
+        self.result_label.image = img_tk
+        self.zoom_source = zoom_source
+
+        # 2. Prepare Animation (Left)
+        if self.anim_frames is not None:
+            self.anim_frames.close()
+        self.anim_frames = frames
+            
+        # Initialize controls
+        self.anim_slider.config(to=len(self.anim_frames)-1)
+        self.anim_slider_var.set(0)
+        self.is_playing = True
+        self.btn_play.config(text="Pause")
+            
+        self.start_animation()
+
+    def start_animation(self):
+        self.anim_idx = 0
+        self.animate_loop()
+        
+    def animate_loop(self):
+        if not self.anim_frames:
+            return
+        
+        if self.is_playing:
+            img = self.anim_frames.photo(self.anim_idx)
+            if img is None:
+                # Frame is still being converted in the background, check again shortly
+                self.anim_id = self.root.after(20, self.animate_loop)
+                return
+            self.anim_label.config(image=img, text="")
+            self.anim_slider_var.set(self.anim_idx)
+            self.anim_idx = (self.anim_idx + 1) % len(self.anim_frames)
+            
+            # Loop at 10 FPS (100ms)
+            self.anim_id = self.root.after(100, self.animate_loop)
+        
+    def stop_animation(self):
+        if self.anim_id:
+            self.root.after_cancel(self.anim_id)
+            self.anim_id = None
+        if self.anim_frames is not None:
+            self.anim_frames.close()
+        self.anim_frames = None
+        self.anim_label.config(image="")
+        self.result_label.config(image="", cursor="")
+        self.zoom_source = None
+
+    def on_result_click(self, event):
+        # Fuse a ZOOM_SIZE region around the clicked point at full resolution
+        source = self.zoom_source
+        if source is None:
+            return
+        height, width = source["images"].shape[1:3]
+        preview_w, preview_h = source["preview_size"]
+        # The preview is centered in the label
+        px = event.x - (self.result_label.winfo_width() - preview_w) / 2
+        py = event.y - (self.result_label.winfo_height() - preview_h) / 2
+        if not (0 <= px < preview_w and 0 <= py < preview_h):
+            return
+
+        w, h = min(ZOOM_SIZE, width), min(ZOOM_SIZE, height)
+        x = min(max(0, int(px * width / preview_w) - w // 2), width - w)
+        y = min(max(0, int(py * height / preview_h) - h // 2), height - h)
+        self.status_label.config(text=f"Fusing region {w}x{h} at ({x}, {y})...")
+        threading.Thread(target=self.run_region_fusion, args=(source, (x, y, w, h)), daemon=True).start()
+
+    def run_region_fusion(self, source, roi):
+        try:
+            region = fuse_region(source["images"], roi, source["levels"], source["mask_type"],
+                                 source["top_method"], sigma=1.2, ksize=7, max_value=source["max_value"])
+            region = cv2.cvtColor(to_bit_depth(region, 8, source["max_value"]), cv2.COLOR_BGR2RGB)
+            self.root.after(0, lambda: self.show_zoom(region, roi))
+            self.root.after(0, lambda: self.status_label.config(text="Done!"))
+        except Exception as e:
+            message = str(e)
+            self.root.after(0, lambda: self.status_label.config(text="Error occurred"))
+            self.root.after(0, lambda: messagebox.showerror("Error", message))
+
+    def show_zoom(self, region, roi):
+        x, y, w, h = roi
+        if self.zoom_window is None or not self.zoom_window.winfo_exists():
+            self.zoom_window = tk.Toplevel(self.root)
+            self.zoom_label = ttk.Label(self.zoom_window)
+            self.zoom_label.pack(padx=5, pady=5)
+        self.zoom_window.title(f"Region {w}x{h} at ({x}, {y}) - full resolution")
+        img_tk = ImageTk.PhotoImage(Image.fromarray(region))
+        self.zoom_label.config(image=img_tk)
+        self.zoom_label.image = img_tk
+        self.zoom_window.lift()
+
+def main(data_dir="data", output_dir=os.path.join("output", "fused_images")):
+    root = tk.Tk()
+    app = FocusStackingGUI(root, data_dir=data_dir, output_dir=output_dir)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
+
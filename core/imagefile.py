@@ -0,0 +1,166 @@
+"""
+Image file I/O at the bit depth of the source.
+
+Frames are decoded at their own depth (8 or 16 bits per channel) into float32 in their
+native range, 0-255 or 0-65535, so 16-bit TIFF/PNG sources keep their precision through
+alignment and fusion. The pipeline clips its result to that range (max_value), and the
+result is written as an 8- or 16-bit PNG or TIFF, optionally on a background thread.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# File extension of each output format
+OUTPUT_FORMATS = {"png": ".png", "tiff": ".tif"}
+
+# Output compression: "default" leaves OpenCV's default (fast deflate for PNG, LZW for TIFF)
+COMPRESSION = ("default", "none", "lzw", "deflate")
+# PNG zlib level per compression
+PNG_COMPRESSION = {"none": 0, "deflate": 9}
+# libtiff codes (COMPRESSION_NONE, COMPRESSION_LZW, COMPRESSION_ADOBE_DEFLATE); older OpenCV
+# builds have no named constants for them
+TIFF_COMPRESSION = {"none": 1, "lzw": 5, "deflate": 8}
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def dtype_max_value(dtype):
+    """
+    Largest value of an image dtype: 255 for uint8, 65535 for uint16, 1 for float images.
+    """
+    if np.issubdtype(dtype, np.integer):
+        return float(np.iinfo(dtype).max)
+    return 1.0
+
+
+def rescale(image, from_max_value, to_max_value):
+    """
+    Map a float image from [0, from_max_value] to [0, to_max_value] (in place if it is float32).
+    """
+    if from_max_value != to_max_value:
+        image *= np.float32(to_max_value / from_max_value)
+    return image
+
+
+def decode_image(data, max_value=None):
+    """
+    Decode an encoded image (PNG, TIFF, JPEG, ...) to float32 BGR at its own bit depth.
+
+    Grayscale images are expanded to three channels, as cv2.IMREAD_COLOR does.
+
+    Args:
+        data (bytes): Encoded image.
+        max_value (float): If given, rescale the image to [0, max_value] (for stacks that
+            mix bit depths).
+    Returns:
+        tuple: (image (H, W, 3) float32, max_value of the source range), or (None, None)
+        if the data could not be decoded.
+    """
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_ANYDEPTH | cv2.IMREAD_COLOR)
+    if image is None:
+        return None, None
+    source_max_value = dtype_max_value(image.dtype)
+    image = image.astype(np.float32)
+    if max_value is not None:
+        image = rescale(image, source_max_value, max_value)
+    return image, source_max_value
+
+
+def to_bit_depth(image, bit_depth=8, max_value=255.0):
+    """
+    Convert a float image in [0, max_value] to uint8 or uint16 (truncating, like astype).
+    """
+    top = 2 ** bit_depth - 1
+    if max_value != top:
+        image = image * (top / max_value)
+    return np.clip(image, 0, top).astype(np.uint8 if bit_depth == 8 else np.uint16)
+
+
+def output_path(directory, base_name, image_format="png"):
+    """
+    Path of an output image: <directory>/<base_name> with the extension of image_format.
+    """
+    if image_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {image_format!r} (known: {', '.join(OUTPUT_FORMATS)})")
+    return os.path.join(directory, base_name + OUTPUT_FORMATS[image_format])
+
+
+def check_output_options(image_format="png", compression="default", bit_depth=None):
+    """
+    Check that an output format, compression and bit depth can be written together.
+
+    Entry points call this before preprocessing, so a bad combination fails right away
+    instead of after the whole stack has been aligned and fused.
+
+    Raises:
+        ValueError: If the combination is not supported.
+    """
+    if image_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {image_format!r} (known: {', '.join(OUTPUT_FORMATS)})")
+    if compression not in (None,) + COMPRESSION:
+        raise ValueError(f"Unknown compression {compression!r} (known: {', '.join(COMPRESSION)})")
+    if image_format == "png" and compression not in (None, "default") and compression not in PNG_COMPRESSION:
+        raise ValueError(f"PNG supports compression {', '.join(PNG_COMPRESSION)}, not {compression!r}")
+    if bit_depth not in (None, 8, 16):
+        raise ValueError(f"bit_depth must be 8 or 16, not {bit_depth}")
+
+
+def _encode_params(path, compression):
+    if compression in (None, "default"):
+        return []
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".png":
+        check_output_options("png", compression)
+        return [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION[compression]]
+    if extension in (".tif", ".tiff"):
+        check_output_options("tiff", compression)
+        return [cv2.IMWRITE_TIFF_COMPRESSION, TIFF_COMPRESSION[compression]]
+    raise ValueError(f"Compression is only supported for PNG and TIFF output, not {path}")
+
+
+def write_image(path, image, max_value=255.0, bit_depth=None, compression="default"):
+    """
+    Write a fused image at 8 or 16 bits per channel.
+
+    Args:
+        path (str): Output file; .png or .tif/.tiff for 16-bit output.
+        image (np.ndarray): Float image in [0, max_value].
+        max_value (float): Top of the source range (see decode_image).
+        bit_depth (int): 8 or 16 (default: 16 for sources deeper than 8 bits, 8 otherwise).
+        compression (str): One of COMPRESSION.
+    Returns:
+        str: path.
+    """
+    if bit_depth is None:
+        bit_depth = 16 if max_value > 255 else 8
+    if bit_depth not in (8, 16):
+        raise ValueError(f"bit_depth must be 8 or 16, not {bit_depth}")
+    if bit_depth == 16 and os.path.splitext(path)[1].lower() not in (".png", ".tif", ".tiff"):
+        raise ValueError(f"16-bit output needs PNG or TIFF, not {path}")
+
+    params = _encode_params(path, compression)
+    if not cv2.imwrite(path, to_bit_depth(image, bit_depth, max_value), params):
+        raise OSError(f"Could not write {path}")
+    return path
+
+
+def write_image_async(path, image, max_value=255.0, bit_depth=None, compression="default"):
+    """
+    write_image on a background thread, so the caller can show the result right away.
+
+    Writes are done one at a time in submission order. The image must not be modified
+    until the write has finished.
+
+    Returns:
+        concurrent.futures.Future: Resolves to path, or raises the write's error.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-writer")
+    return _writer.submit(write_image, path, image, max_value, bit_depth, compression)
@@ -1,53 +1,128 @@
 import os
-import cv2
+import sys
+import time
 import numpy as np
 
-from _01_preprocess import preprocess_image_stack
-from _02_pyramids import build_pyramids_stack
-from _03_sharpness import compute_sharpness_map
-from _04_mask import build_masks
-from _05_fusion import fuse_pyramids_and_reconstruct
+if not __package__:
+    # Started as a script (python core/main.py), where the relative imports below cannot work
+    sys.exit("Run this module as `python -m core.main`, or use `focus-stack fuse <dataset>`.")
 
-def main(name):
-    data_dir = os.path.join("../data", name)
-    base_name = name
+from ._01_preprocess import preprocess_image_stack
+from ._02_pyramids import build_pyramids_stack, save_pyramids
+from ._03_sharpness import compute_sharpness_map
+from ._04_mask import build_masks, build_raw_masks
+from ._05_fusion import fuse_pyramids_and_reconstruct
+from .datasets import read_stack_shape
+from .imagefile import check_output_options, output_path, write_image
+from .pipeline import fuse_region, run_plan
+from .planner import plan_fusion, format_plan
+from .prune import format_pruning
+
+def main(name, data_dir="data", output_dir="output", levels=4, mask_type="Soft", top_method="max",
+         memory_budget=None, strategy=None, roi=None, prune=None, bit_depth=None, image_format="png",
+         compression="default", file_extension=None):
+    """
+    Run the full fusion pipeline on one dataset and write the debug and fused outputs.
+
+    Args:
+        name (str): Name of the dataset folder inside data_dir, or "<archive>/<folder>".
+        data_dir (str): Directory containing the datasets.
+        output_dir (str): Root directory for pyramids, sharpness maps and fused images.
+        levels (int): Number of pyramid levels.
+        mask_type (str): "Soft" for smoothed normalized masks, "Hard" for raw argmax masks.
+        top_method (str): Fusion method for the top Gaussian level, "max" or "mean".
+        memory_budget (int): Bytes available for fusion (default: half of the available memory).
+        strategy (str): Force "in-memory", "streaming" or "tiled" instead of letting the planner choose.
+        roi (tuple): (x, y, width, height) to fuse only that region at full resolution.
+        prune (float): Skip frames winning less than this share of pixels (see prune.py).
+        bit_depth (int): 8 or 16 bits per channel for the fused image (default: that of the sources).
+        image_format (str): "png" or "tiff".
+        compression (str): Output compression, one of imagefile.COMPRESSION.
+        file_extension (str): Extension of the source images (default: png, tif or tiff).
+    Returns:
+        str: Path of the written fused image.
+    """
+    check_output_options(image_format, compression, bit_depth)
+    data_path = os.path.join(data_dir, name)
+    # Datasets inside archives are named "<archive>/<folder>"
+    base_name = name.replace("/", "_").replace(os.sep, "_")
+
+    # If the whole stack will be fused in memory, the pyramids built for alignment are kept for fusion;
+    # otherwise an uncached stack is aligned frame by frame, never holding the whole stack
+    shape = read_stack_shape(data_path, file_extension)
+    provisional = plan_fusion(shape, levels, mask_type, memory_budget=memory_budget, strategy=strategy, ksize=7)
+    shared_levels = provisional["levels"] if provisional["strategy"] == "in-memory" and roi is None else None
 
     print("Preprocessing image stack...")
-    images = preprocess_image_stack(data_dir)
-    levels = 4      # number of pyramid levels, can be adjusted
+    images = preprocess_image_stack(data_path, file_extension, lazy=True, prune=prune, pyramid_levels=shared_levels,
+                                    low_memory=shared_levels is None)
+    max_value = images.max_value
+    output = {"max_value": max_value, "bit_depth": bit_depth, "image_format": image_format, "compression": compression}
+
+    if roi is not None:
+        x, y, w, h = roi
+        print(f"Fusing region {w}x{h} at ({x}, {y})...")
+        start = time.perf_counter()
+        fused_region = fuse_region(images, roi, levels, mask_type, top_method, sigma=1.2, ksize=7)
+        print(f"Fused region in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return save_fused_image(fused_region, output_dir, f"{base_name}_roi_{x}_{y}_{w}x{h}", **output)
+
+    plan = plan_fusion(images.shape, levels, mask_type, memory_budget=memory_budget, strategy=strategy, ksize=7)
+    print(format_plan(plan))
+    if images.pruned:
+        print(format_pruning(images, plan))
+    levels = plan["levels"]
+
+    if plan["strategy"] != "in-memory":
+        # Debug outputs need every intermediate in memory, so they are only written by the in-memory strategy
+        print(f"Fusing with the {plan['strategy']} strategy...")
+        images.frames = images.pyramids = None
+        fused_image = run_plan(images, plan, top_method=top_method, sigma=1.2, ksize=7)
+        return save_fused_image(fused_image, output_dir, base_name, **output)
 
     # Build pyramids
-    print("Building pyramids...")
-    GAUSSIAN_PYR_DIR = "../output/gaussian_pyramids"
-    LAPLACIAN_PYR_DIR = "../output/laplacian_pyramids"
-    GAUSSIAN_PYR_DIR = os.path.join(GAUSSIAN_PYR_DIR, base_name)
-    LAPLACIAN_PYR_DIR = os.path.join(LAPLACIAN_PYR_DIR, base_name)
-    gaussian_pyrs, laplacian_pyrs, top_gaussians = build_pyramids_stack(
-        images, levels, gaussian_pyramid_dir=GAUSSIAN_PYR_DIR, laplacian_pyramid_dir=LAPLACIAN_PYR_DIR)
+    GAUSSIAN_PYR_DIR = os.path.join(output_dir, "gaussian_pyramids", base_name)
+    LAPLACIAN_PYR_DIR = os.path.join(output_dir, "laplacian_pyramids", base_name)
+    if images.pyramids is not None and len(images.pyramids[1][0]) == levels:
+        print("Reusing pyramids built during alignment...")
+        gaussian_pyrs, laplacian_pyrs, top_gaussians = images.pyramids
+        save_pyramids(gaussian_pyrs, laplacian_pyrs, GAUSSIAN_PYR_DIR, LAPLACIAN_PYR_DIR, max_value)
+    else:
+        print("Building pyramids...")
+        gaussian_pyrs, laplacian_pyrs, top_gaussians = build_pyramids_stack(
+            np.asarray(images), levels, gaussian_pyramid_dir=GAUSSIAN_PYR_DIR, laplacian_pyramid_dir=LAPLACIAN_PYR_DIR,
+            max_value=max_value)
 
     # Compute sharpness maps
     print("Computing sharpness maps...")
-    SHARP_MAP_DIR = "../output/sharpness_maps"
-    SHARP_MAP_DIR = os.path.join(SHARP_MAP_DIR, base_name)
+    SHARP_MAP_DIR = os.path.join(output_dir, "sharpness_maps", base_name)
     sharpness_maps = compute_sharpness_map(laplacian_pyrs, output_dir=SHARP_MAP_DIR)
 
     # Build masks
     print("Building decision masks...")
-    smoothed_masks = build_masks(sharpness_maps, sigma=1.2, ksize=7)
+    if mask_type == "Soft":
+        masks = build_masks(sharpness_maps, sigma=1.2, ksize=7)
+    else:
+        masks = build_raw_masks(sharpness_maps)
 
     # Fuse pyramids and reconstruct
     print("Fusing pyramids and reconstructing fused image...")
-    LAPLACIAN_LEV_and_TOP_GAUSSIAN_DIR = "../output/fused_pyramids"
-    LAPLACIAN_LEV_and_TOP_GAUSSIAN_DIR = os.path.join(LAPLACIAN_LEV_and_TOP_GAUSSIAN_DIR, base_name)
+    LAPLACIAN_LEV_and_TOP_GAUSSIAN_DIR = os.path.join(output_dir, "fused_pyramids", base_name)
     fused_image = fuse_pyramids_and_reconstruct(
-        laplacian_pyrs, top_gaussians, smoothed_masks, top_fusion_method="max", output_dir=LAPLACIAN_LEV_and_TOP_GAUSSIAN_DIR)
+        laplacian_pyrs, top_gaussians, masks, top_fusion_method=top_method, output_dir=LAPLACIAN_LEV_and_TOP_GAUSSIAN_DIR,
+        max_value=max_value)
 
-    OUT_DIR = "../output/fused_images"
+    return save_fused_image(fused_image, output_dir, base_name, **output)
+
+def save_fused_image(fused_image, output_dir, base_name, max_value=255.0, bit_depth=None, image_format="png",
+                     compression="default"):
+    OUT_DIR = os.path.join(output_dir, "fused_images")
     os.makedirs(OUT_DIR, exist_ok=True)
-    output_path = os.path.join(OUT_DIR, f"{base_name}_fused.png")
-    cv2.imwrite(output_path, fused_image.astype(np.uint8))
-    print(f"Saving fused image to {output_path}")
-    
+    path = output_path(OUT_DIR, f"{base_name}_fused", image_format)
+    print(f"Saving fused image to {path}")
+    return write_image(path, fused_image, max_value, bit_depth, compression)
+
 if __name__ == "__main__":
+    # python -m core.main
     name = input("Enter image folder name: ")
-    main(name)
\ No newline at end of file
+    main(name)
@@ -0,0 +1,269 @@
+"""
+Execution strategies for the fusion stages (_02 to _05), as chosen by planner.plan_fusion.
+
+Every strategy produces the same pixels as the in-memory reference pipeline: streaming
+replays the same per-pixel arithmetic in the same frame order, and tiling gives each strip
+enough halo (planner.fusion_halo) that its interior does not see the strip border.
+
+`stack` may be a numpy array (N, H, W, C) or a lazy preprocess.AlignedStack, whose frames
+and tiles are decoded and warped only when read. Every strategy takes an optional
+progress.ProgressToken that receives per-frame, per-level or per-strip progress and cancels
+the run between those steps, and clips its result to the source range [0, max_value]
+(by default the AlignedStack's max_value, 255 for plain arrays).
+"""
+
+import cv2
+import numpy as np
+
+from ._02_pyramids import build_pyramids_stack
+from ._03_sharpness import compute_sharpness_map
+from ._04_mask import build_masks, build_raw_masks
+from ._05_fusion import fuse_pyramids_and_reconstruct, reconstruct_from_pyramid
+from .planner import plan_fusion, format_plan, fusion_halo, max_pyramid_levels
+from .progress import report
+
+
+def source_max_value(stack, max_value=None):
+    """
+    max_value if given, else the top of the stack's source range (255 for plain arrays).
+    """
+    if max_value is not None:
+        return max_value
+    return getattr(stack, "max_value", 255.0)
+
+
+def read_window(stack, idx, y0, y1, x0, x1):
+    """
+    Region [y0:y1, x0:x1] of aligned frame idx, warping only that region for lazy stacks.
+    """
+    if hasattr(stack, "tile"):
+        return stack.tile(idx, y0, y1, x0, x1)
+    return stack[idx][y0:y1, x0:x1]
+
+
+def fuse_in_memory(images, levels, mask_type="Soft", top_method="max", sigma=1.2, ksize=7, progress=None,
+                   max_value=255.0):
+    """
+    Reference pipeline: pyramids, sharpness maps and masks of all frames at once.
+    """
+    _, laplacian_pyrs, top_gaussians = build_pyramids_stack(images, levels, progress=progress)
+    return fuse_pyramids(laplacian_pyrs, top_gaussians, mask_type, top_method, sigma, ksize, progress, max_value)
+
+
+def fuse_pyramids(laplacian_pyrs, top_gaussians, mask_type="Soft", top_method="max", sigma=1.2, ksize=7, progress=None,
+                  max_value=255.0):
+    """
+    Stages _03 to _05 of the reference pipeline, on pyramids that are already built
+    (e.g. by preprocess.align_with_pyramids).
+    """
+    sharpness_maps = compute_sharpness_map(laplacian_pyrs, progress=progress)
+    if mask_type == "Soft":
+        masks = build_masks(sharpness_maps, sigma=sigma, ksize=ksize, progress=progress)
+    else:
+        masks = build_raw_masks(sharpness_maps, progress=progress)
+    return fuse_pyramids_and_reconstruct(laplacian_pyrs, top_gaussians, masks, top_fusion_method=top_method,
+                                         progress=progress, max_value=max_value)
+
+
+def _frame_pyramid(image, levels):
+    _, laplacian_pyrs, top_gaussians = build_pyramids_stack([image], levels)
+    return laplacian_pyrs[0], top_gaussians[0]
+
+
+def _blurred_mask(winners, i, sigma, ksize):
+    # Same as smooth_and_normalize_masks applied to the raw mask of image i
+    mask = (winners == i).astype(np.float32)
+    return cv2.GaussianBlur(mask, (ksize, ksize), sigmaX=sigma, sigmaY=sigma)
+
+
+def fuse_streaming(stack, levels, mask_type="Soft", top_method="max", sigma=1.2, ksize=7, progress=None,
+                   max_value=None):
+    """
+    Fuse one frame at a time, keeping only per-level accumulators in memory.
+
+    Pass 1 tracks, per level, the sharpest frame at every pixel (first one on ties, like
+    np.argmax) and fuses the top Gaussian level. Hard masks take the winning Laplacian
+    directly. Soft masks need a second pass that rebuilds each frame's pyramid and adds it
+    with its blurred, normalized mask. Progress is reported as "streaming" after every frame
+    of every pass.
+    """
+    num_images = len(stack)
+    if num_images == 0:
+        return None
+    total_steps = num_images * (2 if mask_type == "Soft" else 1)
+
+    best_sharpness = winners = fused = fused_top = None
+    for i in range(num_images):
+        laplacian, top = _frame_pyramid(stack[i], levels)
+        sharpness = compute_sharpness_map([laplacian])[0]
+        top = top.astype(np.float32)
+
+        if i == 0:
+            best_sharpness = sharpness
+            winners = [np.zeros(Ek.shape, dtype=np.uint16) for Ek in sharpness]
+            fused = [Lk.astype(np.float32) for Lk in laplacian]
+            fused_top = top.copy()
+            report(progress, "streaming", 1, total_steps)
+            continue
+
+        for k in range(levels):
+            better = sharpness[k] > best_sharpness[k]
+            np.copyto(best_sharpness[k], sharpness[k], where=better)
+            winners[k][better] = i
+            np.copyto(fused[k], laplacian[k], where=better)
+
+        if top_method == "max":
+            np.maximum(fused_top, top, out=fused_top)
+        else:
+            fused_top += top
+        report(progress, "streaming", i + 1, total_steps)
+
+    if top_method != "max":
+        fused_top = fused_top / num_images
+    del best_sharpness
+
+    if mask_type == "Soft":
+        # Normalization denominators, summed in frame order as in smooth_and_normalize_masks
+        denominators = []
+        for k in range(levels):
+            total = None
+            for i in range(num_images):
+                blurred = _blurred_mask(winners[k], i, sigma, ksize)
+                total = blurred if total is None else total + blurred
+            denominators.append(total + 1e-8)
+
+        fused = [np.zeros(Lk.shape, dtype=np.float32) for Lk in fused]
+        for i in range(num_images):
+            laplacian, _ = _frame_pyramid(stack[i], levels)
+            for k in range(levels):
+                Wk = _blurred_mask(winners[k], i, sigma, ksize) / denominators[k]
+                fused[k] += laplacian[k].astype(np.float32) * Wk
+            report(progress, "streaming", num_images + i + 1, total_steps)
+
+    return reconstruct_from_pyramid(fused, fused_top, max_value=source_max_value(stack, max_value))
+
+
+def fuse_tiled(stack, levels, strip_height, mask_type="Soft", top_method="max", sigma=1.2, ksize=7, progress=None,
+               max_value=None):
+    """
+    Fuse horizontal strips of strip_height rows (a multiple of 2**levels), each read with a
+    halo of planner.fusion_halo rows and fused in memory. Every strip reads all frames again,
+    so this is the slowest strategy; it is meant for stacks whose frames alone strain memory.
+    Progress is reported as "tiles" after every strip.
+    """
+    num_images, height, width = stack.shape[:3]
+    max_value = source_max_value(stack, max_value)
+    halo = fusion_halo(levels, ksize)
+    fused_image = np.empty((height, width) + tuple(stack.shape[3:]), dtype=np.float32)
+    num_strips = -(-height // strip_height)
+    # The stages inside a strip only check for cancellation
+    strip_progress = progress.silent() if progress is not None else None
+
+    for n, s0 in enumerate(range(0, height, strip_height)):
+        s1 = min(height, s0 + strip_height)
+        w0, w1 = max(0, s0 - halo), min(height, s1 + halo)
+        window = []
+        for i in range(num_images):
+            window.append(read_window(stack, i, w0, w1, 0, width))
+            if progress is not None:
+                progress.check()
+        fused = fuse_in_memory(np.stack(window, axis=0), levels, mask_type, top_method, sigma, ksize, strip_progress,
+                               max_value)
+        fused_image[s0:s1] = fused[s0 - w0:s1 - w0]
+        report(progress, "tiles", n + 1, num_strips)
+
+    return fused_image
+
+
+def region_window(shape, roi, levels, ksize=7):
+    """
+    Part of the frames to read for a region of interest: the ROI grown by the fusion halo,
+    with its origin on the 2**levels pyramid grid, clipped to the image.
+
+    The left edge is snapped further, to 16 top-level pixels: OpenCV filters vectorize along
+    rows, and a window whose rows end at the image's right edge only rounds its last columns
+    like the full frame when both rows start at the same vector phase.
+
+    Args:
+        shape (tuple): Stack shape (N, H, W[, C]).
+        roi (tuple): (x, y, width, height) in full-resolution pixels.
+    Returns:
+        tuple: (y0, y1, x0, x1) of the window.
+    """
+    height, width = shape[1:3]
+    x, y, w, h = roi
+    step = 2 ** levels
+    halo = fusion_halo(levels, ksize)
+    y0 = max(0, (y // step) * step - halo)
+    x_step = 16 * step
+    x0 = max(0, ((x - halo) // x_step) * x_step)
+    return y0, min(height, y + h + halo), x0, min(width, x + w + halo)
+
+
+def fuse_region(stack, roi, levels, mask_type="Soft", top_method="max", sigma=1.2, ksize=7, progress=None,
+                max_value=None):
+    """
+    Fuse only a region of interest at full resolution.
+
+    Reads (and, for lazy stacks, warps) just the ROI plus the halo needed for the pyramid
+    depth and blur kernels, so the result is identical to the same region of a full fusion.
+
+    Args:
+        stack (np.ndarray or AlignedStack): Aligned frames, (N, H, W, C).
+        roi (tuple): (x, y, width, height); clipped to the image.
+        levels (int): Pyramid levels (clamped like planner.plan_fusion does for the full image).
+    Returns:
+        np.ndarray: Fused region (height, width, C) float32.
+    """
+    num_images, height, width = stack.shape[:3]
+    x, y, w, h = roi
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(width, x + w), min(height, y + h)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError(f"Region {roi} is outside the {width}x{height} image")
+
+    levels = max(1, min(levels, max_pyramid_levels(height, width)))
+    wy0, wy1, wx0, wx1 = region_window(stack.shape, (x0, y0, x1 - x0, y1 - y0), levels, ksize)
+    window = []
+    for i in range(num_images):
+        window.append(read_window(stack, i, wy0, wy1, wx0, wx1))
+        report(progress, "load", i + 1, num_images)
+    fused = fuse_in_memory(np.stack(window, axis=0), levels, mask_type, top_method, sigma, ksize, progress,
+                           source_max_value(stack, max_value))
+    return fused[y0 - wy0:y1 - wy0, x0 - wx0:x1 - wx0]
+
+
+def run_plan(stack, plan, top_method="max", sigma=1.2, ksize=7, progress=None, max_value=None):
+    """
+    Execute a plan from planner.plan_fusion.
+    """
+    levels = plan["levels"]
+    mask_type = plan["mask_type"]
+    max_value = source_max_value(stack, max_value)
+    if plan["strategy"] == "in-memory":
+        return fuse_in_memory(np.asarray(stack), levels, mask_type, top_method, sigma, ksize, progress, max_value)
+    if plan["strategy"] == "streaming":
+        return fuse_streaming(stack, levels, mask_type, top_method, sigma, ksize, progress, max_value)
+    return fuse_tiled(stack, levels, plan["strip_height"], mask_type, top_method, sigma, ksize, progress, max_value)
+
+
+def fuse_stack(stack, levels, mask_type="Soft", top_method="max", memory_budget=None, strategy=None, sigma=1.2, ksize=7,
+               progress=None, max_value=None):
+    """
+    Plan and run the fusion of an aligned stack.
+
+    Args:
+        stack (np.ndarray or AlignedStack): Aligned frames, (N, H, W, C).
+        levels (int): Requested pyramid levels (clamped to what the resolution supports).
+        mask_type (str): "Soft" or "Hard".
+        top_method (str): "max" or "mean".
+        memory_budget (int): Bytes available (default: half of the available memory).
+        strategy (str): Force "in-memory", "streaming" or "tiled".
+        progress (ProgressToken): Optional progress sink and cancellation flag.
+        max_value (float): Top of the source range (default: the stack's max_value, else 255).
+    Returns:
+        tuple: (fused image (H, W, C) float32, plan dict).
+    """
+    plan = plan_fusion(stack.shape, levels, mask_type, memory_budget=memory_budget, strategy=strategy, ksize=ksize)
+    print(format_plan(plan))
+    return run_plan(stack, plan, top_method, sigma, ksize, progress, max_value), plan
@@ -0,0 +1,351 @@
+"""
+Execution planner: estimate the peak memory and runtime of each fusion stage from the stack
+shape, pick an execution strategy that fits a memory budget and clamp the pyramid depth to
+what the resolution supports.
+
+Strategies (implemented in pipeline.py):
+    - "in-memory": all frames, pyramids, sharpness maps and masks at once (the reference pipeline).
+    - "streaming": one frame at a time, keeping only per-level accumulators (two passes for soft masks).
+    - "tiled":     horizontal strips with a halo, each fused in memory; every strip re-reads all frames.
+
+The estimates are deliberately simple models. Memory is counted in float32 pixels and is
+accurate to within a few tens of percent. Runtime uses rough per-pixel costs and is only
+meant to compare strategies, not to predict wall time on a given machine.
+"""
+
+import math
+import os
+import re
+import sys
+
+import numpy as np
+
+# Smallest side of the top Gaussian level; pyrDown below this carries no useful detail
+MIN_TOP_SIZE = 8
+
+# Rough cost in seconds per pixel-channel and frame of each stage
+STAGE_COST = {
+    "load": 15e-9,      # decode + warp of a source frame
+    "pyramids": 4e-9,
+    "sharpness": 3e-9,
+    "masks_soft": 10e-9,
+    "masks_hard": 3e-9,
+    "fusion": 3e-9,
+}
+
+STRATEGIES = ("in-memory", "streaming", "tiled")
+
+# Warnings printed once per process
+_warned = {"unknown_memory": False}
+
+
+def _available_memory_windows():
+    import ctypes
+
+    class MEMORYSTATUSEX(ctypes.Structure):
+        _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+    status = MEMORYSTATUSEX()
+    status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+    if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+        return None
+    return status.ullAvailPhys
+
+
+def _parse_meminfo(text):
+    # MemAvailable counts the page cache the kernel can reclaim, unlike MemFree (SC_AVPHYS_PAGES)
+    match = re.search(r"^MemAvailable:\s+(\d+) kB$", text, re.MULTILINE)
+    return int(match.group(1)) * 1024 if match is not None else None
+
+
+def _available_memory_linux():
+    with open("/proc/meminfo") as f:
+        return _parse_meminfo(f.read())
+
+
+def _parse_vm_stat(text):
+    # Free, inactive and speculative pages are the ones macOS hands out without swapping
+    match = re.search(r"page size of (\d+) bytes", text)
+    if match is None:
+        return None
+    pages = dict(re.findall(r"^Pages (free|inactive|speculative):\s+(\d+)\.?$", text, re.MULTILINE))
+    if "free" not in pages:
+        return None
+    return int(match.group(1)) * sum(int(count) for count in pages.values())
+
+
+def _available_memory_macos():
+    import subprocess
+
+    result = subprocess.run(["vm_stat"], capture_output=True, text=True, timeout=5)
+    return _parse_vm_stat(result.stdout) if result.returncode == 0 else None
+
+
+def available_memory():
+    """
+    Physical memory currently available, in bytes, or None if it cannot be determined.
+
+    Uses MemAvailable from /proc/meminfo on Linux (free memory plus the reclaimable page
+    cache), then sysconf where it reports free pages, GlobalMemoryStatusEx on Windows and
+    vm_stat on macOS.
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            memory = _available_memory_linux()
+            if memory is not None:
+                return memory
+        except (OSError, ValueError):
+            pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        pass
+    try:
+        if sys.platform == "win32":
+            return _available_memory_windows()
+        if sys.platform == "darwin":
+            return _available_memory_macos()
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def max_pyramid_levels(height, width, min_size=MIN_TOP_SIZE):
+    """
+    Largest number of pyrDown steps that keeps the top level at least min_size pixels on its short side.
+    """
+    short_side = min(height, width)
+    if short_side < min_size:
+        return 0
+    return int(math.floor(math.log2(short_side / min_size)))
+
+
+def fusion_halo(levels, ksize=7):
+    """
+    Rows (or columns) of context a window needs on each side so that fusing it gives exactly
+    the pixels of a full-frame fusion. Covers pyrDown/pyrUp (5-tap), the 3x3 sharpness blur
+    and the ksize mask blur at every level, and is a multiple of 2**levels so the pyramid
+    sampling grid of the window lines up with the full frame's.
+    """
+    return (ksize + 8) * 2 ** levels
+
+
+def _pyramid_factor(levels):
+    # Sum of 4**-k for the Laplacian levels k = 0..levels-1, and for the Gaussian levels 0..levels
+    laplacian = sum(4.0 ** -k for k in range(levels))
+    gaussian = laplacian + 4.0 ** -levels
+    return laplacian, gaussian
+
+
+def estimate_stage_memory(shape, levels, mask_type="Soft", dtype=np.float32):
+    """
+    Peak memory (bytes) of each stage of the in-memory pipeline.
+
+    Args:
+        shape (tuple): Stack shape (N, H, W[, C]).
+        levels (int): Number of pyramid levels.
+        mask_type (str): "Soft" or "Hard".
+        dtype: Element type of the stack.
+    Returns:
+        dict: {stage: bytes}, cumulative (what is alive while that stage runs).
+    """
+    num_images, height, width = shape[:3]
+    channels = shape[3] if len(shape) > 3 else 1
+    frame = height * width * channels * np.dtype(dtype).itemsize
+    stack = num_images * frame
+    lap, gauss = _pyramid_factor(levels)
+
+    stages = {"load": stack}
+    # Gaussian level 0 is the frame itself; Laplacians are new arrays
+    stages["pyramids"] = stack * (gauss + lap)
+    stages["sharpness"] = stages["pyramids"] + stack * lap
+    if mask_type == "Soft":
+        # Raw + smoothed masks, and the per-level (N, H, W) blur/normalize temporaries
+        stages["masks"] = stages["sharpness"] + 2 * stack * lap + 3 * stack
+    else:
+        stages["masks"] = stages["sharpness"] + stack * lap + stack
+    stages["fusion"] = stages["masks"] - (3 * stack if mask_type == "Soft" else stack) + frame * lap
+    return stages
+
+
+def estimate_memory(shape, levels, mask_type="Soft", strategy="in-memory", strip_height=None, ksize=7, dtype=np.float32):
+    """
+    Peak memory (bytes) of a fusion strategy.
+    """
+    num_images, height, width = shape[:3]
+    channels = shape[3] if len(shape) > 3 else 1
+    frame = height * width * channels * np.dtype(dtype).itemsize
+    lap, gauss = _pyramid_factor(levels)
+
+    if strategy == "in-memory":
+        return int(max(estimate_stage_memory(shape, levels, mask_type, dtype).values()))
+    if strategy == "streaming":
+        # Current frame with its pyramids and sharpness maps, plus per-level accumulators:
+        # best sharpness, winner index (uint16), fused Laplacian, and for soft masks the
+        # normalization denominators and blurred weights.
+        per_frame = frame * (gauss + 2 * lap)
+        accumulators = frame * lap * (2.5 if mask_type == "Hard" else 4.5)
+        return int(per_frame + accumulators)
+    if strategy == "tiled":
+        strip_height = strip_height or height
+        window = min(height, strip_height + 2 * fusion_halo(levels, ksize))
+        window_shape = (num_images, window, width) + tuple(shape[3:])
+        # One full decoded source frame is alive while its window is cut out
+        return int(estimate_memory(window_shape, levels, mask_type, "in-memory", dtype=dtype) + 2 * frame)
+    raise ValueError(f"Unknown strategy: {strategy}")
+
+
+def estimate_preprocess_memory(shape, low_memory=False, dtype=np.float32):
+    """
+    Peak memory (bytes) of aligning a stack that is not cached yet (preprocess_image_stack).
+
+    Only warps are computed, so the default path holds the decoded frames and their resized
+    copy (about two stacks). With low_memory, two frames decoding ahead and the current frame
+    with its Gaussian pyramid are alive, plus every frame's grayscale registration levels (a
+    third of a grayscale frame, from half resolution down).
+    """
+    num_images, height, width = shape[:3]
+    channels = shape[3] if len(shape) > 3 else 1
+    frame = height * width * channels * np.dtype(dtype).itemsize
+    if not low_memory:
+        return int(2 * num_images * frame)
+    gray = height * width * np.dtype(dtype).itemsize
+    return int((3 + 4 / 3) * frame + num_images * gray / 3)
+
+
+def estimate_runtime(shape, levels, mask_type="Soft", strategy="in-memory", strip_height=None, ksize=7):
+    """
+    Rough runtime (seconds) of each stage of a fusion strategy.
+    """
+    num_images, height, width = shape[:3]
+    channels = shape[3] if len(shape) > 3 else 1
+    pixels = num_images * height * width * channels
+    lap, gauss = _pyramid_factor(levels)
+    mask_cost = STAGE_COST["masks_soft" if mask_type == "Soft" else "masks_hard"]
+
+    load_passes = 1
+    compute = 1.0
+    if strategy == "streaming" and mask_type == "Soft":
+        # Second pass rebuilds every frame's pyramid
+        load_passes = 2
+    elif strategy == "tiled":
+        strip_height = strip_height or height
+        strips = math.ceil(height / strip_height)
+        window = min(height, strip_height + 2 * fusion_halo(levels, ksize))
+        load_passes = strips
+        compute = strips * window / height
+
+    return {
+        "load": pixels * STAGE_COST["load"] * load_passes,
+        "pyramids": pixels * gauss * STAGE_COST["pyramids"] * compute * (2 if load_passes == 2 else 1),
+        "sharpness": pixels * lap * STAGE_COST["sharpness"] * compute,
+        "masks": pixels * lap * mask_cost * compute,
+        "fusion": pixels * lap * STAGE_COST["fusion"] * compute,
+    }
+
+
+def plan_fusion(shape, levels, mask_type="Soft", memory_budget=None, strategy=None, ksize=7, dtype=np.float32):
+    """
+    Choose how to run the fusion of a stack.
+
+    The level count is clamped to max_pyramid_levels. Unless a strategy is forced, in-memory
+    is used when it fits the budget, then streaming, then tiled with the tallest strip that fits.
+    If nothing fits, the strategy with the smaller footprint of streaming and tiled is used.
+    A strategy only fits if aligning the stack (when it is not cached) fits as well; for the
+    streaming and tiled strategies that is done frame by frame (preprocess_image_stack(low_memory=True)).
+
+    Args:
+        shape (tuple): Stack shape (N, H, W[, C]).
+        levels (int): Requested number of pyramid levels.
+        mask_type (str): "Soft" or "Hard".
+        memory_budget (int): Bytes available for the fusion (default: half of the available memory).
+        strategy (str): Force "in-memory", "streaming" or "tiled".
+        ksize (int): Mask blur kernel size (determines the tile halo).
+        dtype: Element type of the stack.
+    Returns:
+        dict: Plan with "strategy", "levels", "requested_levels", "strip_height", "memory_budget",
+        "peak_memory" (per strategy), "preprocess_memory" (peak of an uncached alignment with the
+        chosen strategy), "stage_memory", "runtime" (per stage), "shape", "mask_type" and "fits"
+        (whether the chosen strategy fits the budget).
+    """
+    num_images, height, width = shape[:3]
+    if memory_budget is None:
+        available = available_memory()
+        memory_budget = available // 2 if available else None
+        if memory_budget is None and not _warned["unknown_memory"]:
+            _warned["unknown_memory"] = True
+            print("Could not determine the available memory; planning without a memory budget "
+                  "(set one with --memory-budget-mb).")
+
+    clamped = max(1, min(levels, max_pyramid_levels(height, width)))
+    step = 2 ** clamped
+
+    peak = {
+        "in-memory": estimate_memory(shape, clamped, mask_type, "in-memory", dtype=dtype),
+        "streaming": estimate_memory(shape, clamped, mask_type, "streaming", dtype=dtype),
+    }
+
+    # Tallest strip (a multiple of 2**levels) whose window fits the budget
+    strip_height = max(step, (height // 2 // step) * step)
+    while strip_height > step and memory_budget is not None and \
+            estimate_memory(shape, clamped, mask_type, "tiled", strip_height, ksize, dtype) > memory_budget:
+        strip_height = max(step, (strip_height // 2 // step) * step)
+    peak["tiled"] = estimate_memory(shape, clamped, mask_type, "tiled", strip_height, ksize, dtype)
+
+    preprocess = {name: estimate_preprocess_memory(shape, low_memory=name != "in-memory", dtype=dtype)
+                  for name in STRATEGIES}
+    fits = [name for name in STRATEGIES
+            if memory_budget is None or max(peak[name], preprocess[name]) <= memory_budget]
+    if strategy is None:
+        if fits:
+            # STRATEGIES is ordered fastest first
+            strategy = fits[0]
+        else:
+            # Nothing fits: take the smallest footprint and hope for swap
+            strategy = min(("streaming", "tiled"), key=lambda name: max(peak[name], preprocess[name]))
+    if strategy != "tiled":
+        strip_height = None
+
+    return {
+        "strategy": strategy,
+        "levels": clamped,
+        "requested_levels": levels,
+        "strip_height": strip_height,
+        "memory_budget": memory_budget,
+        "peak_memory": peak,
+        "preprocess_memory": preprocess[strategy],
+        "stage_memory": estimate_stage_memory(shape, clamped, mask_type, dtype),
+        "runtime": estimate_runtime(shape, clamped, mask_type, strategy, strip_height, ksize),
+        "shape": tuple(shape),
+        "mask_type": mask_type,
+        "fits": strategy in fits,
+    }
+
+
+def format_plan(plan):
+    """
+    One-paragraph, human readable summary of a plan for logging.
+    """
+    mb = 2 ** 20
+    num_images, height, width = plan["shape"][:3]
+    lines = [f"Plan: {plan['strategy']} fusion of {num_images} frames {width}x{height}, "
+             f"{plan['levels']} levels, {plan['mask_type']} masks"]
+    if plan["levels"] != plan["requested_levels"]:
+        lines.append(f"  levels clamped from {plan['requested_levels']} to {plan['levels']} for this resolution")
+    budget = plan["memory_budget"]
+    budget_text = f"{budget / mb:.0f} MB" if budget is not None else "unknown"
+    peaks = ", ".join(f"{name} {value / mb:.0f} MB" for name, value in plan["peak_memory"].items())
+    lines.append(f"  est. peak memory: {peaks} (budget {budget_text}); "
+                 f"aligning an uncached stack {plan['preprocess_memory'] / mb:.0f} MB")
+    if not plan["fits"]:
+        lines.append(f"  warning: {plan['strategy']} is expected to exceed the memory budget")
+    if plan["strip_height"]:
+        lines.append(f"  strip height {plan['strip_height']} rows")
+    runtime = plan["runtime"]
+    stages = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in runtime.items())
+    lines.append(f"  est. runtime: {sum(runtime.values()):.1f}s ({stages})")
+    return "\n".join(lines)
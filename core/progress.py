@@ -0,0 +1,63 @@
+"""
+Progress reporting and cooperative cancellation for long running stages.
+
+The stages take an optional `progress` argument (a ProgressToken). They call report() after
+every frame or pyramid level, which forwards (stage, done, total) to the token's callback
+and raises Cancelled once the token was cancelled, so an abandoned job stops at the next
+frame or level instead of running to the end.
+"""
+
+import threading
+
+
+class Cancelled(Exception):
+    """
+    Raised inside a stage when its ProgressToken was cancelled.
+    """
+
+
+class ProgressToken:
+    """
+    Progress sink and cancellation flag shared by a job and whoever started it.
+
+    Args:
+        callback (callable): Called as callback(stage, done, total) from the job's thread.
+    """
+
+    def __init__(self, callback=None, _event=None):
+        self.callback = callback
+        self._event = _event if _event is not None else threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """
+        Raise Cancelled if the token was cancelled.
+        """
+        if self._event.is_set():
+            raise Cancelled()
+
+    def update(self, stage, done, total):
+        self.check()
+        if self.callback is not None:
+            self.callback(stage, done, total)
+
+    def silent(self):
+        """
+        Token sharing this one's cancellation but reporting nothing, for stages nested in
+        a loop that reports its own progress (e.g. the strips of the tiled strategy).
+        """
+        return ProgressToken(None, self._event)
+
+
+def report(progress, stage, done, total):
+    """
+    Report progress to an optional token (None is allowed) and raise Cancelled if it was cancelled.
+    """
+    if progress is not None:
+        progress.update(stage, done, total)
@@ -0,0 +1,157 @@
+"""
+Frame pruning: find the frames of a focus sweep that contribute nothing before they are
+aligned and fused.
+
+Sweeps often start and end past the subject, and those frames never win at any pixel. A
+cheap pre-pass scores every frame on a downsampled grayscale copy with the same sharpness
+measure as the fusion (blurred energy of the finest Laplacian level) and counts, per frame,
+the share of pixels where it is the sharpest. Flat pixels, where only sensor noise tells the
+frames apart, are left out of the count. Frames below a minimum share are dropped, and
+of two consecutive near-identical frames (much closer to each other than consecutive frames
+of the sweep usually are) only the one with the larger share is kept.
+
+Pruning changes the result wherever a dropped frame would have won at full resolution, so
+it is opt-in (preprocess_image_stack(prune=...), `focus-stack fuse --prune`).
+"""
+
+import cv2
+import numpy as np
+
+# Default minimum share of winning pixels (0.5 %)
+DEFAULT_MIN_SHARE = 0.005
+# Long side of the images scored by the pre-pass
+COARSE_SIZE = 256
+# Blur of the energy maps (coarse pixels): wide enough that a defocused frame's blurred edge
+# does not outscore the flat surroundings of the same edge in the sharp frame
+ENERGY_SIGMA = 2.0
+# Pixels whose best energy is below this multiple of the noise level are not counted
+NOISE_FLOOR = 4.0
+# Consecutive frames whose coarse difference is below this fraction of the sweep's median
+# step count as near-duplicates
+DUPLICATE_RATIO = 0.5
+
+
+def coarse_frames(image_stack, max_side=COARSE_SIZE):
+    """
+    Downsampled grayscale copies of the frames, float32, long side at most max_side.
+    """
+    H, W = image_stack[0].shape[:2]
+    scale = min(1.0, max_side / max(H, W))
+    size = (max(1, int(round(W * scale))), max(1, int(round(H * scale))))
+    coarse = []
+    for image in image_stack:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        coarse.append(cv2.resize(gray.astype(np.float32), size, interpolation=cv2.INTER_AREA))
+    return np.stack(coarse, axis=0)
+
+
+def winning_shares(coarse, sigma=ENERGY_SIGMA, noise_floor=NOISE_FLOOR):
+    """
+    Share of pixels at which each frame is the sharpest, on the coarse frames.
+
+    Pixels where even the sharpest frame's energy is within noise_floor times the noise
+    level (the median energy of the least detailed frame) are flat: their winner is decided
+    by sensor noise, so they are not counted.
+
+    Args:
+        coarse (np.ndarray): (N, h, w) float32 grayscale frames.
+        sigma (float): Gaussian blur of the energy maps, in coarse pixels.
+        noise_floor (float): Multiple of the noise level below which a pixel is flat.
+    Returns:
+        np.ndarray: (N,) shares summing to 1.
+    """
+    energies = []
+    for frame in coarse:
+        h, w = frame.shape
+        laplacian = frame - cv2.pyrUp(cv2.pyrDown(frame), dstsize=(w, h))
+        energies.append(cv2.GaussianBlur(laplacian * laplacian, (0, 0), sigma))
+    energies = np.stack(energies, axis=0)
+    winners = np.argmax(energies, axis=0)
+    noise = min(float(np.median(energy)) for energy in energies)
+    detailed = energies.max(axis=0) > noise_floor * noise
+    if detailed.any():
+        winners = winners[detailed]
+    return np.bincount(winners.ravel(), minlength=len(coarse)) / winners.size
+
+
+def select_frames(image_stack, min_share=DEFAULT_MIN_SHARE, duplicate_ratio=DUPLICATE_RATIO, max_side=COARSE_SIZE):
+    """
+    Choose the frames worth aligning and fusing.
+
+    Args:
+        image_stack (np.ndarray): (N, H, W[, C]) frames, not necessarily aligned (the coarse
+            scale hides small misalignments).
+        min_share (float): Frames winning fewer than this share of the coarse pixels are dropped.
+        duplicate_ratio (float): Consecutive frames whose mean absolute difference is below
+            this fraction of the median difference between consecutive frames are
+            near-duplicates; the one with the smaller share is dropped.
+    Returns:
+        tuple:
+            - keep (list[int]): Indices of the frames to keep, in order (never empty).
+            - dropped (list[dict]): {"index", "share", "reason"} per dropped frame.
+    """
+    if len(image_stack) < 2:
+        return list(range(len(image_stack))), []
+    return select_coarse_frames(coarse_frames(image_stack, max_side), min_share, duplicate_ratio)
+
+
+def select_coarse_frames(coarse, min_share=DEFAULT_MIN_SHARE, duplicate_ratio=DUPLICATE_RATIO):
+    """
+    select_frames on frames already reduced by coarse_frames, for callers that never hold
+    the full-resolution stack.
+    """
+    num_images = len(coarse)
+    if num_images < 2:
+        return list(range(num_images)), []
+
+    shares = winning_shares(coarse)
+    reasons = {}
+
+    # Near-duplicate neighbours: keep the one that wins more often
+    steps = [float(np.mean(np.abs(coarse[i] - coarse[i - 1]))) for i in range(1, num_images)]
+    tolerance = duplicate_ratio * float(np.median(steps))
+    last = 0
+    for i in range(1, num_images):
+        if float(np.mean(np.abs(coarse[i] - coarse[last]))) < tolerance:
+            weaker = i if shares[i] <= shares[last] else last
+            reasons[weaker] = "duplicate"
+            if weaker == last:
+                last = i
+        else:
+            last = i
+
+    for i in range(num_images):
+        if i not in reasons and shares[i] < min_share:
+            reasons[i] = "no winning pixels" if shares[i] == 0 else "few winning pixels"
+
+    keep = [i for i in range(num_images) if i not in reasons]
+    if not keep:
+        # Everything looked alike; keep the frame that wins most often
+        best = int(np.argmax(shares))
+        del reasons[best]
+        keep = [best]
+
+    dropped = [{"index": i, "share": float(shares[i]), "reason": reasons[i]} for i in sorted(reasons)]
+    return keep, dropped
+
+
+def format_pruning(stack, plan=None):
+    """
+    Summary of the frames a pruned AlignedStack skipped and the time that saved.
+
+    The alignment saving is measured when the stack is built (ECC time per kept frame); the
+    fusion saving is the planner's runtime estimate scaled by the share of frames skipped.
+    """
+    pruned = getattr(stack, "pruned", None)
+    if not pruned:
+        return None
+    num_frames = len(stack) + len(pruned)
+    lines = [f"Pruned {len(pruned)} of {num_frames} frames:"]
+    for frame in pruned:
+        lines.append(f"  {frame['file']}: {frame['reason']} ({frame['share'] * 100:.2f}% of pixels)")
+    saved = f"  saved ~{stack.prune_seconds_saved:.1f}s of alignment"
+    if plan is not None:
+        fusion = sum(plan["runtime"].values()) * len(pruned) / max(1, len(stack))
+        saved += f" and ~{fusion:.1f}s (est.) of fusion"
+    lines.append(saved)
+    return "\n".join(lines)
@@ -0,0 +1,194 @@
+"""
+Time-lapse mode: fuse a series of focus stacks of the same scene, one fused frame per step.
+
+Consecutive stacks share their alignment state instead of starting cold:
+  - A frame whose content (SHA-256 of the encoded file) is unchanged since the previous
+    step is neither decoded nor registered again; its decoded image is reused, and so is
+    its warp as long as the reference frame is unchanged too.
+  - The other frames start ECC from the warp of the frame at the same position in the
+    previous step, which converges in a few iterations when the camera has not moved.
+  - If nothing changed at all, the previous fused frame is reused.
+
+Steps are pipelined: while one stack is aligned and fused, a background thread reads,
+hashes and decodes the next one, and another one encodes and writes the fused frames.
+"""
+
+import csv
+import hashlib
+import os
+import posixpath
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ._01_preprocess import describe_extension, ensure_same_size, estimate_warps, is_archive, list_image_files
+from ._01_preprocess import read_image_sources, warp_image
+from .datasets import list_datasets
+from .imagefile import check_output_options, decode_image, output_path, rescale, write_image
+from .pipeline import fuse_stack
+
+
+def expand_series(data_dir, names, file_extension=None):
+    """
+    Stacks of a time-lapse, in order.
+
+    Each name that holds images is one step. A folder or archive without images of its own
+    stands for the series inside it: its sub-datasets, in sorted order (e.g. "series" with
+    "series/t000", "series/t001", ...).
+    """
+    steps = []
+    for name in names:
+        path = os.path.join(data_dir, name)
+        if list_image_files(path, file_extension):
+            steps.append(name)
+        elif os.path.isdir(path):
+            steps.extend(posixpath.join(name, sub) for sub in list_datasets(path, file_extension))
+        elif is_archive(path):
+            prefix = name.rstrip("/") + "/"
+            steps.extend(d for d in list_datasets(data_dir, file_extension) if d.startswith(prefix))
+        else:
+            raise ValueError(f"No images or stacks found in {path}")
+    return steps
+
+
+def read_step(folder_path, known=(), file_extension=None):
+    """
+    Read one stack of a time-lapse: hash every frame and decode the ones not in known.
+
+    Args:
+        folder_path (str): Folder or "<archive>/<folder>" of the stack.
+        known (set): Content hashes whose decoded images the caller already has.
+    Returns:
+        list[tuple]: (hash, image, max_value) per frame in file order; image and max_value
+        are None for known frames. Frames that fail to decode are left out.
+    """
+    image_files = list_image_files(folder_path, file_extension)
+    frames = [None] * len(image_files)
+    with ThreadPoolExecutor() as pool:
+        for i, data in read_image_sources(folder_path, image_files):
+            digest = hashlib.sha256(data).hexdigest()
+            frames[i] = (digest, None if digest in known else pool.submit(decode_image, data))
+        frames = [(digest, *(future.result() if future is not None else (None, None))) for digest, future in frames]
+    return [frame for frame in frames if frame[0] in known or frame[1] is not None]
+
+
+def _timed_write(*args):
+    start = time.perf_counter()
+    write_image(*args)
+    return time.perf_counter() - start
+
+
+def run_timelapse(names, data_dir="data", output_dir="output", levels=4, mask_type="Soft", top_method="max",
+                  memory_budget=None, strategy=None, bit_depth=None, image_format="png", compression="default",
+                  file_extension=None):
+    """
+    Fuse every stack of a time-lapse and write one fused frame per step.
+
+    Args:
+        names (list): Stacks in data_dir, in time order, or folders holding them (see expand_series).
+        data_dir (str): Directory containing the datasets.
+        output_dir (str): Frames go to <output_dir>/timelapse/<series>/.
+        levels, mask_type, top_method, memory_budget, strategy, bit_depth, image_format, compression,
+        file_extension: As for main.main.
+    Returns:
+        list[dict]: Per step: "step", "path", "frames", "decoded", "registered", and the
+        seconds spent waiting for the decode ("wait") and in "align", "fuse" and "write" (on the
+        writer thread).
+    """
+    check_output_options(image_format, compression, bit_depth)
+    steps = expand_series(data_dir, names, file_extension)
+    if not steps:
+        raise ValueError(f"No stacks found for {', '.join(names)}")
+    series = names[0] if len(names) == 1 else "timelapse"
+    out_dir = os.path.join(output_dir, "timelapse", series.replace("/", "_").replace(os.sep, "_"))
+    os.makedirs(out_dir, exist_ok=True)
+
+    # State of the previous step: hash -> (decoded image, the max_value it is scaled to, warp),
+    # and the fused frame
+    previous = {}
+    previous_hashes = previous_warps = previous_fused = None
+    timings = []
+    writes = []
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=1) as reader, ThreadPoolExecutor(max_workers=1) as writer:
+        pending = reader.submit(read_step, os.path.join(data_dir, steps[0]), set(), file_extension)
+        for k, name in enumerate(steps):
+            print(f"Time step {k + 1}/{len(steps)}: {name}")
+            start = time.perf_counter()
+            frames = pending.result()
+            wait = time.perf_counter() - start
+            if not frames:
+                raise ValueError(f"No images found in {os.path.join(data_dir, name)} "
+                                 f"with extension {describe_extension(file_extension)}")
+            hashes = [digest for digest, _, _ in frames]
+
+            # Decode the next stack while this one is aligned and fused
+            if k + 1 < len(steps):
+                pending = reader.submit(read_step, os.path.join(data_dir, steps[k + 1]), set(hashes), file_extension)
+
+            start = time.perf_counter()
+            # Frames of mixed bit depth are brought to the deepest one's range
+            ranges = [value if value is not None else previous[digest][1] for digest, _, value in frames]
+            max_value = max(ranges)
+            sources = []
+            for (digest, image, _), value in zip(frames, ranges):
+                if image is None:
+                    # Kept from the previous step, possibly for several frames: scale a copy
+                    image = previous[digest][0]
+                    image = image.copy() if value != max_value else image
+                sources.append(rescale(image, value, max_value))
+            image_stack = ensure_same_size(sources)
+            warps = [None] * len(frames)
+            if previous_hashes is not None and hashes[0] == previous_hashes[0]:
+                for i, digest in enumerate(hashes):
+                    if digest in previous:
+                        warps[i] = previous[digest][2]
+            # The reference stays identity; the rest start from last step's warp at the same position
+            todo = [i for i in range(1, len(frames)) if warps[i] is None]
+            initial = [None] + [previous_warps[i] if previous_warps is not None and i < len(previous_warps) else None
+                                for i in todo]
+            warps[0] = np.eye(2, 3, dtype=np.float32)
+            if todo:
+                found, _ = estimate_warps(image_stack[[0] + todo], initial_warps=initial)
+                for i, warp in zip(todo, found[1:]):
+                    warps[i] = warp
+            align = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if hashes == previous_hashes:
+                print("Stack unchanged, reusing the previous fused frame")
+                fused = previous_fused
+            else:
+                aligned = np.stack([warp_image(image, warp) for image, warp in zip(image_stack, warps)], axis=0)
+                fused, _ = fuse_stack(aligned, levels, mask_type, top_method, memory_budget=memory_budget,
+                                      strategy=strategy, max_value=max_value)
+                del aligned
+            fuse = time.perf_counter() - start
+
+            # Encoded and written while the next step runs
+            path = output_path(out_dir, f"{k:04d}_{name.replace('/', '_').replace(os.sep, '_')}_fused", image_format)
+            writes.append(writer.submit(_timed_write, path, fused, max_value, bit_depth, compression))
+
+            timing = {"step": name, "path": path, "frames": len(frames),
+                      "decoded": sum(image is not None for _, image, _ in frames), "registered": len(todo),
+                      "wait": wait, "align": align, "fuse": fuse}
+            timings.append(timing)
+            print(f"  {timing['decoded']}/{len(frames)} frames decoded, {len(todo)} registered; "
+                  f"wait {wait:.2f}s, align {align:.2f}s, fuse {fuse:.2f}s")
+
+            previous = {digest: (image, max_value, warp) for digest, image, warp in zip(hashes, image_stack, warps)}
+            previous_hashes, previous_warps, previous_fused = hashes, warps, fused
+
+        for timing, write in zip(timings, writes):
+            timing["write"] = write.result()
+
+    timings_path = os.path.join(out_dir, "timings.csv")
+    with open(timings_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(timings[0]))
+        writer.writeheader()
+        writer.writerows(timings)
+    total = time.perf_counter() - started
+    print(f"Fused {len(timings)} time steps in {total:.1f}s; frames in {out_dir}, timings in {timings_path}")
+    return timings
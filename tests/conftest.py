@@ -0,0 +1,13 @@
+import pytest
+
+from core import _01_preprocess
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """
+    Keep alignment caches out of core/cache.
+    """
+    path = tmp_path / "cache"
+    monkeypatch.setattr(_01_preprocess, "CACHE_DIR", str(path))
+    return path
@@ -0,0 +1,85 @@
+"""
+Registration against known warps: sub-pixel shifts between frames focused at different depths.
+"""
+
+import tracemalloc
+
+import cv2
+import numpy as np
+import pytest
+
+from core import _01_preprocess as preprocess
+from core.benchmark import make_synthetic_stack
+from core.planner import estimate_preprocess_memory
+
+HEIGHT, WIDTH = 600, 800
+SHIFTS = [(0, 0), (0.3, -0.4), (-0.7, 0.5), (1.3, 0.2), (-1.5, -1.1), (0.9, 1.4), (-0.4, 1.5), (1.1, -0.8)]
+BLURS = [0.5, 1.0, 2.0, 3.0, 1.5, 4.0, 2.5, 5.0]
+
+
+def make_scene(rng):
+    scene = np.zeros((HEIGHT, WIDTH, 3), np.float32)
+    for scale in (1, 2, 4, 8, 16):
+        noise = rng.normal(0, 1, (HEIGHT, WIDTH, 3)).astype(np.float32)
+        scene += cv2.GaussianBlur(noise, (0, 0), scale) * scale ** 0.8
+    return (scene - scene.min()) / (scene.max() - scene.min()) * 200 + 20
+
+
+def make_frame(scene, rng, blur, shift=(0, 0)):
+    frame = cv2.GaussianBlur(scene, (0, 0), blur)
+    M = np.float32([[1, 0, shift[0]], [0, 1, shift[1]]])
+    frame = cv2.warpAffine(frame, M, (WIDTH, HEIGHT), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REFLECT)
+    return frame + rng.normal(0, 1, frame.shape).astype(np.float32)
+
+
+def test_known_shifts_with_different_blur():
+    rng = np.random.default_rng(0)
+    scene = make_scene(rng)
+    stack = np.stack([make_frame(scene, rng, blur, shift) for blur, shift in zip(BLURS, SHIFTS)])
+
+    warps, scores = preprocess.estimate_warps(stack)
+
+    assert not np.isnan(scores).any()
+    # The frame at reference pixel p is at p + shift in the shifted frame
+    np.testing.assert_allclose(warps[:, :, 2], np.float32(SHIFTS), atol=0.15)
+    np.testing.assert_allclose(warps[:, :, :2], np.tile(np.eye(2), (len(SHIFTS), 1, 1)), atol=1e-3)
+
+
+def test_runaway_warp_is_rejected():
+    rng = np.random.default_rng(1)
+    scene = make_scene(rng)
+    # Nothing but the coarsest structure is left in the second frame
+    stack = np.stack([make_frame(scene, rng, 0.5), make_frame(scene, rng, 25.0, (0.5, 0.5))])
+
+    warps, scores = preprocess.estimate_warps(stack)
+
+    np.testing.assert_array_equal(warps[1], np.eye(2, 3))
+    assert np.isnan(scores[1])
+
+
+@pytest.mark.parametrize("prune", [None, 0.005])
+def test_low_memory_alignment_matches(tmp_path, prune):
+    folder = tmp_path / "sweep"
+    make_synthetic_stack(str(folder), height=480, width=640, num_frames=12)
+    # A frame of another size is brought to the first frame's size in both paths
+    frame = cv2.imread(str(folder / "frame_03.png"))
+    cv2.imwrite(str(folder / "frame_03.png"), cv2.resize(frame, (650, 490)))
+
+    peaks = {}
+    stacks = {}
+    for low_memory in (False, True):
+        tracemalloc.start()
+        stacks[low_memory] = preprocess.preprocess_image_stack(str(folder), use_cache=False, lazy=True, prune=prune,
+                                                               low_memory=low_memory)
+        peaks[low_memory] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    full, low = stacks[False], stacks[True]
+    assert low.shape == full.shape and low.image_files == full.image_files
+    np.testing.assert_array_equal(low.warps, full.warps)
+    assert [f["file"] for f in low.pruned] == [f["file"] for f in full.pruned]
+    assert bool(full.pruned) == (prune is not None)
+    # A few frames instead of two stacks, as the planner assumes
+    shape = (12,) + full.shape[1:]
+    assert peaks[True] < 1.25 * estimate_preprocess_memory(shape, low_memory=True)
+    assert peaks[False] > 3 * peaks[True]
@@ -0,0 +1,106 @@
+"""
+Datasets read from zip and tar archives: listings are memoized and single frames are read
+without a pass over the whole archive.
+"""
+
+import os
+import tarfile
+import time
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+from core import _01_preprocess as preprocess
+
+FRAMES = 4
+
+
+@pytest.fixture
+def stack_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    folder = tmp_path / "src" / "flowers"
+    folder.mkdir(parents=True)
+    for i in range(FRAMES):
+        cv2.imwrite(str(folder / f"img_{i}.png"), rng.integers(0, 256, (48, 64, 3), dtype=np.uint8))
+    return folder
+
+
+def make_archive(stack_dir, path):
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path, "w") as z:
+            for name in sorted(os.listdir(stack_dir)):
+                z.write(os.path.join(stack_dir, name), f"flowers/{name}")
+    else:
+        mode = "w:gz" if path.endswith(".tar.gz") else "w"
+        with tarfile.open(path, mode) as t:
+            t.add(str(stack_dir), arcname="flowers")
+    return path
+
+
+@pytest.mark.parametrize("extension", [".zip", ".tar", ".tar.gz"])
+def test_archive_frames_match_folder(tmp_path, stack_dir, extension, monkeypatch):
+    archive = make_archive(stack_dir, str(tmp_path / f"stacks{extension}"))
+    reads = []
+    read_index = preprocess._read_archive_index
+    monkeypatch.setattr(preprocess, "_read_archive_index", lambda path: reads.append(path) or read_index(path))
+
+    dataset = os.path.join(archive, "flowers")
+    names = preprocess.list_image_files(dataset)
+    files = preprocess.list_image_files(str(stack_dir))
+    assert [os.path.basename(n) for n in names] == [os.path.basename(f) for f in files]
+
+    expected = [open(f, "rb").read() for f in files]
+    assert dict(preprocess.read_image_sources(dataset, names)) == dict(enumerate(expected))
+    # One frame on its own, out of order
+    assert next(preprocess.read_image_sources(dataset, names[2:3])) == (0, expected[2])
+
+    preprocess.source_signature(dataset, names)
+    assert len(reads) == 1
+    assert preprocess.has_random_access(dataset) == (extension != ".tar.gz")
+
+    # A changed archive is listed again
+    os.utime(archive, ns=(0, 0))
+    preprocess.list_image_files(dataset)
+    assert len(reads) == 2
+
+
+def test_compressed_tar_frames_read_once(tmp_path, stack_dir, monkeypatch):
+    archive = make_archive(stack_dir, str(tmp_path / "stacks.tar.gz"))
+    dataset = os.path.join(archive, "flowers")
+    names = preprocess.list_image_files(dataset)
+    warps = np.tile(np.eye(2, 3, dtype=np.float32), (FRAMES, 1, 1))
+    stack = preprocess.AlignedStack(dataset, names, warps, np.ones(FRAMES), (FRAMES, 48, 64, 3))
+
+    passes = []
+    read_sources = preprocess.read_image_sources
+    monkeypatch.setattr(preprocess, "read_image_sources",
+                        lambda *args: passes.append(args) or read_sources(*args))
+    frames = [stack.tile(i, 0, 16, 0, 64) for i in (3, 0, 2, 1, 3)]
+
+    assert len(passes) == 1
+    expected = np.asarray(stack)
+    for i, frame in zip((3, 0, 2, 1, 3), frames):
+        np.testing.assert_array_equal(frame, expected[i, :16])
+
+
+def test_cancelled_load_drops_queued_decodes(stack_dir, monkeypatch):
+    from core.progress import Cancelled, ProgressToken
+
+    decoded = []
+    decode = preprocess.decode_image
+
+    def slow_decode(data):
+        time.sleep(0.05)
+        decoded.append(1)
+        return decode(data)
+
+    monkeypatch.setattr(preprocess, "decode_image", slow_decode)
+    files = preprocess.list_image_files(str(stack_dir))
+    # Cancelled once the first frame is decoded, with the others still queued
+    token = ProgressToken(lambda stage, done, total: token.cancel())
+
+    with pytest.raises(Cancelled):
+        preprocess._load_images(str(stack_dir), files, workers=1, progress=token)
+    assert len(decoded) < FRAMES
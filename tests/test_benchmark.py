@@ -0,0 +1,17 @@
+"""
+The benchmark's own checks on a synthetic stack: ground truth, known motion and pruning.
+"""
+
+from core import benchmark
+
+
+def test_pruned_variant_skips_end_frames(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark, "SYNTHETIC_STACKS", benchmark.SYNTHETIC_STACKS[:1])
+    results = benchmark.run_benchmark(str(tmp_path / "no-data"), variants=["pruned"], memory=False)
+
+    assert [r["variant"] for r in results] == ["reference", "pruned"]
+    assert all(r["passed"] for r in results), benchmark.format_results(results)
+    reference, pruned = results
+    assert reference["pruned"] == 0 and pruned["pruned"] == 2
+    # Pruning the first frame keeps it as the alignment reference, so nothing moves
+    assert pruned["warp_error"] == reference["warp_error"] <= benchmark.MAX_WARP_ERROR
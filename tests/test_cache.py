@@ -0,0 +1,64 @@
+"""
+Alignment cache entries: one warp per frame, replacing the old aligned-stack files.
+"""
+
+import re
+
+import numpy as np
+import pytest
+
+from core import _01_preprocess as preprocess
+from core.benchmark import make_synthetic_stack
+
+
+def test_saving_warps_removes_legacy_entry(tmp_path, cache_dir):
+    folder = tmp_path / "sweep"
+    make_synthetic_stack(str(folder), height=96, width=128, num_frames=4)
+    cache_dir.mkdir()
+    for name in ("sweep_aligned.npy", "sweep_aligned.json", "other_aligned.npy", "other_aligned.json"):
+        (cache_dir / name).write_bytes(b"\0" * 1024)
+
+    stack = preprocess.preprocess_image_stack(str(folder), lazy=True)
+
+    assert sorted(p.name for p in cache_dir.iterdir()) == ["other_aligned.json", "other_aligned.npy", "sweep_warps.npz"]
+    cached = preprocess.load_cache(str(folder))
+    np.testing.assert_array_equal(cached.warps, stack.warps)
+
+    assert preprocess.remove_legacy_cache() == 2048
+    assert [p.name for p in cache_dir.iterdir()] == ["sweep_warps.npz"]
+
+
+def test_precompute_cache_schedules_and_skips(tmp_path, cache_dir, capsys):
+    from core import datasets
+
+    data = tmp_path / "data"
+    make_synthetic_stack(str(data / "small"), height=96, width=128, num_frames=3)
+    make_synthetic_stack(str(data / "large"), height=192, width=256, num_frames=4)
+
+    # Every dataset is over a 1-byte limit: each runs alone, largest first
+    results = datasets.precompute_cache(str(data), workers=2, memory_limit=1)
+    out = capsys.readouterr().out
+    assert sorted(results) == ["large", "small"]
+    assert all(seconds > 0 and size > 0 for seconds, size in results.values())
+    events = re.findall(r"(large|small): (estimated|[\d.]+s, cache [\d.]+ KB)", out)
+    assert [(name, event.startswith("estimated")) for name, event in events] == [
+        ("large", True), ("large", False), ("small", True), ("small", False)]
+    assert sorted(p.name for p in cache_dir.iterdir()) == ["large_warps.npz", "small_warps.npz"]
+
+    assert datasets.precompute_cache(str(data), workers=2, memory_limit=1) == {}
+    out = capsys.readouterr().out
+    assert out.count("cache is up to date, skipping") == 2
+
+
+def test_pruned_and_unpruned_caches_coexist(tmp_path, cache_dir, monkeypatch):
+    folder = tmp_path / "sweep"
+    make_synthetic_stack(str(folder), height=96, width=128, num_frames=6)
+    for prune in (None, 0.005):
+        preprocess.preprocess_image_stack(str(folder), lazy=True, prune=prune)
+    assert sorted(p.name for p in cache_dir.iterdir()) == ["sweep_prune0.005_warps.npz", "sweep_warps.npz"]
+
+    # Switching back and forth is served from the cache
+    monkeypatch.setattr(preprocess, "estimate_warps", lambda *args, **kwargs: pytest.fail("aligned again"))
+    for prune in (None, 0.005, None):
+        assert preprocess.preprocess_image_stack(str(folder), lazy=True, prune=prune) is not None
+    assert preprocess.is_cache_valid(str(folder)) and preprocess.is_cache_valid(str(folder), prune=0.005)
@@ -0,0 +1,20 @@
+"""
+Each subcommand's implementation imports within its budget and without the heavy
+libraries it does not need.
+"""
+
+import pytest
+
+from core import cli
+
+
+@pytest.mark.parametrize("module", sorted(cli.IMPORT_BUDGETS_MS))
+def test_import_time_and_forbidden_imports(module):
+    # The faster of two runs, so a cold disk cache or bytecode compilation does not count
+    runs = [cli.measure_import_time(module) for _ in range(2)]
+    elapsed_ms = min(elapsed for elapsed, _ in runs)
+    loaded = runs[0][1]
+
+    assert module in loaded
+    assert not [name for name in cli.FORBIDDEN_IMPORTS.get(module, ()) if name in loaded]
+    assert 0 < elapsed_ms <= cli.IMPORT_BUDGETS_MS[module]
@@ -0,0 +1,152 @@
+"""
+Resumable downloads against a local HTTP server that supports Range requests and drops the
+first connection part way through a member.
+"""
+
+import io
+import os
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core import datasets
+
+MEMBERS = {
+    "stack/stored.bin": os.urandom(100_000),
+    "stack/deflated.txt": os.urandom(400_000).hex().encode(),
+    "stack/last.bin": os.urandom(50_000),
+}
+
+
+class _Unseekable:
+    """
+    Write-only stream: zipfile then writes every member with a data descriptor.
+    """
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+    def flush(self):
+        pass
+
+
+def build_archive(data_descriptors=False):
+    """
+    Zip of MEMBERS (stored .bin, deflated .txt) and an archive offset half way through the
+    deflated member's data, past the first read of the download.
+    """
+    stream = _Unseekable() if data_descriptors else io.BytesIO()
+    with zipfile.ZipFile(stream, "w") as z:
+        for name, data in MEMBERS.items():
+            info = zipfile.ZipInfo(name)
+            info.compress_type = zipfile.ZIP_STORED if name.endswith(".bin") else zipfile.ZIP_DEFLATED
+            with z.open(info, "w") as f:
+                f.write(data)
+    archive = (stream.buffer if data_descriptors else stream).getvalue()
+    with zipfile.ZipFile(io.BytesIO(archive)) as z:
+        infos = z.infolist()
+        assert all(bool(info.flag_bits & 0x8) == data_descriptors for info in infos)
+        middle = infos[1].header_offset + 30 + len(infos[1].filename) + infos[1].compress_size // 2
+    return archive, middle
+
+
+class _Server:
+    """
+    Serve one archive with ETag and Range support; the first response is cut off at `cut`.
+    """
+
+    def __init__(self, archive, cut):
+        self.archive = archive
+        self.cut = cut
+        self.ranges = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                start = 0
+                range_header = self.headers.get("Range")
+                server.ranges.append(range_header)
+                if range_header:
+                    start = int(range_header.split("=")[1].split("-")[0])
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(archive) - 1}/{len(archive)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(len(archive) - start))
+                self.send_header("ETag", '"archive-v1"')
+                self.end_headers()
+                end = len(archive)
+                if len(server.ranges) == 1:
+                    end = server.cut
+                self.wfile.write(archive[start:end])
+                if end < len(archive):
+                    self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/datasets.zip"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(datasets.time, "sleep", lambda seconds: None)
+
+
+@pytest.mark.parametrize("data_descriptors", [False, True], ids=["sizes-in-header", "data-descriptors"])
+def test_extract_resumes_after_interruption(tmp_path, data_descriptors):
+    archive, cut = build_archive(data_descriptors)
+    with _Server(archive, cut) as server:
+        completed = datasets.download_and_extract(server.url, str(tmp_path))
+
+    assert sorted(completed) == sorted(MEMBERS)
+    for name, data in MEMBERS.items():
+        assert (tmp_path / name).read_bytes() == data
+    assert not list(tmp_path.rglob("*.part"))
+    assert not (tmp_path / datasets.MANIFEST_NAME).exists()
+
+    # The retry restarts at the interrupted (deflated) member, not at byte 0
+    with zipfile.ZipFile(io.BytesIO(archive)) as z:
+        resume_at = z.getinfo("stack/deflated.txt").header_offset
+    assert server.ranges == [None, f"bytes={resume_at}-"]
+
+
+def test_download_file_resumes_and_verifies(tmp_path):
+    archive, cut = build_archive()
+    destination = str(tmp_path / "datasets.zip")
+    with _Server(archive, cut) as server:
+        datasets.download_file(server.url, destination)
+
+    # Resumed from what reached the part file before the connection dropped
+    resumed_at = int(server.ranges[1].split("=")[1].rstrip("-"))
+    assert server.ranges[0] is None and 0 < resumed_at <= cut
+    with open(destination, "rb") as f:
+        assert f.read() == archive
+    datasets.verify_zip(destination)
+
+
+def test_verify_zip_removes_corrupt_archive(tmp_path):
+    archive, cut = build_archive()
+    corrupt = bytearray(archive)
+    corrupt[cut] ^= 0xFF
+    path = tmp_path / "datasets.zip"
+    path.write_bytes(bytes(corrupt))
+
+    with pytest.raises(zipfile.BadZipFile):
+        datasets.verify_zip(str(path))
+    assert not path.exists()
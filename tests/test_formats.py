@@ -0,0 +1,65 @@
+"""
+TIFF and 16-bit datasets are found without naming their extension, and output options are
+checked before any frame is read.
+"""
+
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from core import _01_preprocess as preprocess
+from core import cli, datasets, imagefile, main
+
+
+def make_dataset(folder, extension, dtype=np.uint16, frames=3):
+    rng = np.random.default_rng(0)
+    folder.mkdir(parents=True)
+    top = np.iinfo(dtype).max
+    for i in range(frames):
+        cv2.imwrite(str(folder / f"img_{i}.{extension}"), rng.integers(0, top, (40, 56, 3), dtype=dtype))
+    (folder / "notes.txt").write_text("not a frame")
+    return folder
+
+
+def test_tiff_dataset_found_and_fused(tmp_path):
+    make_dataset(tmp_path / "data" / "tifs", "tif")
+    make_dataset(tmp_path / "data" / "mixed", "tiff", dtype=np.uint8)
+
+    assert datasets.list_datasets(str(tmp_path / "data")) == ["mixed", "tifs"]
+    files = preprocess.list_image_files(str(tmp_path / "data" / "tifs"))
+    assert [os.path.basename(f) for f in files] == ["img_0.tif", "img_1.tif", "img_2.tif"]
+    assert preprocess.list_image_files(str(tmp_path / "data" / "tifs"), "png") == []
+
+    path = main.main("tifs", data_dir=str(tmp_path / "data"), output_dir=str(tmp_path / "output"), levels=2)
+    fused = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    assert fused.dtype == np.uint16 and fused.shape == (40, 56, 3)
+
+
+def test_explicit_extension_is_not_found(tmp_path):
+    make_dataset(tmp_path / "data" / "tifs", "tif")
+    with pytest.raises(ValueError, match=r"\.png"):
+        preprocess.preprocess_image_stack(str(tmp_path / "data" / "tifs"), "png")
+
+
+@pytest.mark.parametrize("options", [("png", "lzw", None), ("jpeg", "default", None),
+                                     ("tiff", "zstd", None), ("tiff", "none", 12)])
+def test_bad_output_options_fail_before_preprocessing(tmp_path, monkeypatch, options):
+    image_format, compression, bit_depth = options
+    monkeypatch.setattr(main, "read_stack_shape", lambda *args: pytest.fail("dataset was read"))
+    with pytest.raises(ValueError):
+        main.main("missing", data_dir=str(tmp_path), image_format=image_format, compression=compression,
+                  bit_depth=bit_depth)
+
+
+def test_cli_rejects_png_lzw(capsys):
+    with pytest.raises(SystemExit):
+        cli.main(["fuse", "missing", "--compression", "lzw"])
+    assert "--compression lzw" in capsys.readouterr().err
+
+
+def test_good_output_options():
+    for image_format in imagefile.OUTPUT_FORMATS:
+        imagefile.check_output_options(image_format, "none", 16)
+    imagefile.check_output_options("tiff", "lzw")
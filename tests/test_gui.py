@@ -0,0 +1,87 @@
+"""
+GUI worker code run against a stand-in for the Tk root, without a display.
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from core import gui
+
+
+class FakeRoot:
+    """
+    Collects root.after callbacks so a test can run them as the Tk main loop would.
+    """
+
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, delay, callback):
+        self.callbacks.append(callback)
+
+    def run(self):
+        while self.callbacks:
+            self.callbacks.pop(0)()
+
+
+class FakeLabel:
+    def __init__(self):
+        self.text = None
+
+    def config(self, text=None, **kwargs):
+        self.text = text
+
+
+@pytest.fixture
+def errors(monkeypatch):
+    shown = []
+    monkeypatch.setattr(gui.messagebox, "showerror", lambda title, message: shown.append(message))
+    return shown
+
+
+def test_region_fusion_error_is_shown(errors):
+    app = SimpleNamespace(root=FakeRoot(), status_label=FakeLabel())
+    source = {"images": None, "levels": 3, "mask_type": "Soft", "top_method": "max", "max_value": 255.0}
+
+    gui.FocusStackingGUI.run_region_fusion(app, source, (0, 0, 8, 8))
+    app.root.run()
+
+    assert len(errors) == 1 and errors[0]
+    assert app.status_label.text == "Error occurred"
+
+
+def test_fusion_error_is_shown(tmp_path, errors):
+    token = gui.ProgressToken()
+    statuses = []
+    app = SimpleNamespace(root=FakeRoot(), data_dir=str(tmp_path), job=token,
+                          update_status=lambda text, progress, token=None: statuses.append(text),
+                          finish_job=lambda token: None)
+
+    gui.FocusStackingGUI.run_fusion_pipeline(app, "missing", (3, "Soft", "max", None), token)
+    app.root.run()
+
+    assert len(errors) == 1 and "missing" in errors[0]
+    assert statuses[-1] == "Error occurred"
+
+
+def test_preview_of_unreadable_frame_is_a_placeholder():
+    class Frames:
+        def __len__(self):
+            return 3
+
+        def __getitem__(self, idx):
+            if idx == 1:
+                raise FileNotFoundError("frame_01.png")
+            return np.full((40, 60, 3), 200.0, np.float32)
+
+    frames = gui.PreviewFrames(Frames(), (30, 20))
+    for idx in range(3):
+        frames.request(idx)
+    frames.close()
+    frames._thread.join(timeout=5)
+
+    assert frames.failed == {1}
+    assert [array.shape for array in frames._arrays] == [(20, 30, 3)] * 3
+    assert (frames._arrays[1] == gui.PLACEHOLDER_GRAY).all() and (frames._arrays[2] == 200).all()
@@ -0,0 +1,84 @@
+"""
+Every execution strategy, and region fusion, gives exactly the pixels of the in-memory
+reference pipeline.
+"""
+
+import numpy as np
+import pytest
+
+from core import _01_preprocess as preprocess
+from core.benchmark import make_synthetic_stack
+from core.pipeline import fuse_in_memory, fuse_region, fuse_streaming, fuse_tiled
+
+# Odd sizes, so no dimension is a multiple of the pyramid step or the SIMD width
+HEIGHT, WIDTH = 157, 211
+
+
+@pytest.fixture(scope="module")
+def lazy_stack(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("data") / "sweep"
+    make_synthetic_stack(str(folder), height=HEIGHT, width=WIDTH, num_frames=5)
+    stack = preprocess.preprocess_image_stack(str(folder), use_cache=False, lazy=True)
+    assert any(not np.array_equal(warp, np.eye(2, 3)) for warp in stack.warps)
+    return stack
+
+
+@pytest.fixture(scope="module")
+def frames(lazy_stack):
+    return np.asarray(lazy_stack)
+
+
+@pytest.fixture(scope="module")
+def references(frames):
+    return {(levels, mask): fuse_in_memory(frames, levels, mask)
+            for levels in (3, 4) for mask in ("Soft", "Hard")}
+
+
+@pytest.mark.parametrize("mask", ["Soft", "Hard"])
+@pytest.mark.parametrize("levels", [3, 4])
+def test_streaming_matches_in_memory(lazy_stack, references, levels, mask):
+    np.testing.assert_array_equal(fuse_streaming(lazy_stack, levels, mask), references[levels, mask])
+
+
+@pytest.mark.parametrize("mask", ["Soft", "Hard"])
+@pytest.mark.parametrize("levels", [3, 4])
+def test_tiled_matches_in_memory(lazy_stack, frames, references, levels, mask):
+    # Strips smaller than the halo, and a last strip that is cut short
+    for strip_height in (2 ** levels, 3 * 2 ** levels):
+        assert strip_height < HEIGHT and HEIGHT % strip_height
+        np.testing.assert_array_equal(fuse_tiled(lazy_stack, levels, strip_height, mask), references[levels, mask])
+    np.testing.assert_array_equal(fuse_tiled(frames, levels, 32, mask), references[levels, mask])
+
+
+ROIS = [
+    (0, 0, 40, 30),                       # top-left corner
+    (WIDTH - 37, HEIGHT - 23, 37, 23),    # bottom-right corner, window ends at the frame edge
+    (101, 67, 53, 41),                    # interior, unaligned origin
+    (3, 61, WIDTH - 3, 9),                # full-width band
+    (150, 0, 61, HEIGHT),                 # right edge, full height
+    (WIDTH - 1, HEIGHT - 1, 1, 1),        # last pixel
+    (-10, -10, 30, 30),                   # partly outside, clipped
+]
+
+
+@pytest.mark.parametrize("roi", ROIS)
+@pytest.mark.parametrize("levels", [3, 4])
+def test_region_matches_full_fusion(lazy_stack, references, roi, levels):
+    for mask in ("Soft", "Hard"):
+        x, y, w, h = roi
+        expected = references[levels, mask][max(0, y):y + h, max(0, x):x + w]
+        np.testing.assert_array_equal(fuse_region(lazy_stack, roi, levels, mask), expected)
+
+
+
+def test_load_reports_progress_and_cancels(lazy_stack, frames):
+    from core.progress import Cancelled, ProgressToken
+
+    stages = []
+    np.testing.assert_array_equal(lazy_stack.load(ProgressToken(lambda *update: stages.append(update))), frames)
+    assert stages[-1] == ("load", len(lazy_stack), len(lazy_stack))
+
+    token = ProgressToken()
+    token.cancel()
+    with pytest.raises(Cancelled):
+        lazy_stack.load(token)
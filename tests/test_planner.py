@@ -0,0 +1,82 @@
+"""
+Memory budget detection and strategy choice.
+"""
+
+import os
+
+from core import planner
+
+VM_STAT = """Mach Virtual Memory Statistics: (page size of 16384 bytes)
+Pages free:                               12000.
+Pages active:                            400000.
+Pages inactive:                           30000.
+Pages speculative:                         2000.
+Pages throttled:                              0.
+Pages wired down:                        100000.
+"""
+
+
+def test_parse_vm_stat():
+    assert planner._parse_vm_stat(VM_STAT) == (12000 + 30000 + 2000) * 16384
+    assert planner._parse_vm_stat("vm_stat: not available") is None
+
+
+MEMINFO = """MemTotal:       16314428 kB
+MemFree:         3981312 kB
+MemAvailable:    5767168 kB
+Buffers:          204800 kB
+Cached:          2097152 kB
+"""
+
+
+def test_available_memory_prefers_meminfo(monkeypatch):
+    assert planner._parse_meminfo(MEMINFO) == 5767168 * 1024
+    assert planner._parse_meminfo("MemTotal:       16314428 kB\n") is None
+
+    monkeypatch.setattr(planner.sys, "platform", "linux")
+    monkeypatch.setattr(planner, "_available_memory_linux", lambda: planner._parse_meminfo(MEMINFO))
+    monkeypatch.setattr(os, "sysconf", lambda name: 1)
+    assert planner.available_memory() == 5767168 * 1024
+
+    # Kernels without MemAvailable fall back to sysconf's free pages
+    monkeypatch.setattr(planner, "_available_memory_linux", lambda: None)
+    assert planner.available_memory() == 1
+
+
+def _no_sysconf(name):
+    raise ValueError(f"unrecognized configuration name {name}")
+
+
+def test_available_memory_without_sysconf(monkeypatch):
+    monkeypatch.setattr(os, "sysconf", _no_sysconf)
+    monkeypatch.setattr(planner.sys, "platform", "darwin")
+    monkeypatch.setattr(planner, "_available_memory_macos", lambda: planner._parse_vm_stat(VM_STAT))
+    assert planner.available_memory() == 44000 * 16384
+
+    monkeypatch.setattr(planner.sys, "platform", "win32")
+    monkeypatch.setattr(planner, "_available_memory_windows", lambda: 8 * 2**30)
+    assert planner.available_memory() == 8 * 2**30
+
+    monkeypatch.setattr(planner.sys, "platform", "sunos5")
+    assert planner.available_memory() is None
+
+
+def test_plan_leaves_in_memory_when_over_budget():
+    shape = (10, 600, 800, 3)
+    in_memory = planner.plan_fusion(shape, 4, memory_budget=10 * 2**30)
+    assert in_memory["strategy"] == "in-memory"
+    tight = planner.plan_fusion(shape, 4, memory_budget=in_memory["peak_memory"]["in-memory"] // 2)
+    assert tight["strategy"] != "in-memory" and tight["fits"]
+
+
+def test_plan_counts_uncached_alignment():
+    shape = (200, 600, 800, 3)
+    streaming = planner.plan_fusion(shape, 4, strategy="streaming")
+    preprocess = streaming["preprocess_memory"]
+    assert preprocess == planner.estimate_preprocess_memory(shape, low_memory=True)
+    assert preprocess < planner.estimate_preprocess_memory(shape) / 10
+    # Many frames: streaming fusion alone fits, aligning them frame by frame does not
+    assert streaming["peak_memory"]["streaming"] < preprocess
+    assert not planner.plan_fusion(shape, 4, memory_budget=preprocess - 1)["fits"]
+    plan = planner.plan_fusion(shape, 4, memory_budget=preprocess)
+    assert plan["strategy"] == "streaming" and plan["fits"]
@@ -0,0 +1,32 @@
+"""
+Frame pruning on synthetic focus sweeps whose first and last frames focus past both ends
+of the scene.
+"""
+
+import numpy as np
+import pytest
+
+from core._01_preprocess import load_image_stack
+from core.benchmark import make_synthetic_stack
+from core.prune import DEFAULT_MIN_SHARE, select_frames
+
+NUM_FRAMES = 8
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_sweep_end_frames_are_dropped(tmp_path, seed):
+    folder = tmp_path / "sweep"
+    make_synthetic_stack(str(folder), num_frames=NUM_FRAMES, seed=seed)
+    images = load_image_stack(str(folder))
+
+    keep, dropped = select_frames(images, min_share=DEFAULT_MIN_SHARE)
+
+    assert keep == list(range(1, NUM_FRAMES - 1))
+    assert [d["index"] for d in dropped] == [0, NUM_FRAMES - 1]
+
+
+def test_noise_only_stack_keeps_frames():
+    rng = np.random.default_rng(0)
+    images = rng.normal(128, 20, (4, 120, 160, 3)).astype(np.float32)
+    keep, _ = select_frames(images)
+    assert len(keep) == 4
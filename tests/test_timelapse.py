@@ -0,0 +1,72 @@
+"""
+Time-lapse steps reuse what did not change: decoded frames, warps and fused frames.
+"""
+
+import shutil
+
+import cv2
+import numpy as np
+import pytest
+
+from core import timelapse
+from core.benchmark import make_synthetic_stack
+
+FRAMES = 6
+
+
+@pytest.fixture
+def series(tmp_path):
+    """
+    t000: a synthetic sweep whose last frame repeats the one before it;
+    t001: the same stack;
+    t002: frame 3 saved again as 16-bit (new content hash, same picture);
+    t003: the reference frame slightly brighter.
+    """
+    data = tmp_path / "data" / "series"
+    make_synthetic_stack(str(data / "t000"), height=160, width=224, num_frames=FRAMES - 1)
+    shutil.copy(data / "t000" / f"frame_{FRAMES - 2:02d}.png", data / "t000" / f"frame_{FRAMES - 1:02d}.png")
+    shutil.copytree(data / "t000", data / "t001")
+
+    shutil.copytree(data / "t001", data / "t002")
+    frame = cv2.imread(str(data / "t002" / "frame_03.png"))
+    cv2.imwrite(str(data / "t002" / "frame_03.png"), frame.astype(np.uint16) * 257)
+
+    shutil.copytree(data / "t002", data / "t003")
+    frame = cv2.imread(str(data / "t003" / "frame_00.png"))
+    cv2.imwrite(str(data / "t003" / "frame_00.png"), cv2.add(frame, 1))
+    return data.parent
+
+
+def test_timelapse_reuses_unchanged_state(series, tmp_path, monkeypatch):
+    data_dir = series
+    starts, found = [], []
+    estimate_warps = timelapse.estimate_warps
+
+    def recording_estimate_warps(image_stack, initial_warps=None, **kwargs):
+        starts.append(initial_warps)
+        found.append(estimate_warps(image_stack, initial_warps=initial_warps, **kwargs)[0])
+        return found[-1], None
+
+    monkeypatch.setattr(timelapse, "estimate_warps", recording_estimate_warps)
+    timings = timelapse.run_timelapse(["series"], data_dir=str(data_dir), output_dir=str(tmp_path / "output"),
+                                      levels=3)
+
+    assert [t["step"] for t in timings] == [f"series/t00{k}" for k in range(4)]
+    assert [t["decoded"] for t in timings] == [FRAMES, 0, 1, 1]
+    # Unchanged reference: only the new frame is registered; new reference: all but it
+    assert [t["registered"] for t in timings] == [FRAMES - 1, 0, 1, FRAMES - 1]
+    assert len(starts) == 3
+
+    # The first step starts cold, later ones from the previous step's warp at the same position
+    assert all(warp is None for warp in starts[0])
+    np.testing.assert_array_equal(starts[1][1], found[0][3])
+    assert not np.array_equal(starts[1][1], np.eye(2, 3))
+    np.testing.assert_array_equal(starts[2][1:], [found[0][i] for i in (1, 2)] + [found[1][1]] + [found[0][i] for i in (4, 5)])
+
+    fused = [cv2.imread(t["path"], cv2.IMREAD_UNCHANGED) for t in timings]
+    np.testing.assert_array_equal(fused[1], fused[0])
+    # 16-bit from step 2 on; the repeated frame is scaled once like every other reused frame
+    assert fused[0].dtype == np.uint8 and fused[2].dtype == np.uint16
+    difference = np.abs(fused[2].astype(np.float64) / 257 - fused[0])
+    assert difference.mean() < 0.5
+    assert (data_dir.parent / "output" / "timelapse" / "series" / "timings.csv").exists()